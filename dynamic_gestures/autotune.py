@@ -0,0 +1,235 @@
+"""
+First-run tuning of the onnxruntime session configuration of a model on the current host.
+
+Configurations are searched one setting at a time (providers, thread count, execution mode, graph optimization level,
+memory pattern), keeping the fastest value of each before moving to the next. The winner is stored in a JSON cache
+keyed by host and model content, and reused by `OnnxModel(..., session_config="auto")` on later starts.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import onnxruntime as ort
+
+from onnx_models import DEFAULT_SESSION_CONFIG, PRECISIONS, OnnxModel, model_variant
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dynamic_gestures", "ort_profile.json")
+
+# Accelerated CPU providers tried when the onnxruntime build has them.
+CPU_ACCELERATORS = ("XnnpackExecutionProvider", "ACLExecutionProvider")
+
+DTYPES = {"tensor(float)": np.float32, "tensor(float16)": np.float16, "tensor(double)": np.float64}
+
+
+def cache_path():
+    """
+    Path of the profile cache, DYNAMIC_GESTURES_ORT_CACHE overrides the default.
+    """
+    return os.environ.get("DYNAMIC_GESTURES_ORT_CACHE", DEFAULT_CACHE_PATH)
+
+
+def host_key():
+    """
+    Identity of the host a profile was tuned on: machine, CPU and onnxruntime build.
+    """
+    return "|".join(
+        [
+            platform.node(),
+            platform.machine(),
+            platform.processor() or "unknown cpu",
+            f"{os.cpu_count()} cpus",
+            f"onnxruntime {ort.__version__}",
+        ]
+    )
+
+
+def model_key(model_path):
+    """
+    Identity of a model, its file name and a hash of its content.
+    """
+    with open(model_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    return f"{os.path.basename(model_path)}:{digest}"
+
+
+def load_cache(path=None):
+    path = path or cache_path()
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {"version": CACHE_VERSION, "hosts": {}}
+    if cache.get("version") != CACHE_VERSION:
+        return {"version": CACHE_VERSION, "hosts": {}}
+    return cache
+
+
+def save_cache(cache, path=None):
+    """
+    Write the cache atomically, a concurrent start reads either the old or the new file.
+    """
+    path = path or cache_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def synthetic_feeds(model_path, batch=1, seed=0):
+    """
+    Random inputs with the shapes and types of the model inputs, dynamic dimensions set to `batch`.
+    """
+    rng = np.random.default_rng(seed)
+    sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    feeds = {}
+    for node in sess.get_inputs():
+        shape = [dim if isinstance(dim, int) else batch for dim in node.shape]
+        feeds[node.name] = rng.standard_normal(shape).astype(DTYPES.get(node.type, np.float32))
+    return feeds
+
+
+def measure(model_path, config, feeds, warmup=5, runs=30):
+    """
+    Median latency in seconds of a session with the given configuration, inf when it cannot be created or does not
+    run on the requested provider.
+    """
+    options, providers = OnnxModel.get_onnx_provider(config)
+    try:
+        sess = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+    except Exception:
+        return float("inf")
+    if sess.get_providers()[0] != providers[0][0]:
+        return float("inf")
+    for _ in range(warmup):
+        sess.run(None, feeds)
+    times = np.empty(runs)
+    for i in range(runs):
+        start = time.perf_counter()
+        sess.run(None, feeds)
+        times[i] = time.perf_counter() - start
+    return float(np.median(times))
+
+
+def search_space():
+    """
+    Values tried for every setting, in search order. The first value of each is the default.
+    """
+    cpus = os.cpu_count() or 1
+    threads = sorted({0, 1, 2, 4, max(cpus // 2, 1), cpus} & set(range(cpus + 1)))
+    available = ort.get_available_providers()
+    providers = [None] + [
+        [[name, {}], ["CPUExecutionProvider", {}]] for name in CPU_ACCELERATORS if name in available
+    ]
+    return [
+        ("providers", providers),
+        ("intra_op_num_threads", threads),
+        ("execution_mode", ["sequential", "parallel"] if cpus > 1 else ["sequential"]),
+        ("graph_optimization_level", ["all", "extended", "basic"]),
+        ("enable_mem_pattern", [False, True]),
+    ]
+
+
+def tune(model_path, feeds=None, warmup=5, runs=30, min_gain=0.03, log=print):
+    """
+    Find the fastest session configuration of a model on this host.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the onnx model.
+    feeds : dict or None
+        Input name -> array used for timing, random inputs of the model shapes when None.
+    warmup : int
+        Untimed runs of every configuration.
+    runs : int
+        Timed runs of every configuration, the median is compared.
+    min_gain : float
+        Relative latency improvement needed to change a setting, so that timing noise keeps the defaults.
+    log : callable or None
+        Called with a line per tried configuration.
+
+    Returns
+    -------
+    tuple
+        Best configuration (dict) and its median latency in seconds.
+    """
+    feeds = synthetic_feeds(model_path) if feeds is None else feeds
+    best = dict(DEFAULT_SESSION_CONFIG)
+    best_latency = measure(model_path, best, feeds, warmup, runs)
+    if log is not None:
+        log(f"{os.path.basename(model_path)}: default {best_latency * 1000:.2f} ms")
+    for key, values in search_space():
+        for value in values:
+            if value == best[key]:
+                continue
+            config = dict(best, **{key: value})
+            if key == "execution_mode" and value == "parallel":
+                config["inter_op_num_threads"] = 2
+            latency = measure(model_path, config, feeds, warmup, runs)
+            if log is not None:
+                log(f"{os.path.basename(model_path)}: {key}={value} {latency * 1000:.2f} ms")
+            if latency < best_latency * (1.0 - min_gain):
+                best, best_latency = config, latency
+    return best, best_latency
+
+
+def tuned_config(model_path, path=None, retune=False, warmup=5, runs=30, log=print):
+    """
+    Session configuration of a model on this host from the cache, tuned and stored on the first call.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the onnx model.
+    path : str or None
+        Cache file, see cache_path.
+    retune : bool
+        Tune again even if the cache has a configuration.
+    warmup, runs : int
+        Untimed and timed runs of every configuration tried, see tune.
+    log : callable or None
+        Progress output of the tuning.
+
+    Returns
+    -------
+    dict
+        Session configuration for OnnxModel.
+    """
+    key = model_key(model_path)
+    cache = load_cache(path)
+    profiles = cache["hosts"].setdefault(host_key(), {})
+    if not retune and key in profiles:
+        return profiles[key]["config"]
+
+    config, latency = tune(model_path, warmup=warmup, runs=runs, log=log)
+    # Re-read, another process may have tuned other models meanwhile.
+    cache = load_cache(path)
+    cache["hosts"].setdefault(host_key(), {})[key] = {
+        "config": config,
+        "latency_ms": latency * 1000,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    save_cache(cache, path)
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the onnxruntime session configuration of the models")
+    parser.add_argument("--detector", default="models/hand_detector.onnx", type=str, help="Path to detector model")
+    parser.add_argument("--classifier", default="models/crops_classifier.onnx", type=str, help="Path to classifier")
+    parser.add_argument("--precision", default="fp32", choices=PRECISIONS, help="Model variant to tune")
+    parser.add_argument("--cache", default=None, type=str, help=f"Profile cache file, default {DEFAULT_CACHE_PATH}")
+    parser.add_argument("--retune", action="store_true", help="Tune again even when a profile is cached")
+    args = parser.parse_args()
+
+    print(f"Host: {host_key()}")
+    for model_path in (args.detector, args.classifier):
+        model_path = model_variant(model_path, args.precision)
+        config = tuned_config(model_path, path=args.cache, retune=args.retune)
+        print(f"{model_path}: {json.dumps(config)}")
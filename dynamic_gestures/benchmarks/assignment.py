@@ -0,0 +1,114 @@
+import argparse
+import timeit
+from collections import Counter
+
+import numpy as np
+
+from main_controller import MainController
+from ocsort import IdAllocator, get_assignment_backend, set_assignment_backend
+from ocsort.assignment import BACKENDS, OPTIMAL_SOLVERS, profile_path, save_profile
+from utils import TraceReader, replay_trace
+
+SIZES = [(1, 1), (1, 2), (2, 1), (2, 2), (2, 3), (3, 3), (4, 4), (8, 8), (32, 32)]
+
+
+def legacy_linear_assignment(cost_matrix):
+    """
+    The previous implementation, importing the backend on every call.
+    """
+    try:
+        import lap
+
+        _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
+        return np.array([[y[i], i] for i in x if i >= 0])
+    except ImportError:
+        from scipy.optimize import linear_sum_assignment
+
+        x, y = linear_sum_assignment(cost_matrix)
+        return np.array(list(zip(x, y)))
+
+
+def trace_sizes(path):
+    """
+    Shapes of the cost matrices solved while replaying a trace, with their counts.
+    """
+    sizes = Counter()
+    backend = BACKENDS[get_assignment_backend()]
+
+    def recording(cost_matrix):
+        sizes[cost_matrix.shape] += 1
+        return backend(cost_matrix)
+
+    set_assignment_backend(recording)
+    try:
+        with TraceReader(path) as reader:
+            replay_trace(MainController(None, None, ids=IdAllocator(reader.id_base)), reader)
+    finally:
+        set_assignment_backend("auto")
+    return sizes
+
+
+def benchmark_backends(sizes, number=2000):
+    """
+    Time every backend on random IoU-like cost matrices.
+
+    Returns
+    -------
+    dict
+        (N, M) -> {backend name -> microseconds per call}.
+    """
+    rng = np.random.default_rng(0)
+    solvers = dict(BACKENDS, legacy=legacy_linear_assignment, **OPTIMAL_SOLVERS)
+    results = {}
+    for n, m in sizes:
+        cost_matrix = -rng.random((n, m))
+        results[(n, m)] = {
+            name: timeit.timeit(lambda: solve(cost_matrix), number=number) / number * 1e6
+            for name, solve in solvers.items()
+            if name != "single" or 1 in (n, m)
+        }
+    return results
+
+
+def fastest_solvers(results):
+    """
+    Name of the fastest optimal solver of every size, the choice of auto once saved.
+    """
+    return {
+        size: min((name for name in times if name in OPTIMAL_SOLVERS), key=times.get) for size, times in results.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the linear assignment backends")
+    parser.add_argument("--trace", default=None, type=str, help="Time the matrix sizes solved on this trace")
+    parser.add_argument("--number", default=2000, type=int, help="Calls per timed size and backend")
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help=f"Store the fastest optimal solver of every size for the auto backend in {profile_path()}",
+    )
+    args = parser.parse_args()
+
+    counts = trace_sizes(args.trace) if args.trace is not None else Counter(dict.fromkeys(SIZES, 0))
+    results = benchmark_backends(sorted(counts), number=args.number)
+    fastest = fastest_solvers(results)
+    names = list(dict.fromkeys(name for times in results.values() for name in times))
+    print("us per call" + (f", sizes and counts from {args.trace}" if args.trace is not None else ""))
+    print(f"{'N x M':<10}{'count':>8}" + "".join(f"{name:>10}" for name in names) + f"{'fastest':>12}")
+    for size, times in results.items():
+        print(
+            f"{f'{size[0]} x {size[1]}':<10}{counts[size]:>8}"
+            + "".join(f"{times[name]:>10.1f}" if name in times else f"{'-':>10}" for name in names)
+            + f"{fastest[size]:>12}"
+        )
+    if args.trace is not None:
+        totals = {
+            name: sum(counts[size] * times[name] for size, times in results.items()) / 1000
+            for name in names
+            if all(name in times for times in results.values())
+        }
+        print("Total time on the trace, ms: " + ", ".join(f"{name} {total:.1f}" for name, total in totals.items()))
+    if args.save:
+        save_profile(fastest)
+        print(f"Saved the fastest solvers to {profile_path()}, used by the auto backend from the next start")
@@ -0,0 +1,103 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from ocsort import BoxCosts, associate, giou_batch, iou_batch
+
+SIZES = (1, 2, 4, 8, 32)
+
+
+def make_inputs(num_dets, num_trks, rng, jitter=4.0):
+    """
+    Tracks spread over a 1280x720 frame and detections that are jittered copies of the first tracks, plus
+    new detections when there are more detections than tracks.
+    """
+    centers = rng.uniform((80, 80), (1200, 640), size=(max(num_dets, num_trks), 2))
+    sizes = rng.uniform(40, 120, size=(len(centers), 1))
+    boxes = np.concatenate((centers - sizes / 2, centers + sizes / 2), axis=1)
+    trackers = np.concatenate((boxes[:num_trks], np.zeros((num_trks, 1))), axis=1)
+    dets = boxes[:num_dets] + rng.normal(0, jitter, size=(num_dets, 4))
+    dets = np.concatenate((dets, rng.uniform(0.5, 1.0, size=(num_dets, 1))), axis=1)
+    velocities = rng.normal(0, 1, size=(num_trks, 2))
+    velocities /= np.linalg.norm(velocities, axis=1, keepdims=True)
+    previous_obs = np.concatenate((boxes[:num_trks] - rng.normal(0, 8, size=(num_trks, 4)), np.ones((num_trks, 1))), 1)
+    return dets, trackers, velocities, previous_obs
+
+
+def benchmark_associate(sizes=SIZES, number=2000, seed=0):
+    """
+    Time one `associate` call for every (detections, tracks) size pair.
+
+    Returns
+    -------
+    dict
+        Microseconds per call keyed by (N, M).
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+    for num_dets in sizes:
+        for num_trks in sizes:
+            dets, trackers, velocities, previous_obs = make_inputs(num_dets, num_trks, rng)
+            seconds = min(
+                timeit.repeat(
+                    lambda: associate(dets, trackers, 0.3, velocities, previous_obs, 0.2), number=number, repeat=3
+                )
+            )
+            results[(num_dets, num_trks)] = seconds / number * 1e6
+    return results
+
+
+def benchmark_costs(sizes=SIZES, number=2000, seed=0):
+    """
+    Time the box geometry of one tracker step when no detection matches in the first round, the most work: IoU
+    against predicted boxes and GIoU against last observations, as batch calls and with reused BoxCosts buffers in
+    float64 and float32.
+
+    Returns
+    -------
+    dict
+        Microseconds per step keyed by method name and (N, M).
+    """
+    rng = np.random.default_rng(seed)
+    kernels = {
+        "BoxCosts float64": (BoxCosts(), BoxCosts()),
+        "BoxCosts float32": (BoxCosts(np.float32), BoxCosts(np.float32)),
+    }
+    results = {"iou_batch + giou_batch": {}, **{name: {} for name in kernels}}
+    for num_dets in sizes:
+        for num_trks in sizes:
+            dets, trackers, _, previous_obs = make_inputs(num_dets, num_trks, rng)
+
+            def separate():
+                iou_batch(dets, trackers)
+                giou_batch(dets, previous_obs)
+
+            def fused(costs, ocr_costs):
+                costs.compute(dets, trackers).iou()
+                ocr_costs.compute(dets, previous_obs).giou()
+
+            timings = {"iou_batch + giou_batch": separate}
+            for name, kernel in kernels.items():
+                timings[name] = lambda kernel=kernel: fused(*kernel)
+            for name, func in timings.items():
+                seconds = min(timeit.repeat(func, number=number, repeat=3))
+                results[name][(num_dets, num_trks)] = seconds / number * 1e6
+    return results
+
+
+def print_table(title, results):
+    print(title)
+    print(f"{'N/M':>8}" + "".join(f"{m:>10}" for m in SIZES))
+    for n in SIZES:
+        print(f"{n:>8}" + "".join(f"{results[(n, m)]:>10.1f}" for m in SIZES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the OC-SORT association step")
+    parser.add_argument("--number", default=2000, type=int, help="Calls per timing")
+    args = parser.parse_args()
+
+    print_table("associate, us per call (rows: detections, columns: tracks)", benchmark_associate(number=args.number))
+    for name, results in benchmark_costs(number=args.number).items():
+        print_table(f"{name}, us per tracker step", results)
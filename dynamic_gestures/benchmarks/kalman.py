@@ -0,0 +1,82 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from ocsort.kalmanboxtracker import KalmanBoxTracker, convert_bbox_to_z
+
+FILTERS = {"KalmanFilterNew": False, "LeanKalmanFilter": True}
+
+
+def make_tracker(lean, history=0):
+    """
+    Box tracker moving right by one pixel per frame, after `history` observed frames.
+    """
+    tracker = KalmanBoxTracker(np.array([100.0, 100.0, 150.0, 160.0, 1.0]), lean=lean)
+    for i in range(history):
+        tracker.predict()
+        tracker.update(np.array([101.0 + i, 100.0, 151.0 + i, 160.0, 1.0]))
+    return tracker
+
+
+def benchmark_steps(number=2000, history=300):
+    """
+    Time of the filter steps of one track, in microseconds per call.
+
+    Parameters
+    ----------
+    number : int
+        Calls per timed step.
+    history : int
+        Observed frames before timing, freezing for a miss copies state that grows with the track age.
+
+    Returns
+    -------
+    dict
+        Step name -> {filter name -> microseconds}.
+    """
+    z = convert_bbox_to_z(np.array([100.0, 100.0, 150.0, 160.0]))
+    results = {}
+    for name, lean in FILTERS.items():
+        kf = make_tracker(lean, history).kf
+        results.setdefault("predict", {})[name] = timeit.timeit(kf.predict, number=number) / number * 1e6
+
+        kf = make_tracker(lean, history).kf
+        results.setdefault("update", {})[name] = timeit.timeit(lambda: kf.update(z), number=number) / number * 1e6
+
+        kf = make_tracker(lean, history).kf
+
+        def cycle():
+            kf.predict()
+            kf.update(z)
+
+        results.setdefault("predict + update", {})[name] = timeit.timeit(cycle, number=number) / number * 1e6
+
+        # A miss (freeze) then a re-observation (unfreeze and ORU re-update over the gap).
+        trackers = [make_tracker(lean, history).kf for _ in range(max(number // 20, 1))]
+
+        def miss_and_recover():
+            kf = trackers.pop()
+            kf.predict()
+            kf.update(None)
+            kf.predict()
+            kf.update(z)
+
+        results.setdefault("miss + ORU", {})[name] = timeit.timeit(miss_and_recover, number=len(trackers)) / (
+            number // 20 or 1
+        ) * 1e6
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark KalmanFilterNew against LeanKalmanFilter")
+    parser.add_argument("--number", default=2000, type=int, help="Calls per timed step")
+    parser.add_argument("--history", default=300, type=int, help="Observed frames of the track before timing")
+    args = parser.parse_args()
+
+    results = benchmark_steps(number=args.number, history=args.history)
+    print(f"Track with {args.history} observations, us per call")
+    print(f"{'step':<20}" + "".join(f"{name:>18}" for name in FILTERS) + f"{'speedup':>10}")
+    for step, times in results.items():
+        base, lean = times["KalmanFilterNew"], times["LeanKalmanFilter"]
+        print(f"{step:<20}{base:>18.1f}{lean:>18.1f}{base / lean:>10.2f}")
@@ -0,0 +1,116 @@
+import argparse
+import itertools
+import os
+import time
+
+import numpy as np
+
+from ocsort import iou_batch
+from onnx_models import PRECISIONS, HandClassification, HandDetection, model_variant
+from run_replay import FrameSource, percentiles
+
+
+def load_frames(source, max_frames):
+    return [frame for _, _, frame in itertools.islice(FrameSource(source), max_frames)]
+
+
+def run_variant(frames, detector, classifier, reference_boxes):
+    """
+    Detector and classifier outputs and latencies of one model variant. The classifier runs on the reference boxes,
+    so that its labels are compared on the same crops.
+    """
+    boxes, labels = [], []
+    detect_times, classify_times = [], []
+    for frame, reference in zip(frames, reference_boxes):
+        start = time.perf_counter()
+        bboxes, _ = detector(frame)
+        detect_times.append(time.perf_counter() - start)
+        boxes.append(bboxes)
+        if len(reference):
+            start = time.perf_counter()
+            labels.append(classifier(frame, reference))
+            classify_times.append(time.perf_counter() - start)
+        else:
+            labels.append(np.empty(0, dtype=np.int64))
+    return boxes, labels, detect_times, classify_times
+
+
+def agreement(boxes, labels, reference_boxes, reference_labels):
+    """
+    Mean IoU of every fp32 box with its best matching box of the variant (0 when the variant misses it), and the
+    share of fp32 labels the variant reproduces.
+    """
+    ious, same = [], []
+    for bboxes, lbls, ref_boxes, ref_labels in zip(boxes, labels, reference_boxes, reference_labels):
+        if len(ref_boxes) == 0:
+            continue
+        if len(bboxes):
+            ious.extend(iou_batch(ref_boxes.astype(float), bboxes.astype(float)).max(axis=1))
+        else:
+            ious.extend([0.0] * len(ref_boxes))
+        same.extend(lbls == ref_labels)
+    return {
+        "box_iou": float(np.mean(ious)) if ious else float("nan"),
+        "label_agreement": float(np.mean(same)) if same else float("nan"),
+    }
+
+
+def benchmark_precisions(frames, detector_path, classifier_path, precisions=PRECISIONS):
+    """
+    Latency, throughput and agreement with the fp32 models of every available model variant.
+
+    Returns
+    -------
+    dict
+        Precision -> report, variants without model files are skipped.
+    """
+    detector, classifier = HandDetection(detector_path), HandClassification(classifier_path)
+    reference_boxes = [detector(frame)[0] for frame in frames]
+    _, reference_labels, _, _ = run_variant(frames, detector, classifier, reference_boxes)
+
+    results = {}
+    for precision in precisions:
+        if not (
+            os.path.exists(model_variant(detector_path, precision))
+            and os.path.exists(model_variant(classifier_path, precision))
+        ):
+            print(f"Skipping {precision}, no model files, create them with quantize.py")
+            continue
+        detector = HandDetection(detector_path, precision=precision)
+        classifier = HandClassification(classifier_path, precision=precision)
+        boxes, labels, detect_times, classify_times = run_variant(frames, detector, classifier, reference_boxes)
+        total = sum(detect_times) + sum(classify_times)
+        results[precision] = {
+            "detector_ms": percentiles(detect_times),
+            "classifier_ms": percentiles(classify_times),
+            "fps": len(frames) / total if total > 0 else 0.0,
+            **agreement(boxes, labels, reference_boxes, reference_labels),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and latency of the fp32, fp16 and int8 model variants")
+    parser.add_argument("source", type=str, help="Video file, image directory or image glob")
+    parser.add_argument("--detector", default="models/hand_detector.onnx", type=str, help="Path to fp32 detector")
+    parser.add_argument(
+        "--classifier", default="models/crops_classifier.onnx", type=str, help="Path to fp32 classifier"
+    )
+    parser.add_argument("--precision", nargs="+", default=list(PRECISIONS), choices=PRECISIONS, help="Variants")
+    parser.add_argument("--max-frames", default=300, type=int, help="Number of frames of the source to run")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.max_frames)
+    results = benchmark_precisions(frames, args.detector, args.classifier, args.precision)
+    print(f"{len(frames)} frames of {args.source}, latencies in ms")
+    print(
+        f"{'precision':<10}{'det mean':>10}{'det p90':>10}{'cls mean':>10}{'cls p90':>10}{'fps':>10}"
+        f"{'box IoU':>10}{'labels':>10}"
+    )
+    for precision, report in results.items():
+        det, cls = report["detector_ms"], report["classifier_ms"]
+        print(
+            f"{precision:<10}{det['mean']:>10.2f}{det['p90']:>10.2f}{cls.get('mean', 0.0):>10.2f}"
+            f"{cls.get('p90', 0.0):>10.2f}{report['fps']:>10.1f}{report['box_iou']:>10.3f}"
+            f"{report['label_agreement']:>10.3f}"
+        )
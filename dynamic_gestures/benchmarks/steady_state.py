@@ -0,0 +1,139 @@
+import argparse
+import time
+
+import numpy as np
+
+from main_controller import MainController
+from ocsort import IdAllocator, iou_batch
+from utils import TraceReader
+
+
+def run_trace(reader, steady_state_hits=None, record_predictions=False):
+    """
+    Replay a trace into a tracker-only controller and collect its output.
+
+    Returns
+    -------
+    outputs : list of dict
+        Per frame, track id -> (box, label, predicted box). The predicted box is the Kalman prediction the track was
+        associated with, recorded only with `record_predictions`.
+    elapsed : float
+        Time spent in MainController.update, in seconds.
+    """
+    controller = MainController(None, None, steady_state_hits=steady_state_hits, ids=IdAllocator(reader.id_base))
+    predicted = {}
+    if record_predictions:
+        tracks = controller.tracks
+        predict = tracks.predict
+
+        def predict_and_record():
+            boxes = predict()
+            predicted.clear()
+            # output ids are track ids + 1
+            predicted.update(zip((tracks.ids + 1).tolist(), boxes[:, :4].copy()))
+            return boxes
+
+        tracks.predict = predict_and_record
+    outputs = []
+    elapsed = 0.0
+    for record in reader:
+        start = time.perf_counter()
+        if len(record.dets) == 0:
+            controller.update(np.empty((0, 5)), None)
+            elapsed += time.perf_counter() - start
+            outputs.append({})
+            continue
+        new_bboxes, labels = controller.update(dets=record.dets.copy(), labels=record.labels.copy())
+        elapsed += time.perf_counter() - start
+        outputs.append(
+            {int(row[4]): (row[:4], label, predicted.get(int(row[4]))) for row, label in zip(new_bboxes, labels)}
+        )
+    return outputs, elapsed
+
+
+def compare(reference, outputs):
+    """
+    Agreement of a tracker output with the reference (full Kalman update) output.
+
+    Returns
+    -------
+    dict
+        Fraction of frames with the same set of track ids, mean and 1st percentile IoU of the boxes of common tracks,
+        fraction of common tracks with the same label, and mean IoU of the Kalman predictions with the observations
+        they were matched to.
+    """
+    same_ids = 0
+    ious = []
+    same_labels = 0
+    prediction_ious = []
+    for expected, actual in zip(reference, outputs):
+        same_ids += expected.keys() == actual.keys()
+        for track_id in expected.keys() & actual.keys():
+            ious.append(iou_batch(expected[track_id][0][None], actual[track_id][0][None])[0, 0])
+            same_labels += expected[track_id][1] == actual[track_id][1]
+        for box, _, prediction in actual.values():
+            if prediction is not None:
+                prediction_ious.append(iou_batch(prediction[None], box[None])[0, 0])
+    ious = np.asarray(ious) if ious else np.ones(1)
+    return {
+        "same_ids": same_ids / max(len(reference), 1),
+        "mean_iou": float(ious.mean()),
+        "p1_iou": float(np.percentile(ious, 1)),
+        "same_labels": same_labels / max(len(ious), 1),
+        "prediction_iou": float(np.mean(prediction_ious)) if prediction_ious else float("nan"),
+    }
+
+
+def benchmark_steady_state(path, hits=(3, 5, 10, 20), repeats=3):
+    """
+    Accuracy and speed of the steady-state Kalman gain mode against the full update, for several switch points.
+
+    Parameters
+    ----------
+    path : str
+        Path to a trace recorded with --record-trace.
+    hits : tuple of int
+        Values of `steady_state_hits` to evaluate.
+    repeats : int
+        Number of timed replays per mode, the fastest is reported. Accuracy comes from one extra untimed replay.
+
+    Returns
+    -------
+    list of dict
+        One row per mode, the full update first.
+    """
+    rows = []
+    with TraceReader(path) as reader:
+        reference = None
+        for steady_state_hits in (None,) + tuple(hits):
+            outputs, _ = run_trace(reader, steady_state_hits, record_predictions=True)
+            best = min(run_trace(reader, steady_state_hits)[1] for _ in range(repeats))
+            if reference is None:
+                reference = outputs
+            row = {"hits": steady_state_hits, "fps": len(reader) / best}
+            row.update(compare(reference, outputs))
+            rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Steady-state Kalman gain mode against the full update on traces")
+    parser.add_argument("traces", nargs="+", type=str, help="Paths to traces recorded with --record-trace")
+    parser.add_argument("--hits", nargs="+", default=[3, 5, 10, 20], type=int, help="Values of steady_state_hits")
+    parser.add_argument("--repeats", default=3, type=int, help="Replays per mode, the fastest is reported")
+    args = parser.parse_args()
+
+    for trace in args.traces:
+        rows = benchmark_steady_state(trace, hits=tuple(args.hits), repeats=args.repeats)
+        print(trace)
+        print(
+            f"{'hits':>6}{'fps':>10}{'speedup':>10}{'same ids':>10}{'mean IoU':>10}{'p1 IoU':>10}{'labels':>10}"
+            f"{'pred IoU':>10}"
+        )
+        for row in rows:
+            hits = "full" if row["hits"] is None else row["hits"]
+            print(
+                f"{hits:>6}{row['fps']:>10.0f}{row['fps'] / rows[0]['fps']:>10.2f}{row['same_ids']:>10.3f}"
+                f"{row['mean_iou']:>10.4f}{row['p1_iou']:>10.4f}{row['same_labels']:>10.3f}"
+                f"{row['prediction_iou']:>10.4f}"
+            )
@@ -0,0 +1,56 @@
+import argparse
+import sys
+import time
+
+from main_controller import MainController
+from ocsort import IdAllocator
+from utils import TraceReader, replay_trace
+
+
+def benchmark_trace(path, repeats=5, check=True):
+    """
+    Replay a recorded trace into the tracker alone (OC-SORT, Kalman filter and Deque gesture logic).
+
+    Parameters
+    ----------
+    path : str
+        Path to a trace recorded with --record-trace.
+    repeats : int
+        Number of timed replays.
+    check : bool
+        Verify that every replay reproduces the recorded output bit for bit.
+
+    Returns
+    -------
+    fps : list of float
+        Frames per second of every replay.
+    mismatches : list of int
+        Frame indices whose output differs from the recording, from the first replay.
+    """
+    fps = []
+    mismatches = []
+    with TraceReader(path) as reader:
+        for i in range(repeats):
+            controller = MainController(None, None, ids=IdAllocator(reader.id_base))
+            start = time.perf_counter()
+            result = replay_trace(controller, reader, check=check and i == 0)
+            fps.append(len(reader) / (time.perf_counter() - start))
+            if i == 0:
+                mismatches = result
+    return fps, mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tracker on a recorded trace")
+    parser.add_argument("trace", type=str, help="Path to a trace recorded with --record-trace")
+    parser.add_argument("--repeats", default=5, type=int, help="Number of timed replays")
+    parser.add_argument("--no-check", action="store_true", help="Skip the bit-identical output check")
+    args = parser.parse_args()
+
+    fps, mismatches = benchmark_trace(args.trace, repeats=args.repeats, check=not args.no_check)
+    print(f"Tracker fps: best {max(fps):.0f}, mean {sum(fps) / len(fps):.0f}")
+    if not args.no_check:
+        if mismatches:
+            print(f"Output differs from the recording on {len(mismatches)} frames, first: {mismatches[:10]}")
+            sys.exit(1)
+        print("Output is identical to the recording")
@@ -1,7 +1,11 @@
+import argparse
+import time
+
 import numpy as np
 
 from ocsort import (
-    KalmanBoxTracker,
+    BoxCosts,
+    TrackTable,
     associate,
     ciou_batch,
     ct_dist,
@@ -11,38 +15,74 @@ from ocsort import (
     linear_assignment,
 )
 from onnx_models import HandClassification, HandDetection
-from utils import Deque, Drawer, Hand
+from utils import (
+    QUALITY_LEVELS,
+    CapturedFrame,
+    Deque,
+    Drawer,
+    GestureEvent,
+    Hand,
+    metrics,
+    pack_deques,
+    targets,
+    timed,
+    unpack_deques,
+)
 
 ASSO_FUNCS = {"iou": iou_batch, "giou": giou_batch, "ciou": ciou_batch, "diou": diou_batch, "ct_dist": ct_dist}
+# Label smoothing weight of --label-alpha without a value in the demo scripts, see MainController(label_alpha).
+LABEL_ALPHA = 0.3
 
 
-def k_previous_obs(observations, cur_age, k):
-    if len(observations) == 0:
-        return [-1, -1, -1, -1, -1]
-    for i in range(k):
-        dt = k - i
-        if cur_age - dt in observations:
-            return observations[cur_age - dt]
-    max_age = max(observations.keys())
-    return observations[max_age]
+def parse_label_alpha(value):
+    """
+    argparse type of --label-alpha, a label smoothing weight in (0, 1].
+    """
+    try:
+        alpha = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value!r}") from None
+    if not 0 < alpha <= 1:
+        raise argparse.ArgumentTypeError(f"must be in (0, 1], got {value}")
+    return alpha
 
 
 class MainController:
     """
     Main tracking function.
-    Class contains a list of tracks, each track contains a KalmanBoxTracker object and a Deque object with Hand objects.
+    Class contains a TrackTable of tracks, each track has a KalmanBoxTracker object and a Deque object with Hand objects.
     """
 
     def __init__(
-        self, detection_model, classification_model, max_age=30, min_hits=3, iou_threshold=0.3, maxlen=30, min_frames=20
+        self,
+        detection_model,
+        classification_model,
+        max_age=30,
+        min_hits=3,
+        iou_threshold=0.3,
+        maxlen=30,
+        min_frames=20,
+        steady_state_hits=None,
+        precision="fp32",
+        session_config=None,
+        letterbox=False,
+        tiled=False,
+        mirror=False,
+        motion_gate=None,
+        quality=None,
+        ids=None,
+        event_bus=None,
+        label_alpha=None,
+        label_enter=0.6,
+        label_leave=0.4,
     ):
         """
         Parameters
         ----------
-        detection_model : str
-            Path to detection model.
-        classification_model : str
-            Path to classification model.
+        detection_model : str or None
+            Path to detection model. None creates a tracker-only controller fed through `update`.
+        classification_model : str or None
+            Path to classification model. None creates a tracker-only controller fed through `update`.
         max_age : int
             Maximum age of track.
         min_hits : int
@@ -53,6 +93,41 @@ class MainController:
             Maximum length of deque in track.
         min_frames : int
             Minimum number of frames to confirm track.
+        steady_state_hits : int or None
+            Switch tracks to a precomputed steady-state Kalman gain after this many consecutive hits, cheaper but
+            approximate. None (default) always runs the full Kalman update.
+        precision : str
+            Variant of both models, "fp32" (default), "fp16" or "int8", see quantize.py.
+        session_config : dict, "auto" or None
+            onnxruntime session configuration of both models, "auto" for the per-host tuned one, see OnnxModel.
+        letterbox : bool
+            Feed the detector the frame scaled with its aspect ratio kept and padded, instead of stretched.
+        tiled : bool
+            Search the regions of small tracks again at a higher resolution, see HandDetection.
+        mirror : bool
+            Track hands in the horizontally mirrored frame without flipping its pixels, see OnnxModel. Returned boxes
+            are in mirrored coordinates, as if the frame had been flipped.
+        motion_gate : utils.MotionGate or None
+            Skip the detector on frames without change while no hand is tracked, see MotionGate. Skipped frames do not
+            update the tracks.
+        quality : utils.QualityController or None
+            Degrade the pipeline step by step when frames take longer than its budget and restore it when there is
+            headroom again, see QUALITY_LEVELS. None always runs at full quality.
+        ids : ocsort.IdAllocator or None
+            Ids of the tracks. None numbers the tracks of this controller from 0, independently of other controllers;
+            controllers given the same allocator never return the same id.
+        event_bus : utils.EventBus or None
+            Receives a GestureEvent for every dynamic gesture recognized by __call__, stamped with the capture time of
+            a CapturedFrame or the time of the call. The gestures of the last frame are in `events` either way.
+        label_alpha : float or None
+            Return a smoothed label per track instead of the gesture of its last detection: the class probabilities of
+            its detections are averaged with this weight for a new one, and the label only changes to a class whose
+            average reaches `label_enter` once the current one has fallen below `label_leave`. None (default)
+            returns the gesture of the last detection. Dynamic gestures always use the per-frame gestures.
+        label_enter : float
+            Average probability a gesture needs to become the label of a track.
+        label_leave : float
+            Average probability under which the label of a track may change.
         """
         self.maxlen = maxlen
         self.min_frames = min_frames
@@ -61,14 +136,111 @@ class MainController:
         self.delta_t = 3
         self.iou_threshold = iou_threshold
         self.inertia = 0.2
-        self.asso_func = ASSO_FUNCS["giou"]
-        self.tracks = []
+        # Metric of the second (OCR) association round, computed by ocr_costs on the unmatched pairs unless it is
+        # ct_dist.
+        self.asso_metric = "giou"
+        self.asso_func = ASSO_FUNCS[self.asso_metric]
+        self.box_costs = BoxCosts()
+        self.ocr_costs = BoxCosts()
+        if label_alpha is not None and not 0 < label_alpha <= 1:
+            raise ValueError(f"label_alpha must be in (0, 1], got {label_alpha}")
+        self.label_alpha = label_alpha
+        self.label_enter = label_enter
+        self.label_leave = label_leave
+        self.tracks = TrackTable(
+            delta_t=self.delta_t,
+            steady_state_hits=steady_state_hits,
+            ids=ids,
+            label_classes=len(targets) if label_alpha is not None else 0,
+        )
         self.frame_count = 0
-        self.detection_model = HandDetection(detection_model)
-        self.classification_model = HandClassification(classification_model)
+        self.detection_model = (
+            HandDetection(
+                detection_model,
+                precision=precision,
+                session_config=session_config,
+                letterbox=letterbox,
+                mirror=mirror,
+            )
+            if detection_model is not None
+            else None
+        )
+        self.classification_model = (
+            HandClassification(classification_model, precision=precision, session_config=session_config, mirror=mirror)
+            if classification_model is not None
+            else None
+        )
+        self.tiled = tiled
+        # Tracks missed for more frames than this are not searched by the tiled pass, the hand probably left.
+        self.tiled_max_misses = 5
+        self.motion_gate = motion_gate
+        self.quality = quality
+        # Label reuse of the degraded levels: a detection overlapping a track by at least reuse_iou takes its gesture
+        # when the last reuse_frames gestures of the track agree. Every label_refresh-th frame classifies all hands.
+        self.reuse_iou = 0.5
+        self.reuse_frames = 3
+        self.label_refresh = 4
+        # Output of the last frame, repeated on the frames the detector skips.
+        self.last_output = (None, None, None)
+        # Consecutive frames without detections. Tracks only age on frames with detections, so after max_age of these
+        # the remaining ones are stale.
+        self.empty_frames = 0
         self.drawer = Drawer()
+        # (track id, Event) of the dynamic gestures fired during the last update.
+        self.events = []
+        # Smoothed labels of the tracks returned by the last update, with label_alpha set.
+        self.stable_labels = None
+        self.event_bus = event_bus
+        # Optional utils.trace.TraceWriter recording the tracker input and output of every frame.
+        self.trace_writer = None
+        self.frame_index = 0
+
+    def reset(self, id_base=None):
+        """
+        Forget all tracks and per-session state, to start tracking a new scene with the same models. The trackers of
+        the tracks are recycled for the next hands.
+
+        Parameters
+        ----------
+        id_base : int or None
+            Restart the track ids from this value, None continues the sequence.
+        """
+        self.tracks.reset(id_base)
+        self.frame_count = 0
+        self.frame_index = 0
+        self.empty_frames = 0
+        self.last_output = (None, None, None)
+        self.events = []
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.quality is not None:
+            self.quality.reset()
+
+    def get_state(self):
+        """
+        Tracker and gesture state, as a dict of arrays: Kalman filters, observation windows, hands of the track
+        Deques, the next track id and the frame counters. See SnapshotFile to store it.
+        """
+        state = self.tracks.get_state()
+        state.update(pack_deques(self.tracks.payloads))
+        state["frame_count"] = np.array(self.frame_count, dtype=np.int64)
+        state["frame_index"] = np.array(self.frame_index, dtype=np.int64)
+        state["empty_frames"] = np.array(self.empty_frames, dtype=np.int64)
+        return state
 
-    def update(self, dets=np.empty((0, 5)), labels=None):
+    def set_state(self, state):
+        """
+        Continue from a state returned by get_state, e.g. after a restart of the process. The controller then
+        produces the same tracks and dynamic gestures as the one the state was taken from.
+        """
+        self.reset()
+        self.tracks.set_state(state, unpack_deques(state, self.maxlen, self.min_frames))
+        self.frame_count = int(state["frame_count"])
+        self.frame_index = int(state["frame_index"])
+        self.empty_frames = int(state["empty_frames"])
+
+    @timed("tracker_update_seconds")
+    def update(self, dets=np.empty((0, 5)), labels=None, probs=None):
         """
         Parameters
         ----------
@@ -77,6 +249,9 @@ class MainController:
             Requires: this method must be called once for each frame even with empty detections (use np.empty((0, 5)) for frames without detections).
         labels : np.array
             Labels with shape (N, 1) where N is number of bounding boxes.
+        probs : np.array or None
+            Class probabilities of the detections, shape (N, classes), NaN rows for unknown ones. With label_alpha
+            set, they update the smoothed labels of the tracks, returned in `stable_labels`.
 
         Returns
         -------
@@ -88,123 +263,166 @@ class MainController:
         The number of objects returned may differ from the number of detections provided.
 
         """
+        tracks = self.tracks
+        self.events = []
+        self.stable_labels = None
         if len(dets) == 0:
-            for trk in self.tracks:
-                trk["hands"].append(Hand(bbox=None, gesture=None))
+            for i in range(len(tracks)):
+                self._append_hand(i, Hand(bbox=None, gesture=None))
             return
 
         self.frame_count += 1
 
         # get predicted locations from existing trackers.
-        trks = np.zeros((len(self.tracks), 5))
-        to_del = []
-        ret = []
-        lbs = []
-        for t, trk in enumerate(trks):
-            pos = self.tracks[t]["tracker"].predict()[0]
-            trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-            if np.any(np.isnan(pos)):
-                to_del.append(t)
-        trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-        for t in reversed(to_del):
-            self.tracks.pop(t)
-
-        velocities = np.array(
-            [
-                trk["tracker"].velocity if trk["tracker"].velocity is not None else np.array((0, 0))
-                for trk in self.tracks
-            ]
-        )
-        last_boxes = np.array([trk["tracker"].last_observation for trk in self.tracks])
-        k_observations = np.array(
-            [k_previous_obs(trk["tracker"].observations, trk["tracker"].age, self.delta_t) for trk in self.tracks]
-        )
+        with metrics.timer("tracker_predict_seconds"):
+            trks = tracks.predict()
+        velocities = tracks.velocities
+        last_boxes = tracks.last_boxes
+        k_observations = tracks.k_observations
 
         """
             First round of association
         """
-        matched, unmatched_dets, unmatched_trks = associate(
-            dets, trks, self.iou_threshold, velocities, k_observations, self.inertia
-        )
+        with metrics.timer("tracker_association_seconds"):
+            if len(trks) > 0:
+                iou_matrix = self.box_costs.compute(dets, trks).iou()
+            else:
+                iou_matrix = None
+            matched, unmatched_dets, unmatched_trks = associate(
+                dets, trks, self.iou_threshold, velocities, k_observations, self.inertia, iou_matrix=iou_matrix
+            )
 
+        tracks.observe(matched[:, 1], dets[matched[:, 0]])
         for m in matched:
-            self.tracks[m[1]]["tracker"].update(dets[m[0], :])
-            self.tracks[m[1]]["hands"].append(Hand(bbox=dets[m[0], :4], gesture=labels[m[0]]))
+            self._append_hand(m[1], Hand(bbox=dets[m[0], :4], gesture=labels[m[0]]))
 
         """
             Second round of associaton by OCR
         """
+        ocr_dets = ocr_trks = np.empty(0, dtype=np.int64)
         if unmatched_dets.shape[0] > 0 and unmatched_trks.shape[0] > 0:
-            left_dets = dets[unmatched_dets]
-            left_trks = last_boxes[unmatched_trks]
-            iou_left = self.asso_func(left_dets, left_trks)
-            iou_left = np.array(iou_left)
-            if iou_left.max() > self.iou_threshold:
+            with metrics.timer("tracker_ocr_association_seconds"):
+                if self.asso_metric in ("iou", "giou", "diou", "ciou"):
+                    self.ocr_costs.compute(dets[unmatched_dets], last_boxes[unmatched_trks])
+                    iou_left = self.ocr_costs.metric(self.asso_metric)
+                else:
+                    iou_left = self.asso_func(dets[unmatched_dets], last_boxes[unmatched_trks])
+                    iou_left = np.array(iou_left)
                 """
                 NOTE: by using a lower threshold, e.g., self.iou_threshold - 0.1, you may
                 get a higher performance especially on MOT17/MOT20 datasets. But we keep it
                 uniform here for simplicity
                 """
-                rematched_indices = linear_assignment(-iou_left)
-                to_remove_det_indices = []
-                to_remove_trk_indices = []
-                for m in rematched_indices:
-                    det_ind, trk_ind = unmatched_dets[m[0]], unmatched_trks[m[1]]
-                    if iou_left[m[0], m[1]] < self.iou_threshold:
-                        continue
-                    self.tracks[trk_ind]["tracker"].update(dets[det_ind, :])
-                    self.tracks[trk_ind]["hands"].append(Hand(bbox=dets[det_ind, :4], gesture=labels[det_ind]))
-                    to_remove_det_indices.append(det_ind)
-                    to_remove_trk_indices.append(trk_ind)
-                unmatched_dets = np.setdiff1d(unmatched_dets, np.array(to_remove_det_indices))
-                unmatched_trks = np.setdiff1d(unmatched_trks, np.array(to_remove_trk_indices))
+                rematched_indices = linear_assignment(-iou_left) if iou_left.max() > self.iou_threshold else None
+            if rematched_indices is not None:
+                rematched_indices = rematched_indices[
+                    iou_left[rematched_indices[:, 0], rematched_indices[:, 1]] >= self.iou_threshold
+                ]
+                det_inds = unmatched_dets[rematched_indices[:, 0]]
+                trk_inds = unmatched_trks[rematched_indices[:, 1]]
+                tracks.observe(trk_inds, dets[det_inds])
+                for det_ind, trk_ind in zip(det_inds, trk_inds):
+                    self._append_hand(trk_ind, Hand(bbox=dets[det_ind, :4], gesture=labels[det_ind]))
+                ocr_dets, ocr_trks = det_inds, trk_inds
+                unmatched_dets = np.setdiff1d(unmatched_dets, det_inds)
+                unmatched_trks = np.setdiff1d(unmatched_trks, trk_inds)
 
+        tracks.miss(unmatched_trks)
         for m in unmatched_trks:
-            self.tracks[m]["tracker"].update(None)
-            self.tracks[m]["hands"].append(Hand(bbox=None, gesture=None))
+            self._append_hand(m, Hand(bbox=None, gesture=None))
 
         # create and initialise new trackers for unmatched detections
+        first_new = len(tracks)
         for i in unmatched_dets:
-            self.tracks.append(
-                {
-                    "hands": Deque(self.maxlen, self.min_frames),
-                    "tracker": KalmanBoxTracker(dets[i, :], delta_t=self.delta_t),
-                }
+            tracks.create(dets[i, :], Deque(self.maxlen, self.min_frames))
+
+        smoothing = self.label_alpha is not None and probs is not None
+        if smoothing:
+            tracks.smooth_labels(
+                np.concatenate((matched[:, 1], ocr_trks, np.arange(first_new, len(tracks)))).astype(np.int64),
+                probs[np.concatenate((matched[:, 0], ocr_dets, unmatched_dets)).astype(np.int64)],
+                self.label_alpha,
+                self.label_enter,
+                self.label_leave,
             )
-        i = len(self.tracks)
-        for trk in reversed(self.tracks):
-            if trk["tracker"].last_observation.sum() < 0:
-                d = trk["tracker"].get_state()[0]
-            else:
-                """
-                this is optional to use the recent observation or the kalman filter prediction,
-                we didn't notice significant difference here
-                """
-                d = trk["tracker"].last_observation[:4]
-            if (trk["tracker"].time_since_update < 1) and (
-                trk["tracker"].hit_streak >= self.min_hits or self.frame_count <= self.min_hits
-            ):
-                # +1 as MOT benchmark requires positive
-                ret.append(np.concatenate((d, [trk["tracker"].id + 1])).reshape(1, -1))
-                if len(trk["hands"]) > 0:
-                    lbs.append(trk["hands"][-1].gesture)
-                else:
-                    lbs.append(None)
-
-            i -= 1
-            # remove dead tracklet
-            if trk["tracker"].time_since_update > self.max_age:
-                self.tracks.pop(i)
-        if len(ret) > 0:
-            return np.concatenate(ret), lbs
+
+        confirmed = (tracks.time_since_update < 1) & (
+            (tracks.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits)
+        )
+        # reversed creation order, as in the reference OC-SORT implementation
+        rows = np.flatnonzero(confirmed)[::-1]
+        # remove dead tracklet
+        tracks.alive[:] = tracks.time_since_update <= self.max_age
+
+        if len(rows) > 0:
+            """
+            this is optional to use the recent observation or the kalman filter prediction,
+            we didn't notice significant difference here
+            """
+            ret = np.empty((len(rows), 5))
+            ret[:, :4] = tracks.states(rows)
+            # +1 as MOT benchmark requires positive
+            ret[:, 4] = tracks.ids[rows] + 1
+            lbs = [tracks.payloads[i][-1].gesture if len(tracks.payloads[i]) > 0 else None for i in rows]
+            if smoothing:
+                self.stable_labels = [None if label < 0 else label for label in tracks.labels[rows].tolist()]
+            tracks.compact()
+            return ret, lbs
+        tracks.compact()
         return np.empty((0, 5)), np.empty((0, 1))
 
+    def _append_hand(self, row, hand):
+        hands = self.tracks.payloads[row]
+        if hands.append(hand):
+            # +1 as the ids returned by update
+            self.events.append((int(self.tracks.ids[row]) + 1, hands.action))
+
+    def _classify(self, frame, bboxes, reuse_labels):
+        """
+        Gestures of the detections, reusing the stable gestures of the tracks they overlap when `reuse_labels` is set.
+
+        Returns
+        -------
+        labels : np.ndarray
+            Gesture of every detection.
+        probs : np.ndarray or None
+            Class probabilities of the detections with label smoothing, NaN rows for reused gestures. None without.
+        """
+        tracks = self.tracks
+        return_probs = self.label_alpha is not None
+        if not reuse_labels or self.frame_index % self.label_refresh == 0:
+            if return_probs:
+                return self.classification_model(frame, bboxes, return_probs=True)
+            return self.classification_model(frame, bboxes), None
+        labels = np.full(len(bboxes), -1, dtype=np.int64)
+        probs = np.full((len(bboxes), len(targets)), np.nan) if return_probs else None
+        rows = np.flatnonzero(tracks.time_since_update == 0)
+        if len(rows) > 0:
+            ious = iou_batch(bboxes, tracks.last_boxes[rows, :4])
+            best = ious.argmax(axis=1)
+            for det, (column, row) in enumerate(zip(best, rows[best])):
+                hands = tracks.payloads[row]
+                if ious[det, column] < self.reuse_iou or len(hands) < self.reuse_frames:
+                    continue
+                gestures = {hands[i].gesture for i in range(-self.reuse_frames, 0)}
+                if len(gestures) == 1 and None not in gestures:
+                    labels[det] = gestures.pop()
+        todo = np.flatnonzero(labels < 0)
+        if len(todo) > 0:
+            if return_probs:
+                labels[todo], probs[todo] = self.classification_model(frame, bboxes[todo], return_probs=True)
+            else:
+                labels[todo] = self.classification_model(frame, bboxes[todo])
+        return labels, probs
+
     def __call__(self, frame):
         """
         Parameters
         ----------
-        frame : np.array
-            Image frame with shape (H, W, 3).
+        frame : np.array or CapturedFrame
+            Image frame with shape (H, W, 3). The detector of a CapturedFrame runs on its reduced plane, and its full
+            resolution frame is only decoded for the classifier when hands are detected. Boxes are in full resolution
+            coordinates either way.
 
         Returns
         -------
@@ -212,12 +430,63 @@ class MainController:
 
 
         """
-        bboxes, probs = self.detection_model(frame)
+        if self.quality is None:
+            output = self._track(frame, QUALITY_LEVELS[0])
+        else:
+            start = time.perf_counter()
+            output = self._track(frame, self.quality.settings)
+            self.quality.update(time.perf_counter() - start)
+        self.last_output = output
+        if self.events and self.event_bus is not None:
+            timestamp = frame.timestamp if isinstance(frame, CapturedFrame) else time.time()
+            self.event_bus.publish([GestureEvent(track_id, event, timestamp) for track_id, event in self.events])
+        return output
+
+    def _track(self, frame, quality):
+        frame_index = self.frame_index
+        self.frame_index += 1
+        if quality.detect_interval > 1 and frame_index % quality.detect_interval:
+            self.events = []
+            return self.last_output
+        if isinstance(frame, CapturedFrame):
+            detection_frame = frame.plane(min(frame.reduction * quality.reduction, 8))
+            full_shape = frame.shape[:2]
+        else:
+            detection_frame, full_shape = frame, None
+        if self.motion_gate is not None:
+            idle = len(self.tracks) == 0 or self.empty_frames > self.max_age
+            if not self.motion_gate(detection_frame, idle):
+                self.events = []
+                return None, None, None
+        if self.tiled and quality.tiled:
+            tracks = self.tracks
+            recent = (tracks.last_boxes.sum(axis=1) >= 0) & (tracks.time_since_update <= self.tiled_max_misses)
+            bboxes, probs = self.detection_model(
+                detection_frame, rois=tracks.last_boxes[recent, :4], full_shape=full_shape
+            )
+        else:
+            bboxes, probs = self.detection_model(detection_frame, full_shape=full_shape)
+        if quality.max_hands is not None and len(bboxes) > quality.max_hands:
+            keep = np.sort(np.argsort(-probs, kind="stable")[: quality.max_hands])
+            bboxes, probs = bboxes[keep], probs[keep]
         if len(bboxes):
-            labels = self.classification_model(frame, bboxes)
+            self.empty_frames = 0
+            if isinstance(frame, CapturedFrame):
+                frame = frame.full
+            labels, class_probs = self._classify(frame, bboxes, quality.reuse_labels)
             bboxes = np.concatenate((bboxes, np.expand_dims(probs, axis=1)), axis=1)
-            new_bboxes, labels = self.update(dets=bboxes, labels=labels)
-            return new_bboxes[:, :-1], new_bboxes[:, -1], labels
+            new_bboxes, new_labels = self.update(dets=bboxes, labels=labels, probs=class_probs)
+            if self.trace_writer is not None:
+                # Traces keep the per-frame gestures, a replay has no probabilities to smooth.
+                self.trace_writer.write(
+                    frame_index, time.time(), bboxes, labels, new_bboxes[:, :-1], new_bboxes[:, -1], new_labels
+                )
+            if self.stable_labels is not None:
+                new_labels = self.stable_labels
+            return new_bboxes[:, :-1], new_bboxes[:, -1], new_labels
         else:
+            self.empty_frames += 1
             self.update(np.empty((0, 5)), None)
+            if self.trace_writer is not None:
+                self.trace_writer.write(frame_index, time.time(), np.empty((0, 5)), None)
             return None, None, None
@@ -1,2 +1,6 @@
-from .association import associate, ciou_batch, ct_dist, diou_batch, giou_batch, iou_batch, linear_assignment
+from .assignment import get_assignment_backend, set_assignment_backend
+from .association import BoxCosts, associate, ciou_batch, ct_dist, diou_batch, giou_batch, iou_batch, linear_assignment
+from .ids import IdAllocator
 from .kalmanboxtracker import KalmanBoxTracker
+from .track_table import TrackTable
+from .smoothing import smooth_tracks
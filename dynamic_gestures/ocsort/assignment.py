@@ -0,0 +1,203 @@
+"""
+Linear assignment backends, resolved once at import.
+
+    lap     lap.lapjv, when the package is installed
+    scipy   scipy.optimize.linear_sum_assignment
+    auto    the fastest optimal solver measured for the matrix size by `python -m benchmarks.assignment --save`,
+            otherwise argmin for a single detection or track and lap (or scipy without it) for larger matrices
+    greedy  cheapest remaining pair first, not optimal
+
+All backends return an int array of (row, column) pairs sorted by row.
+
+The measured choices are stored in a JSON profile, DYNAMIC_GESTURES_ASSIGNMENT_PROFILE overrides its default path.
+"""
+import json
+import os
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+try:
+    import lap
+except ImportError:
+    lap = None
+
+
+def _pairs(rows, cols):
+    pairs = np.empty((len(rows), 2), dtype=np.intp)
+    pairs[:, 0] = rows
+    pairs[:, 1] = cols
+    return pairs
+
+
+def solve_lap(cost_matrix):
+    _, x, _ = lap.lapjv(cost_matrix, extend_cost=True)
+    rows = np.flatnonzero(x >= 0)
+    return _pairs(rows, x[rows])
+
+
+def solve_scipy(cost_matrix):
+    rows, cols = linear_sum_assignment(cost_matrix)
+    return _pairs(rows, cols)
+
+
+def solve_single(cost_matrix):
+    """
+    Optimal assignment of a matrix with a single row or column.
+    """
+    pairs = np.empty((1, 2), dtype=np.intp)
+    if cost_matrix.shape[0] == 1:
+        pairs[0] = 0, cost_matrix[0].argmin()
+    else:
+        pairs[0] = cost_matrix[:, 0].argmin(), 0
+    return pairs
+
+
+def solve_greedy(cost_matrix):
+    """
+    Cheapest remaining pair first. Not optimal, see set_assignment_backend.
+    """
+    n, m = cost_matrix.shape
+    row_used = np.zeros(n, dtype=bool)
+    col_used = np.zeros(m, dtype=bool)
+    rows, cols = [], []
+    for index in np.argsort(cost_matrix, axis=None, kind="stable"):
+        row, col = divmod(int(index), m)
+        if not row_used[row] and not col_used[col]:
+            row_used[row] = col_used[col] = True
+            rows.append(row)
+            cols.append(col)
+            if len(rows) == min(n, m):
+                break
+    order = np.argsort(rows)
+    return _pairs(np.asarray(rows, dtype=np.intp)[order], np.asarray(cols, dtype=np.intp)[order])
+
+
+_optimal = solve_lap if lap is not None else solve_scipy
+
+# Optimal solvers auto may pick per matrix size.
+OPTIMAL_SOLVERS = {"single": solve_single, "scipy": solve_scipy}
+if lap is not None:
+    OPTIMAL_SOLVERS["lap"] = solve_lap
+
+PROFILE_VERSION = 1
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dynamic_gestures", "assignment_profile.json")
+
+
+def profile_path():
+    """
+    Path of the measured backend profile, DYNAMIC_GESTURES_ASSIGNMENT_PROFILE overrides the default.
+    """
+    return os.environ.get("DYNAMIC_GESTURES_ASSIGNMENT_PROFILE", DEFAULT_PROFILE_PATH)
+
+
+def load_profile(path=None):
+    """
+    Solver of every measured matrix size.
+
+    Returns
+    -------
+    dict
+        (N, M) -> solver function, empty when there is no usable profile. Solvers missing on this host and single
+        for a matrix with several rows and columns are left out.
+    """
+    try:
+        with open(path or profile_path()) as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(profile, dict) or profile.get("version") != PROFILE_VERSION:
+        return {}
+    solvers = {}
+    for size, name in profile.get("sizes", {}).items():
+        try:
+            n, m = (int(value) for value in size.split("x"))
+        except ValueError:
+            continue
+        if name in OPTIMAL_SOLVERS and (name != "single" or 1 in (n, m)):
+            solvers[(n, m)] = OPTIMAL_SOLVERS[name]
+    return solvers
+
+
+def save_profile(choices, path=None):
+    """
+    Store the solver names of (N, M) sizes for auto, e.g. the fastest ones measured by benchmarks.assignment.
+    """
+    path = path or profile_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": PROFILE_VERSION, "sizes": {f"{n}x{m}": name for (n, m), name in choices.items()}}, f)
+    os.replace(tmp_path, path)
+
+
+def set_assignment_profile(profile):
+    """
+    Replace the per-size solvers of auto, a dict as returned by load_profile.
+    """
+    global _profile
+    _profile = dict(profile)
+
+
+_profile = load_profile()
+
+
+def solve_auto(cost_matrix):
+    solve = _profile.get(cost_matrix.shape)
+    if solve is not None:
+        return solve(cost_matrix)
+    if 1 in cost_matrix.shape:
+        return solve_single(cost_matrix)
+    return _optimal(cost_matrix)
+
+
+BACKENDS = {"auto": solve_auto, "scipy": solve_scipy, "greedy": solve_greedy}
+if lap is not None:
+    BACKENDS["lap"] = solve_lap
+
+_backend = "auto"
+_solve = solve_auto
+
+
+def set_assignment_backend(backend):
+    """
+    Select the solver used by `linear_assignment`.
+
+    "greedy" is not optimal: it takes the cheapest remaining pair first and can miss the assignment with the lowest
+    total cost, so it changes which detections match which tracks. It is only meant for comparisons in the
+    benchmark, do not select it in production.
+
+    Parameters
+    ----------
+    backend : str or callable
+        Name in BACKENDS, or a function taking a cost matrix and returning (row, column) pairs.
+    """
+    global _backend, _solve
+    if callable(backend):
+        _backend, _solve = getattr(backend, "__name__", "custom"), backend
+        return
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable assignment backend {backend!r}, available: {sorted(BACKENDS)}")
+    _backend, _solve = backend, BACKENDS[backend]
+
+
+def get_assignment_backend():
+    return _backend
+
+
+def linear_assignment(cost_matrix):
+    """
+    Solve the linear assignment problem with the selected backend.
+    Parameters
+    ----------
+    cost_matrix: numpy.ndarray
+        shape is [N, M]
+
+    Returns
+    -------
+    indices: numpy.ndarray
+        shape is [min(N, M), 2], (row, column) pairs sorted by row
+    """
+    if cost_matrix.size == 0:
+        return np.empty((0, 2), dtype=np.intp)
+    return _solve(cost_matrix)
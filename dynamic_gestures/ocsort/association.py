@@ -1,5 +1,162 @@
 import numpy as np
 
+from .assignment import linear_assignment
+
+
+class BoxCosts:
+    """
+    Fused IoU/GIoU/DIoU/CIoU cost matrices between two sets of bounding boxes.
+    `compute` evaluates the geometry shared by all metrics (intersection, union and IoU) once, the other metrics
+    are derived from it on request. Results are written into buffers that are reused between calls, so the
+    returned matrices are only valid until the next `compute`.
+    """
+
+    def __init__(self, dtype=np.float64):
+        """
+        Parameters
+        ----------
+        dtype: numpy.dtype
+            Precision of the computation, np.float32 halves the memory traffic for large matrices.
+        """
+        self.dtype = np.dtype(dtype)
+        self.shape = (0, 0)
+        self._buffers = {}
+        self._views = {}
+        self._done = set()
+
+    def _buffer(self, name):
+        view = self._views.get(name)
+        if view is None:
+            size = self.shape[0] * self.shape[1]
+            buffer = self._buffers.get(name)
+            if buffer is None or buffer.size < size:
+                buffer = np.empty(max(size, 16, 0 if buffer is None else 2 * buffer.size), dtype=self.dtype)
+                self._buffers[name] = buffer
+            view = self._views[name] = buffer[:size].reshape(self.shape)
+        return view
+
+    def compute(self, bboxes1, bboxes2):
+        """
+        Parameters
+        ----------
+        bboxes1: numpy.ndarray
+            shape is [N, 4]
+        bboxes2: numpy.ndarray
+            shape is [M, 4]
+
+        Returns
+        -------
+        BoxCosts
+            self, to chain a metric call.
+        """
+        bboxes1 = np.asarray(bboxes1, dtype=self.dtype)
+        bboxes2 = np.asarray(bboxes2, dtype=self.dtype)
+        shape = (bboxes1.shape[0], bboxes2.shape[0])
+        if shape != self.shape:
+            self.shape = shape
+            self._views = {}
+        self._done = {"iou"}
+        # [N, 1] columns against [M] rows broadcast to [N, M]
+        self._x11, self._y11, self._x12, self._y12 = (bboxes1[:, i : i + 1] for i in range(4))
+        self._x21, self._y21, self._x22, self._y22 = (bboxes2[:, i] for i in range(4))
+
+        xx1 = np.maximum(self._x11, self._x21, out=self._buffer("xx1"))
+        yy1 = np.maximum(self._y11, self._y21, out=self._buffer("yy1"))
+        xx2 = np.minimum(self._x12, self._x22, out=self._buffer("xx2"))
+        yy2 = np.minimum(self._y12, self._y22, out=self._buffer("yy2"))
+        w = np.maximum(0.0, np.subtract(xx2, xx1, out=self._buffer("w")), out=self._buffer("w"))
+        h = np.maximum(0.0, np.subtract(yy2, yy1, out=self._buffer("h")), out=self._buffer("h"))
+        wh = np.multiply(w, h, out=self._buffer("wh"))
+        area1 = (self._x12 - self._x11) * (self._y12 - self._y11)
+        area2 = (self._x22 - self._x21) * (self._y22 - self._y21)
+        union = np.add(area1, area2, out=self._buffer("union"))
+        np.subtract(union, wh, out=union)
+        np.divide(wh, union, out=self._buffer("iou"))
+        return self
+
+    def _enclose(self):
+        if "enclose" not in self._done:
+            xxc1 = np.minimum(self._x11, self._x21, out=self._buffer("xx1"))
+            yyc1 = np.minimum(self._y11, self._y21, out=self._buffer("yy1"))
+            xxc2 = np.maximum(self._x12, self._x22, out=self._buffer("xx2"))
+            yyc2 = np.maximum(self._y12, self._y22, out=self._buffer("yy2"))
+            np.subtract(xxc2, xxc1, out=self._buffer("wc"))
+            np.subtract(yyc2, yyc1, out=self._buffer("hc"))
+            self._done.add("enclose")
+        return self._buffer("wc"), self._buffer("hc")
+
+    def _diag_ratio(self):
+        # squared distance between centers over the squared diagonal of the enclosing box
+        ratio = self._buffer("ratio")
+        if "ratio" not in self._done:
+            wc, hc = self._enclose()
+            centerx1 = (self._x11 + self._x12) / 2.0
+            centery1 = (self._y11 + self._y12) / 2.0
+            centerx2 = (self._x21 + self._x22) / 2.0
+            centery2 = (self._y21 + self._y22) / 2.0
+            inner_diag = np.square(np.subtract(centerx1, centerx2, out=ratio), out=ratio)
+            tmp = np.square(np.subtract(centery1, centery2, out=self._buffer("tmp")), out=self._buffer("tmp"))
+            np.add(inner_diag, tmp, out=inner_diag)
+            outer_diag = np.square(wc, out=self._buffer("outer"))
+            np.add(outer_diag, np.square(hc, out=tmp), out=outer_diag)
+            np.divide(inner_diag, outer_diag, out=ratio)
+            self._done.add("ratio")
+        return ratio
+
+    def iou(self):
+        return self._buffer("iou")
+
+    def giou(self):
+        giou = self._buffer("giou")
+        if "giou" not in self._done:
+            wc, hc = self._enclose()
+            assert (wc > 0).all() and (hc > 0).all()
+            area_enclose = np.multiply(wc, hc, out=self._buffer("tmp"))
+            np.subtract(area_enclose, self._buffer("union"), out=giou)
+            np.divide(giou, area_enclose, out=giou)
+            np.subtract(self._buffer("iou"), giou, out=giou)
+            np.add(giou, 1.0, out=giou)
+            np.divide(giou, 2.0, out=giou)  # resize from (-1,1) to (0,1)
+            self._done.add("giou")
+        return giou
+
+    def diou(self):
+        diou = self._buffer("diou")
+        if "diou" not in self._done:
+            np.subtract(self._buffer("iou"), self._diag_ratio(), out=diou)
+            np.add(diou, 1, out=diou)
+            np.divide(diou, 2.0, out=diou)  # resize from (-1,1) to (0,1)
+            self._done.add("diou")
+        return diou
+
+    def ciou(self):
+        ciou = self._buffer("ciou")
+        if "ciou" not in self._done:
+            ratio = self._diag_ratio()
+            w1 = self._x12 - self._x11
+            h1 = self._y12 - self._y11
+            w2 = self._x22 - self._x21
+            h2 = self._y22 - self._y21
+
+            # prevent dividing over zero. add one pixel shift
+            h2 = h2 + 1.0
+            h1 = h1 + 1.0
+            v = np.subtract(np.arctan(w2 / h2), np.arctan(w1 / h1), out=self._buffer("v"))
+            np.square(v, out=v)
+            np.multiply(4 / (np.pi**2), v, out=v)
+            alpha = np.subtract(1, self._buffer("iou"), out=self._buffer("alpha"))
+            np.add(alpha, v, out=alpha)
+            np.divide(v, alpha, out=alpha)
+            np.subtract(self._buffer("iou"), ratio, out=ciou)
+            np.subtract(ciou, np.multiply(alpha, v, out=self._buffer("tmp")), out=ciou)
+            np.add(ciou, 1, out=ciou)
+            np.divide(ciou, 2.0, out=ciou)  # resize from (-1,1) to (0,1)
+            self._done.add("ciou")
+        return ciou
+
+    def metric(self, name):
+        return getattr(self, name)()
+
 
 def iou_batch(bboxes1, bboxes2):
     """
@@ -16,22 +173,7 @@ def iou_batch(bboxes1, bboxes2):
     ious: numpy.ndarray
         shape is [N, M]
     """
-    bboxes2 = np.expand_dims(bboxes2, 0)
-    bboxes1 = np.expand_dims(bboxes1, 1)
-
-    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
-    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
-    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
-    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
-    w = np.maximum(0.0, xx2 - xx1)
-    h = np.maximum(0.0, yy2 - yy1)
-    wh = w * h
-    o = wh / (
-        (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
-        + (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
-        - wh
-    )
-    return o
+    return BoxCosts().compute(bboxes1, bboxes2).iou().copy()
 
 
 def giou_batch(bboxes1, bboxes2):
@@ -50,35 +192,7 @@ def giou_batch(bboxes1, bboxes2):
         shape is [N, M]
     """
     # for details should go to https://arxiv.org/pdf/1902.09630.pdf
-    # ensure predict's bbox form
-    bboxes2 = np.expand_dims(bboxes2, 0)
-    bboxes1 = np.expand_dims(bboxes1, 1)
-
-    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
-    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
-    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
-    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
-    w = np.maximum(0.0, xx2 - xx1)
-    h = np.maximum(0.0, yy2 - yy1)
-    wh = w * h
-    union = (
-        (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
-        + (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
-        - wh
-    )
-    iou = wh / union
-
-    xxc1 = np.minimum(bboxes1[..., 0], bboxes2[..., 0])
-    yyc1 = np.minimum(bboxes1[..., 1], bboxes2[..., 1])
-    xxc2 = np.maximum(bboxes1[..., 2], bboxes2[..., 2])
-    yyc2 = np.maximum(bboxes1[..., 3], bboxes2[..., 3])
-    wc = xxc2 - xxc1
-    hc = yyc2 - yyc1
-    assert (wc > 0).all() and (hc > 0).all()
-    area_enclose = wc * hc
-    giou = iou - (area_enclose - union) / area_enclose
-    giou = (giou + 1.0) / 2.0  # resize from (-1,1) to (0,1)
-    return giou
+    return BoxCosts().compute(bboxes1, bboxes2).giou().copy()
 
 
 def diou_batch(bboxes1, bboxes2):
@@ -97,40 +211,7 @@ def diou_batch(bboxes1, bboxes2):
     dious: numpy.ndarray
     """
     # for details should go to https://arxiv.org/pdf/1902.09630.pdf
-    # ensure predict's bbox form
-    bboxes2 = np.expand_dims(bboxes2, 0)
-    bboxes1 = np.expand_dims(bboxes1, 1)
-
-    # calculate the intersection box
-    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
-    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
-    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
-    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
-    w = np.maximum(0.0, xx2 - xx1)
-    h = np.maximum(0.0, yy2 - yy1)
-    wh = w * h
-    union = (
-        (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
-        + (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
-        - wh
-    )
-    iou = wh / union
-    centerx1 = (bboxes1[..., 0] + bboxes1[..., 2]) / 2.0
-    centery1 = (bboxes1[..., 1] + bboxes1[..., 3]) / 2.0
-    centerx2 = (bboxes2[..., 0] + bboxes2[..., 2]) / 2.0
-    centery2 = (bboxes2[..., 1] + bboxes2[..., 3]) / 2.0
-
-    inner_diag = (centerx1 - centerx2) ** 2 + (centery1 - centery2) ** 2
-
-    xxc1 = np.minimum(bboxes1[..., 0], bboxes2[..., 0])
-    yyc1 = np.minimum(bboxes1[..., 1], bboxes2[..., 1])
-    xxc2 = np.maximum(bboxes1[..., 2], bboxes2[..., 2])
-    yyc2 = np.maximum(bboxes1[..., 3], bboxes2[..., 3])
-
-    outer_diag = (xxc2 - xxc1) ** 2 + (yyc2 - yyc1) ** 2
-    diou = iou - inner_diag / outer_diag
-
-    return (diou + 1) / 2.0  # resize from (-1,1) to (0,1)
+    return BoxCosts().compute(bboxes1, bboxes2).diou().copy()
 
 
 def ciou_batch(bboxes1, bboxes2):
@@ -149,54 +230,7 @@ def ciou_batch(bboxes1, bboxes2):
     ciou: numpy.ndarray
     """
     # for details should go to https://arxiv.org/pdf/1902.09630.pdf
-    # ensure predict's bbox form
-    bboxes2 = np.expand_dims(bboxes2, 0)
-    bboxes1 = np.expand_dims(bboxes1, 1)
-
-    # calculate the intersection box
-    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
-    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
-    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
-    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
-    w = np.maximum(0.0, xx2 - xx1)
-    h = np.maximum(0.0, yy2 - yy1)
-    wh = w * h
-    union = (
-        (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
-        + (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
-        - wh
-    )
-    iou = wh / union
-
-    centerx1 = (bboxes1[..., 0] + bboxes1[..., 2]) / 2.0
-    centery1 = (bboxes1[..., 1] + bboxes1[..., 3]) / 2.0
-    centerx2 = (bboxes2[..., 0] + bboxes2[..., 2]) / 2.0
-    centery2 = (bboxes2[..., 1] + bboxes2[..., 3]) / 2.0
-
-    inner_diag = (centerx1 - centerx2) ** 2 + (centery1 - centery2) ** 2
-
-    xxc1 = np.minimum(bboxes1[..., 0], bboxes2[..., 0])
-    yyc1 = np.minimum(bboxes1[..., 1], bboxes2[..., 1])
-    xxc2 = np.maximum(bboxes1[..., 2], bboxes2[..., 2])
-    yyc2 = np.maximum(bboxes1[..., 3], bboxes2[..., 3])
-
-    outer_diag = (xxc2 - xxc1) ** 2 + (yyc2 - yyc1) ** 2
-
-    w1 = bboxes1[..., 2] - bboxes1[..., 0]
-    h1 = bboxes1[..., 3] - bboxes1[..., 1]
-    w2 = bboxes2[..., 2] - bboxes2[..., 0]
-    h2 = bboxes2[..., 3] - bboxes2[..., 1]
-
-    # prevent dividing over zero. add one pixel shift
-    h2 = h2 + 1.0
-    h1 = h1 + 1.0
-    arctan = np.arctan(w2 / h2) - np.arctan(w1 / h1)
-    v = (4 / (np.pi**2)) * (arctan**2)
-    S = 1 - iou
-    alpha = v / (S + v)
-    ciou = iou - inner_diag / outer_diag - alpha * v
-
-    return (ciou + 1) / 2.0  # resize from (-1,1) to (0,1)
+    return BoxCosts().compute(bboxes1, bboxes2).ciou().copy()
 
 
 def ct_dist(bboxes1, bboxes2):
@@ -262,29 +296,69 @@ def speed_direction_batch(dets, tracks):
     return dy, dx  # size: num_track x num_det
 
 
-def linear_assignment(cost_matrix):
+def velocity_direction_cost(detections, velocities, previous_obs, vdc_weight):
     """
-    Solve the linear assignment problem using scipy.optimize.linear_sum_assignment.
+    Cost from the velocity direction consistency between tracks and detections, weighted by detection scores.
     Parameters
     ----------
-    cost_matrix: numpy.ndarray
-        shape is [N, M]
+    detections: numpy.ndarray
+        shape is [N, 5]
+    velocities: numpy.ndarray
+        shape is [M, 2]
+    previous_obs: numpy.ndarray
+        shape is [M, 5]
+    vdc_weight: float
 
     Returns
     -------
-    indices: numpy.ndarray
-        shape is [N, 2]
+    angle_diff_cost: numpy.ndarray
+        shape is [N, M]
     """
-    try:
-        import lap
+    Y, X = speed_direction_batch(detections, previous_obs)
+    diff_angle_cos = velocities[:, 1:2] * X + velocities[:, 0:1] * Y
+    diff_angle_cos = np.clip(diff_angle_cos, a_min=-1, a_max=1)
+    diff_angle = np.arccos(diff_angle_cos)
+    diff_angle = (np.pi / 2.0 - np.abs(diff_angle)) / np.pi
 
-        _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
-        return np.array([[y[i], i] for i in x if i >= 0])  #
-    except ImportError:
-        from scipy.optimize import linear_sum_assignment
+    valid_mask = np.ones(previous_obs.shape[0])
+    valid_mask[np.where(previous_obs[:, 4] < 0)] = 0
+
+    angle_diff_cost = (valid_mask[:, np.newaxis] * diff_angle) * vdc_weight
+    angle_diff_cost = angle_diff_cost.T
+    return angle_diff_cost * detections[:, -1][:, np.newaxis]
 
-        x, y = linear_sum_assignment(cost_matrix)
-        return np.array(list(zip(x, y)))
+
+def split_matches(matched_indices, iou_matrix, iou_threshold):
+    """
+    Split assignment results into matches and unmatched detections/trackers.
+    Matched pairs below the IoU threshold are moved to the unmatched sets, after the never matched indices.
+    Parameters
+    ----------
+    matched_indices: numpy.ndarray
+        shape is [K, 2]
+    iou_matrix: numpy.ndarray
+        shape is [N, M]
+    iou_threshold: float
+
+    Returns
+    -------
+    matches: numpy.ndarray
+        shape is [K', 2]
+    unmatched_detections: numpy.ndarray
+    unmatched_trackers: numpy.ndarray
+    """
+    num_dets, num_trks = iou_matrix.shape
+    matched_indices = matched_indices.astype(int, copy=False)
+    det_mask = np.ones(num_dets, dtype=bool)
+    det_mask[matched_indices[:, 0]] = False
+    trk_mask = np.ones(num_trks, dtype=bool)
+    trk_mask[matched_indices[:, 1]] = False
+
+    # filter out matched with low IOU
+    low = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] < iou_threshold
+    unmatched_detections = np.concatenate((np.flatnonzero(det_mask), matched_indices[low, 0]))
+    unmatched_trackers = np.concatenate((np.flatnonzero(trk_mask), matched_indices[low, 1]))
+    return matched_indices[~low], unmatched_detections, unmatched_trackers
 
 
 def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
@@ -315,34 +389,12 @@ def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
         else:
             matched_indices = linear_assignment(-iou_matrix)
     else:
-        matched_indices = np.empty(shape=(0, 2))
-
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
-
-    # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+        matched_indices = np.empty(shape=(0, 2), dtype=int)
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    return split_matches(matched_indices, iou_matrix, iou_threshold)
 
 
-def associate(detections, trackers, iou_threshold, velocities, previous_obs, vdc_weight):
+def associate(detections, trackers, iou_threshold, velocities, previous_obs, vdc_weight, iou_matrix=None):
     """
     Assigns detections to tracked object (both represented as bounding boxes)
     Returns 3 lists of matches, unmatched_detections and unmatched_trackers
@@ -359,63 +411,31 @@ def associate(detections, trackers, iou_threshold, velocities, previous_obs, vdc
     previous_obs: numpy.ndarray
         shape is [M, 4]
     vdc_weight: float
+    iou_matrix: numpy.ndarray
+        shape is [N, M], IoUs between detections and trackers when already computed, e.g. by BoxCosts
     """
     if len(trackers) == 0:
         return np.empty((0, 2), dtype=int), np.arange(len(detections)), np.empty((0, 5), dtype=int)
 
-    Y, X = speed_direction_batch(detections, previous_obs)
-    inertia_Y, inertia_X = velocities[:, 0], velocities[:, 1]
-    inertia_Y = np.repeat(inertia_Y[:, np.newaxis], Y.shape[1], axis=1)
-    inertia_X = np.repeat(inertia_X[:, np.newaxis], X.shape[1], axis=1)
-    diff_angle_cos = inertia_X * X + inertia_Y * Y
-    diff_angle_cos = np.clip(diff_angle_cos, a_min=-1, a_max=1)
-    diff_angle = np.arccos(diff_angle_cos)
-    diff_angle = (np.pi / 2.0 - np.abs(diff_angle)) / np.pi
-
-    valid_mask = np.ones(previous_obs.shape[0])
-    valid_mask[np.where(previous_obs[:, 4] < 0)] = 0
-
-    iou_matrix = iou_batch(detections, trackers)
-    scores = np.repeat(detections[:, -1][:, np.newaxis], trackers.shape[0], axis=1)
+    if iou_matrix is None:
+        iou_matrix = iou_batch(detections, trackers)
     # iou_matrix = iou_matrix * scores # a trick sometiems works, we don't encourage this
-    valid_mask = np.repeat(valid_mask[:, np.newaxis], X.shape[1], axis=1)
-
-    angle_diff_cost = (valid_mask * diff_angle) * vdc_weight
-    angle_diff_cost = angle_diff_cost.T
-    angle_diff_cost = angle_diff_cost * scores
 
     if min(iou_matrix.shape) > 0:
-        a = (iou_matrix > iou_threshold).astype(np.int32)
+        a = iou_matrix > iou_threshold
         if a.sum(1).max() == 1 and a.sum(0).max() == 1:
+            # one-to-one assignment, the velocity direction cost cannot change it
             matched_indices = np.stack(np.where(a), axis=1)
+        elif iou_matrix.shape == (1, 1):
+            # a single pair below the threshold stays unmatched whatever the cost
+            return np.empty((0, 2), dtype=int), np.zeros(1, dtype=int), np.zeros(1, dtype=int)
         else:
+            angle_diff_cost = velocity_direction_cost(detections, velocities, previous_obs, vdc_weight)
             matched_indices = linear_assignment(-(iou_matrix + angle_diff_cost))
     else:
-        matched_indices = np.empty(shape=(0, 2))
-
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
-
-    # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+        matched_indices = np.empty(shape=(0, 2), dtype=int)
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    return split_matches(matched_indices, iou_matrix, iou_threshold)
 
 
 def associate_kitti(detections, trackers, det_cates, iou_threshold, velocities, previous_obs, vdc_weight):
@@ -484,28 +504,6 @@ def associate_kitti(detections, trackers, det_cates, iou_threshold, velocities,
         else:
             matched_indices = linear_assignment(cost_matrix)
     else:
-        matched_indices = np.empty(shape=(0, 2))
-
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
-
-    # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+        matched_indices = np.empty(shape=(0, 2), dtype=int)
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    return split_matches(matched_indices, iou_matrix, iou_threshold)
@@ -0,0 +1,34 @@
+import threading
+
+
+class IdAllocator:
+    """
+    Thread-safe sequence of track ids.
+
+    Every TrackTable draws its ids from an allocator, so controllers with their own allocator number their tracks
+    independently, and controllers sharing one never hand out the same id twice.
+    """
+
+    def __init__(self, start=0):
+        self._next = start
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        """
+        Take the next id.
+        """
+        with self._lock:
+            track_id = self._next
+            self._next += 1
+        return track_id
+
+    @property
+    def value(self):
+        """
+        Id the next track will get.
+        """
+        return self._next
+
+    def reset(self, start=0):
+        with self._lock:
+            self._next = start
@@ -26,6 +26,17 @@ def speed_direction(bbox1, bbox2):
     return speed / norm
 
 
+def speed_directions(boxes1, boxes2):
+    """
+    Row-wise speed_direction of two arrays of boxes of shape (N, 4+).
+    """
+    cx1, cy1 = (boxes1[:, 0] + boxes1[:, 2]) / 2.0, (boxes1[:, 1] + boxes1[:, 3]) / 2.0
+    cx2, cy2 = (boxes2[:, 0] + boxes2[:, 2]) / 2.0, (boxes2[:, 1] + boxes2[:, 3]) / 2.0
+    speed = np.stack((cy2 - cy1, cx2 - cx1), axis=1)
+    norm = np.sqrt((cy2 - cy1) ** 2 + (cx2 - cx1) ** 2) + 1e-6
+    return speed / norm[:, None]
+
+
 def convert_x_to_bbox(x, score=None):
     """
     Takes a bounding box in the centre form [x,y,s,r] and returns it in the form
@@ -39,52 +50,137 @@ def convert_x_to_bbox(x, score=None):
         return np.array([x[0] - w / 2.0, x[1] - h / 2.0, x[0] + w / 2.0, x[1] + h / 2.0, score]).reshape((1, 5))
 
 
+def box_model():
+    """
+    Constant velocity model of a box in the [x,y,s,r] centre form, with velocities of x, y and s.
+
+    Returns
+    -------
+    F, H, Q, R, P : np.ndarray
+        State transition, measurement function, process noise, measurement noise and initial covariance.
+    """
+    F = np.array(
+        [
+            [1, 0, 0, 0, 1, 0, 0],
+            [0, 1, 0, 0, 0, 1, 0],
+            [0, 0, 1, 0, 0, 0, 1],
+            [0, 0, 0, 1, 0, 0, 0],
+            [0, 0, 0, 0, 1, 0, 0],
+            [0, 0, 0, 0, 0, 1, 0],
+            [0, 0, 0, 0, 0, 0, 1],
+        ]
+    )
+    H = np.array([[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]])
+
+    R = np.eye(4)
+    R[2:, 2:] *= 10.0
+    P = np.eye(7)
+    P[4:, 4:] *= 1000.0  # give high uncertainty to the unobservable initial velocities
+    P *= 10.0
+    Q = np.eye(7)
+    Q[-1, -1] *= 0.01
+    Q[4:, 4:] *= 0.01
+    return F, H, Q, R, P
+
+
+def steady_state_gain(F, H, Q, R, P=None, tol=1e-9, max_iter=10000):
+    """
+    Converged gain and covariances of a time-invariant Kalman filter, by iterating the Riccati recursion.
+
+    Returns
+    -------
+    K : np.ndarray
+        Steady-state Kalman gain, shape (dim_x, dim_z).
+    P_prior : np.ndarray
+        Covariance after predict, shape (dim_x, dim_x).
+    P_post : np.ndarray
+        Covariance after update, shape (dim_x, dim_x).
+    """
+    I = np.eye(F.shape[0])
+    P_post = np.eye(F.shape[0]) if P is None else P
+    for _ in range(max_iter):
+        P_prior = F @ P_post @ F.T + Q
+        K = P_prior @ H.T @ np.linalg.inv(H @ P_prior @ H.T + R)
+        I_KH = I - K @ H
+        P_next = I_KH @ P_prior @ I_KH.T + K @ R @ K.T
+        converged = np.abs(P_next - P_post).max() <= tol * max(1.0, np.abs(P_post).max())
+        P_post = P_next
+        if converged:
+            break
+    return K, F @ P_post @ F.T + Q, P_post
+
+
+# (F, H, Q, R) bytes -> (K, P_prior, P_post), see cached_steady_state.
+_steady_states = {}
+
+
+def cached_steady_state(F, H, Q, R, P=None):
+    """
+    steady_state_gain of a model, computed once per distinct F, H, Q and R. P is only the start of the recursion, which
+    converges to the same covariances from any start.
+    """
+    key = tuple((m.shape, m.tobytes()) for m in (np.asarray(m, dtype=float) for m in (F, H, Q, R)))
+    steady_state = _steady_states.get(key)
+    if steady_state is None:
+        steady_state = _steady_states[key] = steady_state_gain(F, H, Q, R, P)
+    return steady_state
+
+
 class KalmanBoxTracker(object):
     """
     This class represents the internal state of individual tracked objects observed as bbox.
     """
 
     count = 0
+    # Covariance of a new track, restored by reinit.
+    initial_covariance = box_model()[4]
 
-    def __init__(self, bbox, delta_t=3, orig=False):
+    def __init__(
+        self, bbox, delta_t=3, orig=False, steady_state_hits=None, lean=True, keep_observations=True, track_id=None
+    ):
         """
         Initialises a tracker using initial bounding box.
 
+        Parameters
+        ----------
+        steady_state_hits : int or None
+            Switch to the precomputed steady-state Kalman gain after this many consecutive hits, skipping the gain and
+            covariance computation of the update. A miss falls back to full updates. None always runs full updates.
+        lean : bool
+            Use LeanKalmanFilter, which gives the same results as KalmanFilterNew without its per-step copies.
+        keep_observations : bool
+            Keep the observation history and velocity direction. TrackTable keeps them for its trackers in a fixed
+            window instead, only last_observation is maintained without them.
+        track_id : int or None
+            Id of the track, e.g. from the IdAllocator of a TrackTable. None takes the next value of the process-wide
+            KalmanBoxTracker.count.
         """
         # define constant velocity model
         if not orig:
-            from .kalmanfilter import KalmanFilterNew as KalmanFilter
+            if lean:
+                from .kalmanfilter import LeanKalmanFilter as KalmanFilter
+            else:
+                from .kalmanfilter import KalmanFilterNew as KalmanFilter
 
             self.kf = KalmanFilter(dim_x=7, dim_z=4)
         else:
             from filterpy.kalman import KalmanFilter
 
             self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        self.kf.F = np.array(
-            [
-                [1, 0, 0, 0, 1, 0, 0],
-                [0, 1, 0, 0, 0, 1, 0],
-                [0, 0, 1, 0, 0, 0, 1],
-                [0, 0, 0, 1, 0, 0, 0],
-                [0, 0, 0, 0, 1, 0, 0],
-                [0, 0, 0, 0, 0, 1, 0],
-                [0, 0, 0, 0, 0, 0, 1],
-            ]
-        )
-        self.kf.H = np.array(
-            [[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]]
-        )
-
-        self.kf.R[2:, 2:] *= 10.0
-        self.kf.P[4:, 4:] *= 1000.0  # give high uncertainty to the unobservable initial velocities
-        self.kf.P *= 10.0
-        self.kf.Q[-1, -1] *= 0.01
-        self.kf.Q[4:, 4:] *= 0.01
+        self.kf.F, self.kf.H, self.kf.Q, self.kf.R, self.kf.P = box_model()
 
         self.kf.x[:4] = convert_bbox_to_z(bbox)
+        self.steady_state_hits = steady_state_hits
+        self.steady = False
+        # (K, P_prior, P_post) of the model of the filter, shared by the trackers of the same model.
+        self.steady_state = None
+        if steady_state_hits is not None:
+            self.steady_state = cached_steady_state(self.kf.F, self.kf.H, self.kf.Q, self.kf.R, self.kf.P)
         self.time_since_update = 0
-        self.id = KalmanBoxTracker.count
-        KalmanBoxTracker.count += 1
+        if track_id is None:
+            track_id = KalmanBoxTracker.count
+            KalmanBoxTracker.count += 1
+        self.id = track_id
         self.history = []
         self.hits = 0
         self.hit_streak = 0
@@ -99,13 +195,40 @@ class KalmanBoxTracker(object):
         self.history_observations = []
         self.velocity = None
         self.delta_t = delta_t
+        self.keep_observations = keep_observations
+
+    def reinit(self, bbox, track_id):
+        """
+        Restart a finished tracker as a new track from bbox, reusing the matrices and buffers of its Kalman filter.
+        Gives the same results as a tracker created with the same arguments, falls back to a new filter unless it is
+        a LeanKalmanFilter.
+        """
+        from .kalmanfilter import LeanKalmanFilter
+
+        if isinstance(self.kf, LeanKalmanFilter):
+            self.kf.reset(0.0, KalmanBoxTracker.initial_covariance)
+        else:
+            self.kf = type(self.kf)(dim_x=7, dim_z=4)
+            self.kf.F, self.kf.H, self.kf.Q, self.kf.R, self.kf.P = box_model()
+        self.kf.x[:4] = convert_bbox_to_z(bbox)
+        self.steady = False
+        self.time_since_update = 0
+        self.id = track_id
+        self.history = []
+        self.hits = 0
+        self.hit_streak = 0
+        self.age = 0
+        self.last_observation = np.array([-1, -1, -1, -1, -1])
+        self.observations = dict()
+        self.history_observations = []
+        self.velocity = None
 
     def update(self, bbox):
         """
         Updates the state vector with observed bbox.
         """
         if bbox is not None:
-            if self.last_observation.sum() >= 0:  # no previous observation
+            if self.keep_observations and self.last_observation.sum() >= 0:  # no previous observation
                 previous_box = None
                 for i in range(self.delta_t):
                     dt = self.delta_t - i
@@ -124,17 +247,34 @@ class KalmanBoxTracker(object):
               and self.history_observations. Bear it for the moment.
             """
             self.last_observation = bbox
-            self.observations[self.age] = bbox
-            self.history_observations.append(bbox)
+            if self.keep_observations:
+                self.observations[self.age] = bbox
+                self.history_observations.append(bbox)
 
             self.time_since_update = 0
             self.history = []
             self.hits += 1
             self.hit_streak += 1
-            self.kf.update(convert_bbox_to_z(bbox))
+            if self.steady_state_hits is not None and self.hit_streak > self.steady_state_hits:
+                self._update_steady(convert_bbox_to_z(bbox))
+            else:
+                self.kf.update(convert_bbox_to_z(bbox))
         else:
+            # Missed: the filter freezes its state for ORU and runs full updates again until the next streak.
+            self.steady = False
             self.kf.update(bbox)
 
+    def _update_steady(self, z):
+        K, _, P_post = self.steady_state
+        # Copied in place, the lean filter writes into its K and P.
+        self.kf.K[...] = K
+        # update_steadystate leaves P as is, so set the posterior first; it is then saved as P_post.
+        self.kf.P[...] = P_post
+        self.kf.update_steadystate(z)
+        # update_steadystate does not record observations, the re-update after a miss (ORU) starts from the last one.
+        self.kf.history_obs[:] = (z,)
+        self.steady = True
+
     def predict(self):
         """
         Advances the state vector and returns the predicted bounding box estimate.
@@ -142,7 +282,12 @@ class KalmanBoxTracker(object):
         if (self.kf.x[6] + self.kf.x[2]) <= 0:
             self.kf.x[6] *= 0.0
 
-        self.kf.predict()
+        if self.steady:
+            # Covariance is set first, predict_steadystate saves it as P_prior.
+            self.kf.P[...] = self.steady_state[1]
+            self.kf.predict_steadystate()
+        else:
+            self.kf.predict()
         self.age += 1
         if self.time_since_update > 0:
             self.hit_streak = 0
@@ -102,11 +102,41 @@ from math import exp, log, sqrt
 
 import numpy as np
 import numpy.linalg as linalg
-from filterpy.common import pretty_str, reshape_z
-from filterpy.stats import logpdf
 from numpy import dot, eye, isscalar, shape, zeros
 
 
+def reshape_z(z, dim_z, ndim):
+    """ensure z is a (dim_z, 1) shaped vector (same as filterpy.common.reshape_z)"""
+
+    z = np.atleast_2d(z)
+    if z.shape[1] == dim_z:
+        z = z.T
+
+    if z.shape != (dim_z, 1):
+        raise ValueError("z must be convertible to shape ({}, 1)".format(dim_z))
+
+    if ndim == 1:
+        z = z[:, 0]
+
+    if ndim == 0:
+        z = z[0, 0]
+
+    return z
+
+
+# filterpy is only needed for likelihoods and printing, it is imported on first use.
+def logpdf(*args, **kwargs):
+    from filterpy.stats import logpdf as _logpdf
+
+    return _logpdf(*args, **kwargs)
+
+
+def pretty_str(*args, **kwargs):
+    from filterpy.common import pretty_str as _pretty_str
+
+    return _pretty_str(*args, **kwargs)
+
+
 class KalmanFilterNew(object):
     """Implements a Kalman filter. You are responsible for setting the
     various state variables to reasonable values; the defaults  will
@@ -389,45 +419,52 @@ class KalmanFilterNew(object):
             self.__dict__ = self.attr_saved
             # self.history_obs = new_history
             self.history_obs = self.history_obs[:-1]
-            occur = [int(d is None) for d in new_history]
-            indices = np.where(np.array(occur) == 0)[0]
-            index1 = indices[-2]
-            index2 = indices[-1]
-            box1 = new_history[index1]
-            x1, y1, s1, r1 = box1
-            w1 = np.sqrt(s1 * r1)
-            h1 = np.sqrt(s1 / r1)
-            box2 = new_history[index2]
-            x2, y2, s2, r2 = box2
-            w2 = np.sqrt(s2 * r2)
-            h2 = np.sqrt(s2 / r2)
-            time_gap = index2 - index1
-            dx = (x2 - x1) / time_gap
-            dy = (y2 - y1) / time_gap
-            dw = (w2 - w1) / time_gap
-            dh = (h2 - h1) / time_gap
-            for i in range(index2 - index1):
-                """
-                The default virtual trajectory generation is by linear
-                motion (constant speed hypothesis), you could modify this
-                part to implement your own.
-                """
-                x = x1 + (i + 1) * dx
-                y = y1 + (i + 1) * dy
-                w = w1 + (i + 1) * dw
-                h = h1 + (i + 1) * dh
-                s = w * h
-                r = w / float(h)
-                new_box = np.array([x, y, s, r]).reshape((4, 1))
-                """
-                    I still use predict-update loop here to refresh the parameters,
-                    but this can be faster by directly modifying the internal parameters
-                    as suggested in the paper. I keep this naive but slow way for
-                    easy read and understanding
-                """
-                self.update(new_box)
-                if not i == (index2 - index1 - 1):
-                    self.predict()
+            self._reupdate(new_history)
+
+    def _reupdate(self, new_history):
+        """
+        Online smoothing (ORU): re-update the restored filter along a virtual trajectory between the last
+        observation before the gap and the new one, the two last non-None entries of `new_history`.
+        """
+        occur = [int(d is None) for d in new_history]
+        indices = np.where(np.array(occur) == 0)[0]
+        index1 = indices[-2]
+        index2 = indices[-1]
+        box1 = new_history[index1]
+        x1, y1, s1, r1 = box1
+        w1 = np.sqrt(s1 * r1)
+        h1 = np.sqrt(s1 / r1)
+        box2 = new_history[index2]
+        x2, y2, s2, r2 = box2
+        w2 = np.sqrt(s2 * r2)
+        h2 = np.sqrt(s2 / r2)
+        time_gap = index2 - index1
+        dx = (x2 - x1) / time_gap
+        dy = (y2 - y1) / time_gap
+        dw = (w2 - w1) / time_gap
+        dh = (h2 - h1) / time_gap
+        for i in range(index2 - index1):
+            """
+            The default virtual trajectory generation is by linear
+            motion (constant speed hypothesis), you could modify this
+            part to implement your own.
+            """
+            x = x1 + (i + 1) * dx
+            y = y1 + (i + 1) * dy
+            w = w1 + (i + 1) * dw
+            h = h1 + (i + 1) * dh
+            s = w * h
+            r = w / float(h)
+            new_box = np.array([x, y, s, r]).reshape((4, 1))
+            """
+                I still use predict-update loop here to refresh the parameters,
+                but this can be faster by directly modifying the internal parameters
+                as suggested in the paper. I keep this naive but slow way for
+                easy read and understanding
+            """
+            self.update(new_box)
+            if not i == (index2 - index1 - 1):
+                self.predict()
 
     def update(self, z, R=None, H=None):
         """
@@ -1188,6 +1225,282 @@ class KalmanFilterNew(object):
             )
 
 
+def _float_matrix(name):
+    attr = "_" + name
+
+    def getter(self):
+        return getattr(self, attr)
+
+    def setter(self, value):
+        setattr(self, attr, np.asarray(value, dtype=float))
+
+    doc = "{}, stored as float so integer models are not cast in every product".format(name)
+    return property(getter, setter, doc=doc)
+
+
+def _saved_state(name):
+    attr = "_" + name
+
+    def getter(self):
+        return getattr(self, attr).copy()
+
+    def setter(self, value):
+        setattr(self, attr, value)
+
+    return property(getter, setter, doc="{} of the last step, copied on access. Read only.".format(name))
+
+
+class LeanKalmanFilter(KalmanFilterNew):
+    """
+    KalmanFilterNew with the bookkeeping of the hot path trimmed, same results bit for bit.
+
+    - x and P are double buffered: predict and update write the new state into the spare buffer with preallocated
+      scratch matrices and swap, instead of allocating every intermediate.
+    - x_prior, P_prior, x_post and P_post are references to those buffers, copied only when read. A posterior is
+      kept until the next predict after which it is overwritten, e.g. two predicts in a row lose it.
+    - F and H are stored as float arrays, so integer models are not cast in every product.
+    - z is stored by reference instead of deep-copied, do not modify a measurement after passing it to update.
+    - freeze only copies the state buffers and records the length of history_obs, instead of deep-copying the
+      whole filter including all observations and the previously frozen state.
+    - history_obs only holds the last observation and the misses after it, all the re-update after a gap (ORU) uses,
+      instead of every observation of the filter.
+
+    Assign new x or P in place (kf.x[:] = ...) or by rebinding to an array of the same shape, never to an array
+    shared with another filter: the filter writes into them.
+    """
+
+    F = _float_matrix("F")
+    H = _float_matrix("H")
+    x_prior = _saved_state("x_prior")
+    P_prior = _saved_state("P_prior")
+    x_post = _saved_state("x_post")
+    P_post = _saved_state("P_post")
+
+    # Arrays written in place, copied by freeze. Saved state references share them, copied with the same memo.
+    _buffers = ("x", "P", "_x_spare", "_P_spare", "_x_prior", "_P_prior", "_x_post", "_P_post")
+
+    def __init__(self, dim_x, dim_z, dim_u=0):
+        super(LeanKalmanFilter, self).__init__(dim_x, dim_z, dim_u)
+        self._x_spare = zeros((dim_x, 1))
+        self._P_spare = zeros((dim_x, dim_x))
+        self._xx = zeros((dim_x, dim_x))
+        self._xx2 = zeros((dim_x, dim_x))
+        self._xz = zeros((dim_x, dim_z))
+        self._z_none = np.array([[None] * self.dim_z]).T
+
+    def reset(self, x, P):
+        """
+        Restart the filter from state x and covariance P, as a new filter with the same model, reusing its buffers.
+        """
+        self.x[...] = x
+        self.P[...] = P
+        self._x_prior = self._x_post = self.x
+        self._P_prior = self._P_post = self.P
+        self.z = self._z_none
+        self.K.fill(0)
+        self.y.fill(0)
+        self.S.fill(0)
+        self.SI.fill(0)
+        self._log_likelihood = log(sys.float_info.min)
+        self._likelihood = sys.float_info.min
+        self._mahalanobis = None
+        self.history_obs = []
+        self.attr_saved = None
+        self.observed = False
+
+    def get_state(self):
+        """
+        The state needed to continue the filter exactly, without the observation history.
+
+        Returns
+        -------
+        mode : int
+            0 never observed, 1 observed, 2 frozen by a missed observation.
+        x, P : np.ndarray
+            Current state and covariance.
+        z : np.ndarray or None
+            Last observation of the history, where the re-update after a gap (ORU) starts.
+        saved_x, saved_P : np.ndarray or None
+            State and covariance frozen at the first miss, in mode 2.
+        gap : int
+            Missed observations since z, in mode 2.
+        """
+        if self.attr_saved is not None:
+            gap = 0
+            while self.history_obs[-1 - gap] is None:
+                gap += 1
+            z = self.history_obs[-1 - gap]
+            return 2, self.x, self.P, z, self.attr_saved["x"], self.attr_saved["P"], gap
+        if self.observed:
+            return 1, self.x, self.P, self.history_obs[-1], None, None, 0
+        return 0, self.x, self.P, None, None, None, 0
+
+    def set_state(self, mode, x, P, z=None, saved_x=None, saved_P=None, gap=0):
+        """
+        Continue from a state returned by get_state, e.g. of a filter in another process. The filter then gives the
+        same results as the one the state was taken from.
+        """
+        if mode == 2:
+            # Freeze as update(None) did, then move on to the current state.
+            self.reset(saved_x, saved_P)
+            self.observed = True
+            self.history_obs = [np.asarray(z, dtype=float).reshape(self.dim_z, 1), None]
+            self.freeze()
+            self.observed = False
+            self.history_obs.extend([None] * (gap - 1))
+            self.x[...] = x
+            self.P[...] = P
+        else:
+            self.reset(x, P)
+            if mode == 1:
+                self.observed = True
+                self.history_obs = [np.asarray(z, dtype=float).reshape(self.dim_z, 1)]
+
+    def _swap(self, x, P):
+        self._x_spare, self.x = self.x, x
+        if P is not None:
+            self._P_spare, self.P = self.P, P
+
+    def predict(self, u=None, B=None, F=None, Q=None):
+        if B is None:
+            B = self.B
+        if F is None:
+            F = self.F
+        if Q is None:
+            Q = self.Q
+        elif isscalar(Q):
+            Q = eye(self.dim_x) * Q
+
+        # x = Fx + Bu
+        x = dot(F, self.x, out=self._x_spare)
+        if B is not None and u is not None:
+            x += dot(B, u)
+
+        # P = FPF' + Q
+        P = dot(dot(F, self.P, out=self._xx), F.T, out=self._P_spare)
+        if self._alpha_sq != 1.0:
+            P *= self._alpha_sq
+        P += Q
+
+        self._swap(x, P)
+        self._x_prior = self.x
+        self._P_prior = self.P
+
+    def predict_steadystate(self, u=0, B=None):
+        if B is None:
+            B = self.B
+
+        x = dot(self.F, self.x, out=self._x_spare)
+        if B is not None:
+            x += dot(B, u)
+
+        self._swap(x, None)
+        self._x_prior = self.x
+        self._P_prior = self.P
+
+    def freeze(self):
+        saved = dict(self.__dict__)
+        saved.update(deepcopy({name: saved[name] for name in self._buffers}))
+        # the previously frozen state is never restored again, and observations are only ever appended
+        saved["attr_saved"] = None
+        saved["_history_len"] = len(self.history_obs)
+        self.attr_saved = saved
+
+    def unfreeze(self):
+        if self.attr_saved is not None:
+            new_history = self.history_obs
+            self.__dict__ = self.attr_saved
+            self.history_obs = new_history[: self._history_len - 1]
+            self._reupdate(new_history)
+
+    def update(self, z, R=None, H=None):
+        # set to None to force recompute
+        self._log_likelihood = None
+        self._likelihood = None
+        self._mahalanobis = None
+
+        # append the observation, during a streak the re-update after a gap (ORU) only needs the newest one
+        if z is not None and self.observed:
+            self.history_obs.clear()
+        self.history_obs.append(z)
+
+        if z is None:
+            if self.observed:
+                self.freeze()
+            self.observed = False
+            self.z = self._z_none
+            self._x_post = self.x
+            self._P_post = self.P
+            self.y.fill(0)
+            return
+
+        if not self.observed:
+            self.unfreeze()
+        self.observed = True
+
+        if R is None:
+            R = self.R
+        elif isscalar(R):
+            R = eye(self.dim_z) * R
+
+        if H is None:
+            z = reshape_z(z, self.dim_z, self.x.ndim)
+            H = self.H
+
+        # y = z - Hx
+        y = np.subtract(z, dot(H, self.x, out=self.y), out=self.y)
+
+        # S = HPH' + R
+        PHT = dot(self.P, H.T, out=self._xz)
+        S = dot(H, PHT, out=self.S)
+        S += R
+        self.SI = self.inv(S)
+
+        # K = PH'inv(S)
+        K = dot(PHT, self.SI, out=self.K)
+
+        # x = x + Ky
+        x = dot(K, y, out=self._x_spare)
+        x += self.x
+
+        # P = (I-KH)P(I-KH)' + KRK'
+        I_KH = np.subtract(self._I, dot(K, H, out=self._xx2), out=self._xx2)
+        P = dot(dot(I_KH, self.P, out=self._xx), I_KH.T, out=self._P_spare)
+        P += dot(dot(K, R, out=self._xz), K.T, out=self._xx)
+
+        self._swap(x, P)
+        self.z = z
+        self._x_post = self.x
+        self._P_post = self.P
+
+    def update_steadystate(self, z):
+        # set to None to force recompute
+        self._log_likelihood = None
+        self._likelihood = None
+        self._mahalanobis = None
+
+        if z is None:
+            self.z = self._z_none
+            self._x_post = self.x
+            self._P_post = self.P
+            self.y.fill(0)
+            return
+
+        z = reshape_z(z, self.dim_z, self.x.ndim)
+
+        # y = z - Hx
+        y = np.subtract(z, dot(self.H, self.x, out=self.y), out=self.y)
+
+        # x = x + Ky
+        x = dot(self.K, y, out=self._x_spare)
+        x += self.x
+
+        self._swap(x, None)
+        self.z = z
+        self._x_post = self.x
+        self._P_post = self.P
+
+
 def update(x, P, z, R, H=None, return_all=False):
     """
     Add a new measurement (z) to the Kalman filter. If z is None, nothing
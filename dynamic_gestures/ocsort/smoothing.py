@@ -0,0 +1,121 @@
+import numpy as np
+
+from .kalmanboxtracker import box_model
+
+
+def boxes_to_z(boxes):
+    """
+    Vectorized convert_bbox_to_z: [x1,y1,x2,y2] boxes of shape (..., 4) to [x,y,s,r] of shape (..., 4).
+    """
+    w = boxes[..., 2] - boxes[..., 0]
+    h = boxes[..., 3] - boxes[..., 1]
+    return np.stack((boxes[..., 0] + w / 2.0, boxes[..., 1] + h / 2.0, w * h, w / (h + 1e-6)), axis=-1)
+
+
+def z_to_boxes(z):
+    """
+    Vectorized convert_x_to_bbox: [x,y,s,r] of shape (..., 4) to [x1,y1,x2,y2] boxes, NaN where s * r < 0.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.sqrt(z[..., 2] * z[..., 3])
+        h = z[..., 2] / w
+    return np.stack((z[..., 0] - w / 2.0, z[..., 1] - h / 2.0, z[..., 0] + w / 2.0, z[..., 1] + h / 2.0), axis=-1)
+
+
+def _smooth_batch(z, observed):
+    """
+    Kalman filter and RTS smoother of the box model run on a batch of equally long, padded tracks.
+
+    Parameters
+    ----------
+    z : np.ndarray
+        Measurements of shape (T, N, 4), the first one of every track observed.
+    observed : np.ndarray
+        Mask of shape (T, N), False for missed and padding frames.
+
+    Returns
+    -------
+    np.ndarray
+        Smoothed states of shape (T, N, 7).
+    """
+    F, H, Q, R, P0 = (m.astype(float) for m in box_model())
+    T, N = observed.shape
+    I = np.eye(7)
+
+    xs = np.zeros((N, T, 7, 1))  # filtered
+    Ps = np.zeros((N, T, 7, 7))
+    xp = np.zeros((N, T, 7, 1))  # predicted
+    Pp = np.zeros((N, T, 7, 7))
+
+    # Same initialisation as KalmanBoxTracker: state from the first box, no update on it.
+    x = np.zeros((T, 7, 1))
+    x[:, :4, 0] = z[:, 0]
+    P = np.broadcast_to(P0, (T, 7, 7)).copy()
+    xs[0], Ps[0] = x, P
+    z = z[..., None]
+    for k in range(1, N):
+        # KalmanBoxTracker.predict keeps the area positive
+        x[(x[:, 6, 0] + x[:, 2, 0]) <= 0, 6, 0] = 0.0
+        x = F @ x
+        P = F @ P @ F.T + Q
+        xp[k], Pp[k] = x, P
+
+        mask = observed[:, k]
+        if mask.any():
+            Pm = P[mask]
+            PHT = Pm @ H.T
+            K = PHT @ np.linalg.inv(H @ PHT + R)
+            y = z[mask, k] - H @ x[mask]
+            I_KH = I - K @ H
+            x[mask] = x[mask] + K @ y
+            P[mask] = I_KH @ Pm @ np.swapaxes(I_KH, -1, -2) + K @ R @ np.swapaxes(K, -1, -2)
+        xs[k], Ps[k] = x, P
+
+    # Rauch-Tung-Striebel backward pass, the last state of every track stays the filtered one.
+    for k in range(N - 2, -1, -1):
+        # C = P_k F' inv(Pp_k+1), from the symmetric solve Pp_k+1 C' = F P_k
+        C = np.swapaxes(np.linalg.solve(Pp[k + 1], F @ Ps[k]), -1, -2)
+        xs[k] = xs[k] + C @ (xs[k + 1] - xp[k + 1])
+        Ps[k] = Ps[k] + C @ (Ps[k + 1] - Pp[k + 1]) @ np.swapaxes(C, -1, -2)
+    return np.swapaxes(xs[..., 0], 0, 1)
+
+
+def smooth_tracks(tracks, batch_cells=1 << 16):
+    """
+    RTS-smooth finished tracks with the Kalman box model of KalmanBoxTracker, many tracks per vectorized pass.
+    Frames without an observation are filled in by the smoother.
+
+    Parameters
+    ----------
+    tracks : list of np.ndarray
+        Boxes [x1,y1,x2,y2] of every frame of a track, shape (N_i, 4), NaN rows for missed frames. The first row must
+        be observed.
+    batch_cells : int
+        Tracks are sorted by length and smoothed in batches of at most this many (track, frame) cells, which bounds the
+        memory of the stored covariances to about 800 bytes per cell.
+
+    Returns
+    -------
+    list of np.ndarray
+        Smoothed boxes, shape (N_i, 4) for every track.
+    """
+    smoothed = [None] * len(tracks)
+    order = sorted(range(len(tracks)), key=lambda i: len(tracks[i]))
+    start = 0
+    while start < len(order):
+        # tracks sorted by length, so the last one of a batch sets its padded length
+        end = start + 1
+        while end < len(order) and (end + 1 - start) * len(tracks[order[end]]) <= batch_cells:
+            end += 1
+        batch = order[start:end]
+        length = len(tracks[batch[-1]])
+        boxes = np.full((len(batch), length, 4), np.nan)
+        for row, i in enumerate(batch):
+            boxes[row, : len(tracks[i])] = tracks[i]
+        observed = ~np.isnan(boxes).any(axis=2)
+        z = boxes_to_z(np.where(observed[..., None], boxes, 0.0))
+        states = _smooth_batch(z, observed)
+        for row, i in enumerate(batch):
+            smoothed[i] = z_to_boxes(states[row, : len(tracks[i]), :4])
+        start = end
+    return smoothed
@@ -0,0 +1,428 @@
+import numpy as np
+
+from .ids import IdAllocator
+from .kalmanboxtracker import KalmanBoxTracker, speed_directions
+
+# window age of an empty slot, never equal to a wanted age
+_EMPTY = np.iinfo(np.int64).min
+
+
+class TrackTable:
+    """
+    Columnar state of the live tracks.
+    Row i of every column describes the i-th track in creation order, next to its KalmanBoxTracker and payload
+    (e.g. a Deque of hands). Columns are maintained incrementally as trackers predict and observe, so the
+    association inputs are views of the first `len(table)` rows instead of arrays rebuilt every frame.
+
+    The observations of the last delta_t + 1 frames of every track are kept in a ring window indexed by age, so the
+    observation delta_t frames ago and the velocity directions of all tracks are gathered at once.
+
+    With label_classes set, every track also keeps a running average of the class probabilities of its detections and
+    a label that only changes on a confident and lasting change, see smooth_labels.
+
+    Trackers of removed tracks go to a pool and are restarted for the next new tracks, instead of allocating a new
+    Kalman filter for every hand. A table belongs to one thread, only its IdAllocator may be shared.
+    """
+
+    # columns saved by get_state, without the leading underscore
+    _STATE_COLUMNS = (
+        "boxes",
+        "last_boxes",
+        "k_observations",
+        "velocities",
+        "window",
+        "window_age",
+        "ids",
+        "age",
+        "hits",
+        "hit_streak",
+        "time_since_update",
+        "label_scores",
+        "labels",
+    )
+
+    def __init__(self, delta_t=3, capacity=8, steady_state_hits=None, ids=None, label_classes=0):
+        """
+        Parameters
+        ----------
+        delta_t : int
+            Distance in frames of the previous observation used for velocity direction.
+        capacity : int
+            Initial number of rows, grown on demand.
+        steady_state_hits : int or None
+            Passed to the KalmanBoxTracker of new tracks, see KalmanBoxTracker.
+        ids : IdAllocator or None
+            Ids of new tracks, a new sequence from 0 when None.
+        label_classes : int
+            Number of classes of the smoothed labels, 0 without label smoothing.
+        """
+        self.delta_t = delta_t
+        self.label_classes = label_classes
+        self.window = delta_t + 1
+        self.steady_state_hits = steady_state_hits
+        self.id_allocator = IdAllocator() if ids is None else ids
+        self.size = 0
+        self.trackers = []
+        self.payloads = []
+        # finished trackers, restarted by create
+        self.pool = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(name, shape, dtype, fill=0):
+            column = np.full((capacity,) + shape, fill, dtype=dtype)
+            if hasattr(self, name):
+                column[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, column)
+
+        grow("_boxes", (5,), np.float64)  # predicted [x1, y1, x2, y2, 0]
+        grow("_last_boxes", (5,), np.float64, -1)  # last observation, -1 placeholder without one
+        grow("_k_observations", (5,), np.float64, -1)  # observation delta_t frames ago
+        grow("_velocities", (2,), np.float64)  # (dy, dx) unit direction
+        grow("_window", (self.window, 5), np.float64)  # observation of age a in slot a % window
+        grow("_window_age", (self.window,), np.int64, _EMPTY)  # age of the observation in each slot
+        grow("_ids", (), np.int64)
+        grow("_age", (), np.int64)
+        grow("_hits", (), np.int64)
+        grow("_hit_streak", (), np.int64)
+        grow("_time_since_update", (), np.int64)
+        grow("_label_scores", (self.label_classes,), np.float64, np.nan)  # average class probabilities
+        grow("_labels", (), np.int64, -1)  # smoothed label, -1 before the first confident one
+        grow("_alive", (), bool)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def boxes(self):
+        return self._boxes[: self.size]
+
+    @property
+    def last_boxes(self):
+        return self._last_boxes[: self.size]
+
+    @property
+    def k_observations(self):
+        return self._k_observations[: self.size]
+
+    @property
+    def velocities(self):
+        return self._velocities[: self.size]
+
+    @property
+    def ids(self):
+        return self._ids[: self.size]
+
+    @property
+    def hits(self):
+        return self._hits[: self.size]
+
+    @property
+    def hit_streak(self):
+        return self._hit_streak[: self.size]
+
+    @property
+    def time_since_update(self):
+        return self._time_since_update[: self.size]
+
+    @property
+    def labels(self):
+        return self._labels[: self.size]
+
+    @property
+    def alive(self):
+        return self._alive[: self.size]
+
+    def add(self, tracker, payload=None):
+        """
+        Append a new track.
+
+        Parameters
+        ----------
+        tracker : KalmanBoxTracker
+            Tracker of the track, not observed yet, created with keep_observations=False.
+        payload : object
+            Per-track data kept next to the tracker.
+        """
+        if self.size == self.capacity:
+            self._allocate(2 * self.capacity)
+        i = self.size
+        self.size += 1
+        self.trackers.append(tracker)
+        self.payloads.append(payload)
+        self._boxes[i] = 0
+        self._last_boxes[i] = tracker.last_observation
+        self._k_observations[i] = -1
+        self._velocities[i] = 0 if tracker.velocity is None else tracker.velocity
+        self._window_age[i] = _EMPTY
+        self._ids[i] = tracker.id
+        self._age[i] = tracker.age
+        self._hits[i] = tracker.hits
+        self._hit_streak[i] = tracker.hit_streak
+        self._time_since_update[i] = tracker.time_since_update
+        self._label_scores[i] = np.nan
+        self._labels[i] = -1
+        self._alive[i] = True
+
+    def predict(self):
+        """
+        Advance every tracker one frame and drop the tracks whose prediction is not finite.
+
+        Returns
+        -------
+        np.ndarray
+            Predicted boxes of the remaining tracks, shape (T, 5).
+        """
+        n = self.size
+        for i in range(n):
+            self._boxes[i, :4] = self.trackers[i].predict()[0]
+        # same bookkeeping as KalmanBoxTracker.predict
+        self._age[:n] += 1
+        self._hit_streak[:n][self._time_since_update[:n] > 0] = 0
+        self._time_since_update[:n] += 1
+
+        invalid = np.isnan(self._boxes[:n, :4]).any(axis=1)
+        if invalid.any():
+            self._alive[:n] &= ~invalid
+            self.compact()
+        self._gather_k_observations()
+        return self.boxes
+
+    def _gather_k_observations(self):
+        """
+        Observation of every track delta_t frames ago, or the closest later one, or the last one before that, as
+        k_previous_obs of the reference implementation.
+        """
+        n = self.size
+        if n == 0:
+            return
+        # ages from delta_t frames ago to the previous frame, closest to delta_t first
+        wanted = self._age[:n, None] - np.arange(self.delta_t, 0, -1)
+        slots = wanted % self.window
+        rows = np.arange(n)[:, None]
+        hits = self._window_age[rows, slots] == wanted
+        found = hits.any(axis=1)
+        first = hits.argmax(axis=1)
+        self._k_observations[:n] = self._last_boxes[:n]
+        found_rows = np.flatnonzero(found)
+        self._k_observations[found_rows] = self._window[found_rows, slots[found_rows, first[found_rows]]]
+
+    def observe(self, rows, bboxes):
+        """
+        Update the trackers of the given rows with their matched detections.
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            Distinct rows of the matched tracks, shape (K,).
+        bboxes : np.ndarray
+            Matched detections [x1,y1,x2,y2,score], shape (K, 5).
+        """
+        if len(rows) == 0:
+            return
+        for i, bbox in zip(rows.tolist(), bboxes):
+            self.trackers[i].update(bbox)
+        # direction from the observation gathered by predict, for tracks observed before
+        seen = self._last_boxes[rows].sum(axis=1) >= 0
+        if seen.any():
+            self._velocities[rows[seen]] = speed_directions(self._k_observations[rows[seen]], bboxes[seen])
+        self._last_boxes[rows] = bboxes
+        ages = self._age[rows]
+        slots = ages % self.window
+        self._window[rows, slots] = bboxes
+        self._window_age[rows, slots] = ages
+        self._hits[rows] += 1
+        self._hit_streak[rows] += 1
+        self._time_since_update[rows] = 0
+
+    def miss(self, rows):
+        """
+        Update the trackers of the given rows without a detection.
+        """
+        for i in np.asarray(rows).tolist():
+            self.trackers[i].update(None)
+
+    def smooth_labels(self, rows, probs, alpha, enter, leave):
+        """
+        Add the class probabilities of the detections of the given rows to the running average of their tracks, and
+        switch the label of a track to the best class of its average when that class reaches `enter` while the
+        current label has fallen below `leave`.
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            Distinct rows of the observed tracks, shape (K,).
+        probs : np.ndarray
+            Class probabilities of their detections, shape (K, label_classes). Rows with NaN are skipped.
+        alpha : float
+            Weight of a new detection in the average, the first one initializes it.
+        enter : float
+            Average probability a class needs to become the label.
+        leave : float
+            Average probability under which the current label may be replaced.
+        """
+        valid = ~np.isnan(probs).any(axis=1)
+        rows, probs = rows[valid], probs[valid]
+        if len(rows) == 0:
+            return
+        scores = self._label_scores[rows]
+        new = np.isnan(scores[:, 0])
+        scores[new] = probs[new]
+        scores[~new] += alpha * (probs[~new] - scores[~new])
+        self._label_scores[rows] = scores
+        index = np.arange(len(rows))
+        best = scores.argmax(axis=1)
+        current = self._labels[rows]
+        current_score = np.where(current >= 0, scores[index, np.maximum(current, 0)], 0.0)
+        switch = (best != current) & (scores[index, best] >= enter) & (current_score < leave)
+        self._labels[rows[switch]] = best[switch]
+
+    def states(self, rows):
+        """
+        Output boxes of the given rows: the last observation, or the Kalman state for tracks never observed.
+        """
+        boxes = self._last_boxes[rows, :4]
+        unobserved = self._last_boxes[rows].sum(axis=1) < 0
+        for j in np.flatnonzero(unobserved):
+            boxes[j] = self.trackers[rows[j]].get_state()[0]
+        return boxes
+
+    def compact(self):
+        """
+        Remove the rows whose alive flag is cleared, keeping the creation order of the others.
+        """
+        n = self.size
+        keep = self._alive[:n]
+        if keep.all():
+            return
+        rows = np.flatnonzero(keep)
+        m = rows.size
+        self.pool.extend(self.trackers[i] for i in np.flatnonzero(~keep))
+        for name in (
+            "_boxes",
+            "_last_boxes",
+            "_k_observations",
+            "_velocities",
+            "_window",
+            "_window_age",
+            "_ids",
+            "_age",
+            "_hits",
+            "_hit_streak",
+            "_time_since_update",
+            "_label_scores",
+            "_labels",
+            "_alive",
+        ):
+            column = getattr(self, name)
+            column[:m] = column[rows]
+        self.trackers = [self.trackers[i] for i in rows]
+        self.payloads = [self.payloads[i] for i in rows]
+        self.size = m
+
+    def reset(self, id_base=None):
+        """
+        Remove all tracks, their trackers go to the pool.
+
+        Parameters
+        ----------
+        id_base : int or None
+            Restart the ids of new tracks from this value, None continues the sequence.
+        """
+        self.pool.extend(self.trackers)
+        self.trackers = []
+        self.payloads = []
+        self.size = 0
+        if id_base is not None:
+            self.id_allocator.reset(id_base)
+
+    def _tracker(self, bbox, track_id):
+        if self.pool:
+            tracker = self.pool.pop()
+            tracker.reinit(bbox, track_id)
+            return tracker
+        return KalmanBoxTracker(
+            bbox,
+            delta_t=self.delta_t,
+            steady_state_hits=self.steady_state_hits,
+            keep_observations=False,
+            track_id=track_id,
+        )
+
+    def create(self, bbox, payload=None):
+        """
+        Start a new track from an unmatched detection, with a pooled tracker when there is one.
+        """
+        tracker = self._tracker(bbox, self.id_allocator())
+        self.add(tracker, payload)
+        return tracker
+
+    def get_state(self):
+        """
+        Columns and Kalman filter states of the live tracks and the next track id, as a dict of arrays.
+        Payloads are not included.
+        """
+        n = self.size
+        state = {name: getattr(self, "_" + name)[:n].copy() for name in self._STATE_COLUMNS}
+        state["next_id"] = np.array(self.id_allocator.value, dtype=np.int64)
+        state["steady"] = np.array([tracker.steady for tracker in self.trackers], dtype=bool)
+        mode = state["kf_mode"] = np.zeros(n, dtype=np.int8)
+        x = state["kf_x"] = np.empty((n, 7))
+        P = state["kf_P"] = np.empty((n, 7, 7))
+        z = state["kf_z"] = np.zeros((n, 4))
+        saved_x = state["kf_saved_x"] = np.zeros((n, 7))
+        saved_P = state["kf_saved_P"] = np.zeros((n, 7, 7))
+        gap = state["kf_gap"] = np.zeros(n, dtype=np.int64)
+        for i, tracker in enumerate(self.trackers):
+            mode[i], x_i, P[i], z_i, saved_x_i, saved_P_i, gap[i] = tracker.kf.get_state()
+            x[i] = x_i[:, 0]
+            if mode[i] > 0:
+                z[i] = z_i[:, 0]
+            if mode[i] == 2:
+                saved_x[i], saved_P[i] = saved_x_i[:, 0], saved_P_i
+        return state
+
+    def set_state(self, state, payloads=None):
+        """
+        Replace the tracks with the ones of a state from get_state.
+
+        Parameters
+        ----------
+        state : dict
+            Arrays returned by get_state.
+        payloads : list or None
+            Payload of every track, None for none.
+        """
+        n = len(state["ids"])
+        self.reset(int(state["next_id"]))
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+        for name in self._STATE_COLUMNS:
+            if name in ("label_scores", "labels") and state["label_scores"].shape[1:] != (self.label_classes,):
+                # saved with other label smoothing settings, labels start over
+                getattr(self, "_" + name)[:n] = np.nan if name == "label_scores" else -1
+                continue
+            getattr(self, "_" + name)[:n] = state[name]
+        self._alive[:n] = True
+        for i in range(n):
+            # any valid box, the filter state is replaced below
+            tracker = self._tracker(np.array([0.0, 0.0, 1.0, 1.0, 0.0]), int(self._ids[i]))
+            tracker.age = int(self._age[i])
+            tracker.hits = int(self._hits[i])
+            tracker.hit_streak = int(self._hit_streak[i])
+            tracker.time_since_update = int(self._time_since_update[i])
+            tracker.last_observation = self._last_boxes[i].copy()
+            tracker.steady = bool(state["steady"][i])
+            tracker.kf.set_state(
+                int(state["kf_mode"][i]),
+                state["kf_x"][i, :, None],
+                state["kf_P"][i],
+                state["kf_z"][i, :, None],
+                state["kf_saved_x"][i, :, None],
+                state["kf_saved_P"][i],
+                int(state["kf_gap"][i]),
+            )
+            self.trackers.append(tracker)
+            self.payloads.append(None if payloads is None else payloads[i])
+        self.size = n
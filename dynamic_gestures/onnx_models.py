@@ -1,20 +1,135 @@
+import os
 from abc import ABC
 
 import cv2
 import numpy as np
 import onnxruntime as ort
 
+from utils import hard_nms, timed
+from utils.box_utils_numpy import iou_of
+
+# fp32 is the original model, the other variants are written next to it by quantize.py
+PRECISIONS = ("fp32", "fp16", "int8")
+
+EXECUTION_MODES = {"sequential": ort.ExecutionMode.ORT_SEQUENTIAL, "parallel": ort.ExecutionMode.ORT_PARALLEL}
+OPTIMIZATION_LEVELS = {
+    "disabled": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+ELEMENT_TYPES = {"tensor(float)": np.float32, "tensor(float16)": np.float16, "tensor(int64)": np.int64}
+
+
+class _BoundBatch:
+    """
+    IOBinding of one batch size: a reused input buffer and output buffers for the outputs of static shape. Outputs of
+    dynamic shape (e.g. the number of detections) are allocated by onnxruntime and are None here.
+    """
+
+    def __init__(self, sess, batch):
+        self.io_binding = sess.io_binding()
+        node = sess.get_inputs()[0]
+        batch_dim = node.shape[0]
+        shape = [batch] + list(node.shape[1:])
+        self.input = np.empty(shape, dtype=ELEMENT_TYPES[node.type])
+        self.io_binding.bind_input(node.name, "cpu", 0, self.input.dtype.type, shape, self.input.ctypes.data)
+        self.outputs = []
+        self.dynamic = False
+        for node in sess.get_outputs():
+            shape = [batch if dim == batch_dim else dim for dim in node.shape]
+            if all(isinstance(dim, int) for dim in shape):
+                self.outputs.append((node.name, np.empty(shape, dtype=ELEMENT_TYPES[node.type])))
+            else:
+                self.outputs.append((node.name, None))
+                self.dynamic = True
+        self._bind_outputs()
+
+    def _bind_outputs(self):
+        for name, output in self.outputs:
+            if output is None:
+                self.io_binding.bind_output(name, "cpu")
+            else:
+                self.io_binding.bind_output(name, "cpu", 0, output.dtype.type, output.shape, output.ctypes.data)
+
+    def run(self, sess):
+        if self.dynamic:
+            # onnxruntime keeps the outputs it allocated bound and would require their shapes on the next run,
+            # rebinding all outputs also keeps get_outputs in session order.
+            self.io_binding.clear_binding_outputs()
+            self._bind_outputs()
+        sess.run_with_iobinding(self.io_binding)
+        if not self.dynamic:
+            return [output for _, output in self.outputs]
+        values = self.io_binding.get_outputs()
+        return [value.numpy() if output is None else output for (_, output), value in zip(self.outputs, values)]
+
+
+# JSON-serializable session configuration, as stored by autotune.py.
+DEFAULT_SESSION_CONFIG = {
+    # [provider name, provider options] pairs in priority order, None picks them from ort.get_device()
+    "providers": None,
+    # 0 lets onnxruntime choose
+    "intra_op_num_threads": 0,
+    "inter_op_num_threads": 0,
+    "execution_mode": "sequential",
+    "graph_optimization_level": "all",
+    "enable_mem_pattern": False,
+}
+
+
+def model_variant(model_path, precision):
+    """
+    Path of a model variant, e.g. models/hand_detector.int8.onnx for models/hand_detector.onnx.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == "fp32":
+        return model_path
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.{precision}{ext}"
+
 
 class OnnxModel(ABC):
-    def __init__(self, model_path, image_size):
+    def __init__(self, model_path, image_size, precision="fp32", session_config=None, mirror=False):
+        """
+        Parameters
+        ----------
+        model_path : str
+            Path to the fp32 onnx model.
+        image_size : tuple
+            Input (width, height) of the model.
+        precision : str
+            Model variant to load, one of PRECISIONS. Quantized variants keep the fp32 inputs and outputs.
+        session_config : dict, "auto" or None
+            Session configuration, see DEFAULT_SESSION_CONFIG. "auto" loads the configuration tuned for this host and
+            model from the autotune cache, tuning it first when there is none. None uses the defaults.
+        mirror : bool
+            Work on the horizontally mirrored frame without flipping it: inputs are mirrored after resizing and boxes
+            are given and returned in mirrored coordinates.
+        """
+        model_path = model_variant(model_path, precision)
+        if not os.path.exists(model_path):
+            if precision == "fp32":
+                raise FileNotFoundError(f"{model_path} not found")
+            raise FileNotFoundError(f"{model_path} not found, create the {precision} variant with quantize.py")
         self.model_path = model_path
+        self.precision = precision
+        self.mirror = mirror
         self.image_size = image_size
         self.mean = np.array([127, 127, 127], dtype=np.float32)
         self.std = np.array([128, 128, 128], dtype=np.float32)
-        options, prov_opts, providers = self.get_onnx_provider()
-        self.sess = ort.InferenceSession(
-            model_path, sess_options=options, providers=providers, provider_options=prov_opts
-        )
+        if session_config == "auto":
+            from autotune import tuned_config
+
+            session_config = tuned_config(model_path)
+        self.session_config = session_config
+        options, providers = self.get_onnx_provider(session_config)
+        self.sess = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+        self.input_name = self.sess.get_inputs()[0].name
+        self.output_names = [output.name for output in self.sess.get_outputs()]
+        # batch size -> _BoundBatch
+        self._bindings = {}
         self._get_input_output()
 
     def preprocess(self, frame):
@@ -36,6 +151,40 @@ class OnnxModel(ABC):
         image = np.expand_dims(image, axis=0)
         return image
 
+    def preprocess_into(self, frame, out):
+        """
+        Same as preprocess, written into an (3, H, W) slice of a bound input buffer without intermediate copies.
+        """
+        self._normalize_into(cv2.resize(frame, self.image_size), out)
+
+    def _normalize_into(self, image, out):
+        # BGR -> RGB by reversing the channels of the CHW view, mirroring by reversing its columns
+        chw = image.transpose(2, 0, 1)[::-1]
+        if self.mirror:
+            chw = chw[:, :, ::-1]
+        np.subtract(chw, self.mean[:, None, None], out=out)
+        np.divide(out, self.std[:, None, None], out=out)
+
+    def input_buffer(self, batch):
+        """
+        Reused input array of the IOBinding of a batch size, to be filled before run_bound.
+        """
+        bound = self._bindings.get(batch)
+        if bound is None:
+            bound = self._bindings[batch] = _BoundBatch(self.sess, batch)
+        return bound.input
+
+    def run_bound(self, batch):
+        """
+        Run the model on the input buffer of a batch size.
+
+        Returns
+        -------
+        list of np.ndarray
+            Outputs in session order. Outputs of static shape are reused buffers, overwritten by the next call.
+        """
+        return self._bindings[batch].run(self.sess)
+
     def _get_input_output(self):
         inputs = self.sess.get_inputs()
         self.inputs = "".join(
@@ -54,46 +203,55 @@ class OnnxModel(ABC):
         )
 
     @staticmethod
-    def get_onnx_provider():
+    def get_onnx_provider(config=None):
         """
         Get onnx provider
+        Parameters
+        ----------
+        config : dict or None
+            Session configuration, keys of DEFAULT_SESSION_CONFIG. Missing keys take the default values.
         Returns
         -------
         options : onnxruntime.SessionOptions
             Session options
-        prov_opts : dict
-            Provider options
         providers : list
-            List of providers
+            (provider name, provider options) pairs in priority order
         """
-        providers = ["CPUExecutionProvider"]
+        config = dict(DEFAULT_SESSION_CONFIG, **(config or {}))
         options = ort.SessionOptions()
-        options.enable_mem_pattern = False
-        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
-        prov_opts = []
-        print("Using ONNX Runtime", ort.get_device())
+        options.enable_mem_pattern = config["enable_mem_pattern"]
+        options.execution_mode = EXECUTION_MODES[config["execution_mode"]]
+        options.graph_optimization_level = OPTIMIZATION_LEVELS[config["graph_optimization_level"]]
+        options.intra_op_num_threads = config["intra_op_num_threads"]
+        options.inter_op_num_threads = config["inter_op_num_threads"]
+        if config["providers"] is not None:
+            return options, [(name, dict(provider_options)) for name, provider_options in config["providers"]]
 
+        print("Using ONNX Runtime", ort.get_device())
+        providers = []
         if "DML" in ort.get_device():
-            prov_opts = [{"device_id": 0}]
-            providers.append("DmlExecutionProvider")
+            providers.append(("DmlExecutionProvider", {"device_id": 0}))
 
         elif "GPU" in ort.get_device():
-            prov_opts = [
-                {
-                    "device_id": 0,
-                    "arena_extend_strategy": "kNextPowerOfTwo",
-                    "gpu_mem_limit": 2 * 1024 * 1024 * 1024,
-                    "cudnn_conv_algo_search": "EXHAUSTIVE",
-                    "do_copy_in_default_stream": True,
-                }
-            ]
-            providers.append("CUDAExecutionProvider")
-
-        return options, prov_opts, providers
+            providers.append(
+                (
+                    "CUDAExecutionProvider",
+                    {
+                        "device_id": 0,
+                        "arena_extend_strategy": "kNextPowerOfTwo",
+                        "gpu_mem_limit": 2 * 1024 * 1024 * 1024,
+                        "cudnn_conv_algo_search": "EXHAUSTIVE",
+                        "do_copy_in_default_stream": True,
+                    },
+                )
+            )
+        providers.append(("CPUExecutionProvider", {}))
+        return options, providers
 
     def __repr__(self):
         return (
             f"Providers: {self.sess.get_providers()}\n"
+            f"Precision: {self.precision}\n"
             f"Model: {self.sess.get_modelmeta().description}\n"
             f"Version: {self.sess.get_modelmeta().version}\n"
             f"Inputs: {self.inputs}\n"
@@ -101,27 +259,192 @@ class OnnxModel(ABC):
         )
 
 class HandDetection(OnnxModel):
-    def __init__(self, model_path, image_size=(320, 240)):
-        super().__init__(model_path, image_size)
-        self.image_size = image_size
-        self.sess = ort.InferenceSession(model_path)
-        self.input_name = self.sess.get_inputs()[0].name
-        self.output_names = [output.name for output in self.sess.get_outputs()]
-        
-    def __call__(self, frame):
-        input_tensor = self.preprocess(frame)
-        boxes, _, probs = self.sess.run(self.output_names, {self.input_name: input_tensor})
-        width, height = frame.shape[1], frame.shape[0]
-        boxes[:, 0] *= width
-        boxes[:, 1] *= height
-        boxes[:, 2] *= width
-        boxes[:, 3] *= height
+    def __init__(
+        self,
+        model_path,
+        image_size=(320, 240),
+        precision="fp32",
+        session_config=None,
+        letterbox=False,
+        roi_scale=3.0,
+        max_rois=2,
+        roi_min_zoom=1.5,
+        nms_threshold=0.5,
+        mirror=False,
+    ):
+        """
+        Parameters
+        ----------
+        letterbox : bool
+            Scale the frame into the model input keeping its aspect ratio, with gray padding, instead of stretching it.
+        roi_scale : float
+            Height of the region searched around a track by the tiled pass, relative to the larger side of its box.
+        max_rois : int
+            Maximum number of regions of the tiled pass per frame, around the smallest tracks first.
+        roi_min_zoom : float
+            A region is searched only if the model sees it at least this much larger than in the full frame pass.
+        nms_threshold : float
+            IoU above which detections of the full frame and tiled passes are merged.
+        """
+        super().__init__(model_path, image_size, precision, session_config, mirror)
+        self.letterbox = letterbox
+        self.roi_scale = roi_scale
+        self.max_rois = max_rois
+        self.roi_min_zoom = roi_min_zoom
+        self.nms_threshold = nms_threshold
+        # frame (height, width) -> (affine map to the model input or None to resize, box scale, box offset, zoom)
+        self._frame_maps = {}
+
+    def _affine_map(self, scale, x0, y0):
+        """
+        Map of a frame to the model input, the point (x0, y0) of the frame going to (0, 0) of the input at `scale`.
+
+        Returns
+        -------
+        tuple
+            2x3 affine matrix for cv2.warpAffine, and the scale and offset taking normalized model boxes to frame
+            coordinates.
+        """
+        # cv2.resize samples at pixel centers, shift the same way so that both modes see the same pixels
+        shift = 0.5 * scale - 0.5
+        matrix = np.array([[scale, 0.0, shift - scale * x0], [0.0, scale, shift - scale * y0]])
+        width, height = self.image_size
+        box_scale = np.array([width, height, width, height], dtype=np.float32) / np.float32(scale)
+        box_offset = np.array([x0, y0, x0, y0], dtype=np.float32)
+        return matrix, box_scale, box_offset
+
+    def _frame_map(self, shape, full_shape):
+        frame_map = self._frame_maps.get((shape, full_shape))
+        if frame_map is None:
+            height, width = shape
+            input_width, input_height = self.image_size
+            if self.letterbox:
+                scale = min(input_width / width, input_height / height)
+                # center the scaled frame in the model input
+                x0 = -(input_width / scale - width) / 2
+                y0 = -(input_height / scale - height) / 2
+                matrix, box_scale, box_offset = self._affine_map(scale, x0, y0)
+                ratio = self._full_ratio(shape, full_shape)
+                frame_map = (matrix, box_scale * ratio, box_offset * ratio, scale)
+            else:
+                # normalized boxes go straight to full resolution coordinates
+                full_height, full_width = shape if full_shape is None else full_shape
+                box_scale = np.array([full_width, full_height, full_width, full_height], dtype=np.float32)
+                zoom = min(input_width / width, input_height / height)
+                frame_map = (None, box_scale, np.zeros(4, dtype=np.float32), zoom)
+            self._frame_maps[(shape, full_shape)] = frame_map
+        return frame_map
+
+    @staticmethod
+    def _full_ratio(shape, full_shape):
+        """
+        Scale of [x1,y1,x2,y2] boxes from a downscaled plane to its full resolution frame.
+        """
+        if full_shape is None:
+            return np.ones(4, dtype=np.float32)
+        ratio_x, ratio_y = full_shape[1] / shape[1], full_shape[0] / shape[0]
+        return np.array([ratio_x, ratio_y, ratio_x, ratio_y], dtype=np.float32)
+
+    def _detect(self, frame, matrix, box_scale, box_offset):
+        out = self.input_buffer(1)[0]
+        if matrix is None:
+            self.preprocess_into(frame, out)
+        else:
+            if self.mirror:
+                # the map is given in mirrored coordinates, sample the frame at the mirrored positions
+                matrix = matrix.copy()
+                matrix[0, 2] = self.image_size[0] - 1 - matrix[0, 0] * (frame.shape[1] - 1) - matrix[0, 2]
+            image = cv2.warpAffine(
+                frame, matrix, self.image_size, flags=cv2.INTER_LINEAR, borderValue=(127, 127, 127)
+            )
+            self._normalize_into(image, out)
+        boxes, _, probs = self.run_bound(1)
+        np.multiply(boxes, box_scale, out=boxes)
+        if matrix is not None:
+            np.add(boxes, box_offset, out=boxes)
+        return boxes, probs
+
+    def regions(self, rois, shape, zoom):
+        """
+        Regions of the tiled pass: windows with the aspect ratio of the model input around the smallest given boxes
+        that the model would see magnified by at least roi_min_zoom, shifted inside the frame.
+
+        Parameters
+        ----------
+        rois : np.ndarray
+            Boxes [x1,y1,x2,y2] of the tracks, shape (N, 4).
+        shape : tuple
+            Frame (height, width).
+        zoom : float
+            Scale of the frame in the full frame pass.
+
+        Returns
+        -------
+        np.ndarray
+            Regions (x0, y0, scale), shape (K, 3).
+        """
+        height, width = shape
+        input_width, input_height = self.image_size
+        sizes = np.maximum(rois[:, 2] - rois[:, 0], rois[:, 3] - rois[:, 1])
+        region_heights = np.maximum(sizes * self.roi_scale, 1.0)
+        scales = input_height / region_heights
+        keep = np.flatnonzero(scales >= zoom * self.roi_min_zoom)
+        keep = keep[np.argsort(sizes[keep], kind="stable")][: self.max_rois]
+        region_heights, scales = region_heights[keep], scales[keep]
+        region_widths = region_heights * input_width / input_height
+        x0 = (rois[keep, 0] + rois[keep, 2] - region_widths) / 2
+        y0 = (rois[keep, 1] + rois[keep, 3] - region_heights) / 2
+        x0 = np.clip(x0, 0, np.maximum(width - region_widths, 0))
+        y0 = np.clip(y0, 0, np.maximum(height - region_heights, 0))
+        return np.stack((x0, y0, scales), axis=1)
+
+    @timed("hand_detection_seconds")
+    def __call__(self, frame, rois=None, full_shape=None):
+        """
+        Parameters
+        ----------
+        frame : np.ndarray
+            Image frame with shape (H, W, 3).
+        rois : np.ndarray or None
+            Boxes [x1,y1,x2,y2] of existing tracks. Small ones without a detection in the full frame are searched again
+            at a higher resolution (tiled pass) and the detections are merged with those of the full frame.
+        full_shape : tuple or None
+            (height, width) of the full resolution frame when `frame` is a downscaled plane of it. Boxes and rois are
+            then in full resolution coordinates.
+
+        Returns
+        -------
+        tuple
+            Boxes [x1,y1,x2,y2] as int32, shape (N, 4), and their scores, shape (N,).
+        """
+        shape = frame.shape[:2]
+        matrix, box_scale, box_offset, zoom = self._frame_map(shape, full_shape)
+        boxes, probs = self._detect(frame, matrix, box_scale, box_offset)
+        if rois is not None and len(rois) > 0 and len(boxes) > 0:
+            # only tracks the full frame pass missed
+            rois = rois[iou_of(rois[:, None, :], boxes[None, :, :]).max(axis=1) < self.nms_threshold]
+        if rois is not None and len(rois) > 0:
+            ratio = self._full_ratio(shape, full_shape)
+            regions = self.regions(rois / ratio, shape, zoom)
+            if len(regions) > 0:
+                box_scores = [np.concatenate((boxes, probs[:, None]), axis=1)]
+                for x0, y0, scale in regions:
+                    region_matrix, region_scale, region_offset = self._affine_map(scale, x0, y0)
+                    region_boxes, region_probs = self._detect(
+                        frame, region_matrix, region_scale * ratio, region_offset * ratio
+                    )
+                    box_scores.append(np.concatenate((region_boxes, region_probs[:, None]), axis=1))
+                merged = hard_nms(np.concatenate(box_scores), self.nms_threshold)
+                boxes, probs = merged[:, :4], merged[:, 4]
+        if matrix is not None or rois is not None:
+            height, width = shape if full_shape is None else full_shape
+            np.clip(boxes, 0, [width - 1, height - 1, width - 1, height - 1], out=boxes)
         return boxes.astype(np.int32), probs
 
 
 class HandClassification(OnnxModel):
-    def __init__(self, model_path, image_size=(128, 128)):
-        super().__init__(model_path, image_size)
+    def __init__(self, model_path, image_size=(128, 128), precision="fp32", session_config=None, mirror=False):
+        super().__init__(model_path, image_size, precision, session_config, mirror)
 
     @staticmethod
     def get_square(box, image):
@@ -162,16 +485,22 @@ class HandClassification(OnnxModel):
         Returns
         -------
         crops : np.ndarray
-            Crops from frame
+            Crops from frame, with mirror set they are mirrored later by preprocess_into
         """
         crops = []
         for bbox in bboxes:
             bbox = self.get_square(bbox, frame)
-            crop = frame[bbox[1] : bbox[3], bbox[0] : bbox[2]]
+            if self.mirror:
+                # columns [x0, x1) of the mirrored frame, the crop is mirrored with the model input
+                width = frame.shape[1]
+                crop = frame[bbox[1] : bbox[3], width - bbox[2] : width - bbox[0]]
+            else:
+                crop = frame[bbox[1] : bbox[3], bbox[0] : bbox[2]]
             crops.append(crop)
         return crops
 
-    def __call__(self, image, bboxes):
+    @timed("hand_classification_seconds")
+    def __call__(self, image, bboxes, return_probs=False):
         """
         Get predictions from model
         Parameters
@@ -180,15 +509,25 @@ class HandClassification(OnnxModel):
             Image to predict
         bboxes : np.ndarray
             Bounding boxes
+        return_probs : bool
+            Also return the class probabilities.
 
         Returns
         -------
         predictions : np.ndarray
             Predictions from model
+        probs : np.ndarray
+            Softmax of the model outputs, shape (N, classes), only with return_probs.
         """
         crops = self.get_crops(image, bboxes)
-        crops = [self.preprocess(crop) for crop in crops]
-        input_name = self.sess.get_inputs()[0].name
-        outputs = self.sess.run(None, {input_name: np.concatenate(crops, axis=0)})[0]
+        inputs = self.input_buffer(len(crops))
+        for crop, out in zip(crops, inputs):
+            self.preprocess_into(crop, out)
+        outputs = self.run_bound(len(crops))[0]
         labels = np.argmax(outputs, axis=1)
-        return labels
+        if not return_probs:
+            return labels
+        # The outputs are logits, spread over tens of units.
+        probs = np.exp(outputs - outputs.max(axis=1, keepdims=True), dtype=np.float64)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return labels, probs
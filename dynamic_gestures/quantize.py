@@ -0,0 +1,110 @@
+import argparse
+import itertools
+
+import numpy as np
+
+from onnx_models import HandClassification, HandDetection, model_variant
+from run_replay import FrameSource
+
+# Only the compute-heavy ops are quantized, the box decoding and NMS of the detector stay in fp32.
+INT8_OP_TYPES = ["Conv", "MatMul", "Gemm"]
+
+
+def calibration_inputs(source, detector, classifier, max_frames=200, stride=5):
+    """
+    Model inputs of sampled frames of a recording: whole frames for the detector and the crops of the hands the fp32
+    detector finds for the classifier.
+
+    Parameters
+    ----------
+    source : FrameSource
+        Recorded frames.
+    detector : HandDetection
+        Fp32 detector.
+    classifier : HandClassification
+        Fp32 classifier, only used for its preprocessing.
+    max_frames : int
+        Number of sampled frames.
+    stride : int
+        Every stride-th frame is sampled.
+
+    Returns
+    -------
+    tuple of lists
+        Detector and classifier input tensors, batches of one.
+    """
+    frames, crops = [], []
+    for _, _, frame in itertools.islice(source, 0, max_frames * stride, stride):
+        frames.append(detector.preprocess(frame))
+        bboxes, _ = detector(frame)
+        crops.extend(classifier.preprocess(crop) for crop in classifier.get_crops(frame, bboxes) if crop.size > 0)
+    return frames, crops
+
+
+def quantize_int8(model_path, input_name, tensors, per_channel=True):
+    """
+    Statically quantize a model to int8 in the QDQ format, calibrated on the given input tensors.
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class TensorReader(CalibrationDataReader):
+        def __init__(self):
+            self.feeds = iter({input_name: tensor.astype(np.float32)} for tensor in tensors)
+
+        def get_next(self):
+            return next(self.feeds, None)
+
+    output_path = model_variant(model_path, "int8")
+    quantize_static(
+        model_path,
+        output_path,
+        TensorReader(),
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=INT8_OP_TYPES,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    return output_path
+
+
+def convert_fp16(model_path):
+    """
+    Convert the weights and activations of a model to fp16, keeping fp32 inputs and outputs.
+    """
+    import onnx
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    output_path = model_variant(model_path, "fp16")
+    onnx.save(convert_float_to_float16(onnx.load(model_path), keep_io_types=True), output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create fp16 and int8 variants of the onnx models")
+    parser.add_argument("source", type=str, help="Calibration video file, image directory or image glob")
+    parser.add_argument("--detector", default="models/hand_detector.onnx", type=str, help="Path to fp32 detector")
+    parser.add_argument(
+        "--classifier", default="models/crops_classifier.onnx", type=str, help="Path to fp32 classifier"
+    )
+    parser.add_argument("--precision", nargs="+", default=["int8"], choices=["fp16", "int8"], help="Variants to create")
+    parser.add_argument("--max-frames", default=200, type=int, help="Number of calibration frames")
+    parser.add_argument("--stride", default=5, type=int, help="Calibrate on every stride-th frame of the source")
+    parser.add_argument("--per-tensor", action="store_true", help="Per-tensor instead of per-channel int8 weights")
+    args = parser.parse_args()
+
+    detector = HandDetection(args.detector)
+    classifier = HandClassification(args.classifier)
+    if "int8" in args.precision:
+        frames, crops = calibration_inputs(
+            FrameSource(args.source), detector, classifier, max_frames=args.max_frames, stride=args.stride
+        )
+        if len(crops) == 0:
+            raise SystemExit(f"No hands detected in {args.source}, the classifier cannot be calibrated")
+        print(f"Calibrating on {len(frames)} frames and {len(crops)} hand crops")
+        for model, tensors in ((detector, frames), (classifier, crops)):
+            path = quantize_int8(model.model_path, model.sess.get_inputs()[0].name, tensors, not args.per_tensor)
+            print(f"Wrote {path}")
+    if "fp16" in args.precision:
+        for model in (detector, classifier):
+            print(f"Wrote {convert_fp16(model.model_path)}")
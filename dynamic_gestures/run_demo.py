@@ -1,13 +1,24 @@
 import argparse
+import json
 import time
 
 import cv2
-import numpy as np
 
-from main_controller import MainController
-from utils import targets
+from main_controller import LABEL_ALPHA, MainController, parse_label_alpha
+from onnx_models import PRECISIONS
+from utils import (
+    CommandPolicy,
+    DebugRenderer,
+    EventBus,
+    LatestFrameCapture,
+    MotionGate,
+    QualityController,
+    SnapshotFile,
+    TraceWriter,
+    metrics,
+)
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import threading
 import asyncio
@@ -27,6 +38,8 @@ app.add_middleware(
 
 # Shared variable to store the latest command
 latest_command = {"command": "", "timestamp": 0}
+# Dynamic gestures of the controllers, served on /events
+event_bus = EventBus()
 
 def update_command(command):
     """Function to update command from external sources (like speech recognition)"""
@@ -58,78 +71,125 @@ async def give_command():
 
     return StreamingResponse(command_stream(), media_type="text/event-stream")
 
+# Define the /events route streaming the recognized dynamic gestures
+@app.get("/events")
+async def gesture_events():
+    async def event_stream():
+        with event_bus.subscribe() as subscription:
+            while True:
+                for event in subscription.drain():
+                    data = {"track_id": event.track_id, "event": event.event.name, "timestamp": event.timestamp}
+                    if event.stream is not None:
+                        data["stream"] = event.stream
+                    yield f"event: gesture\ndata: {json.dumps(data)}\n\n"
+                await asyncio.sleep(0.05)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+# Define the /metrics route for Prometheus scraping
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def publish_command(command, timestamp, stream=None):
+    global latest_command
+    if stream is None:
+        print(command)
+        latest_command = {"command": command, "timestamp": timestamp}
+        metrics.inc("commands_published_total", labels={"command": command})
+    else:
+        print(f"{stream}: {command}")
+        latest_command = {"command": command, "timestamp": timestamp, "stream": stream}
+        metrics.inc("commands_published_total", labels={"command": command, "stream": stream})
+
 def run_fastapi():
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
+def camera_device(value):
+    return int(value) if value.isdigit() else value
+
+def camera_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
 def run(args):
-    global latest_command
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-
-    controller = MainController(args.detector, args.classifier)
-    debug_mode = args.debug
-    prev_command = None
-    command = ""
-    last_turn_time = 0  # Track last turn command time for cooldown
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        frame = cv2.flip(frame, 1)
-        if ret:
-            start_time = time.time()
-            bboxes, ids, labels = controller(frame)
-            if debug_mode:
-                if bboxes is not None:
-                    bboxes = bboxes.astype(np.int32)
-                    for i in range(bboxes.shape[0]):
-                        box = bboxes[i, :]
-                        gesture = targets[labels[i]] if labels[i] is not None else "None"
-
-                        if gesture == "fist":
-                            command = "STOP"
-                        elif gesture == "three_gun":
-                            command = "SHOOT"
-                        elif gesture == "palm":
-                            command = "MOVE"
-                        elif gesture == "dislike":
-                            command = "LEFT"
-                        elif gesture == "like":
-                            command = "RIGHT"
-
-                        # For turn commands (LEFT/RIGHT), check cooldown before sending
-                        # For other commands, only send when changed to avoid spam
-                        if command in ["LEFT", "RIGHT"]:
-                            current_time = time.time()
-                            # Only send turn command if 1.5 seconds have passed since last turn
-                            if current_time - last_turn_time >= 1.5:
-                                print(command)
-                                latest_command = {"command": command, "timestamp": current_time}
-                                last_turn_time = current_time
-                                prev_command = command
-                        elif command != prev_command:
-                            print(command)
-                            latest_command = {"command": command, "timestamp": time.time()}
-                            prev_command = command
-
-                        cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (255, 255, 0), 4)
-                        cv2.putText(
-                            frame,
-                            f"ID {ids[i]} : {gesture}",
-                            (box[0], box[1] - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1,
-                            (0, 0, 255),
-                            2,
-                        )
-
-                fps = 1.0 / (time.time() - start_time)
-                cv2.putText(frame, f"fps {fps:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-            cv2.imshow("frame", frame)
-            if cv2.waitKey(1) & 0xFF == ord("q"):
+    capture = LatestFrameCapture(
+        args.camera,
+        size=args.camera_size,
+        fps=args.camera_fps,
+        fourcc=None if args.fourcc == "auto" else args.fourcc,
+        reduction=args.detect_reduction,
+    )
+    print(capture)
+
+    controller = MainController(
+        args.detector,
+        args.classifier,
+        precision=args.precision,
+        session_config="auto" if args.autotune else None,
+        letterbox=args.letterbox,
+        tiled=args.tiled,
+        mirror=args.mirror == "coordinates",
+        motion_gate=(
+            MotionGate(threshold=args.motion_threshold, min_area=args.motion_area, max_skip=args.motion_max_skip)
+            if args.motion_gate
+            else None
+        ),
+        quality=QualityController(budget=args.quality_budget / 1000) if args.quality_budget is not None else None,
+        label_alpha=args.label_alpha,
+        event_bus=event_bus,
+    )
+    snapshot = None
+    if args.snapshot is not None:
+        snapshot = SnapshotFile(args.snapshot)
+        saved = snapshot.read()
+        if saved is not None and time.time() - saved[0] <= args.snapshot_max_age:
+            controller.set_state(saved[1])
+            print(f"Resumed {len(controller.tracks)} tracks from {args.snapshot}")
+    snapshot_index = controller.frame_index
+    if args.record_trace is not None:
+        controller.trace_writer = TraceWriter(args.record_trace, id_base=controller.tracks.id_allocator.value)
+    policy = CommandPolicy(arbitration=args.arbitration)
+    renderer = None if args.headless else DebugRenderer(draw_hands=args.debug, mirror=args.mirror == "coordinates")
+    renderer_events = None if renderer is None else event_bus.subscribe()
+    frame_time = None  # Duration of the previous loop iteration, including capture and display
+
+    try:
+        while capture.is_opened():
+            start_time = time.perf_counter()
+            captured = capture.read()
+            if captured is None:
+                continue
+            if args.mirror == "pixels":
+                # Flipping needs the decoded full frame, the detector then reads it instead of the reduced plane.
+                frame = cv2.flip(captured.full, 1)
+                bboxes, ids, labels = controller(frame)
+            else:
+                bboxes, ids, labels = controller(captured)
+                frame = None
+            timestamp = time.time()
+            for command in policy.update(timestamp, labels, ids, bboxes):
+                publish_command(command, timestamp)
+            if snapshot is not None and controller.frame_index - snapshot_index >= args.snapshot_interval:
+                with metrics.timer("snapshot_seconds"):
+                    snapshot.write(controller.get_state(), timestamp)
+                snapshot_index = controller.frame_index
+            if renderer is not None and not renderer(
+                captured.full if frame is None else frame, bboxes, ids, labels, frame_time, renderer_events.drain()
+            ):
                 break
+            frame_time = time.perf_counter() - start_time
+            metrics.observe("frame_seconds", frame_time)
+    finally:
+        capture.close()
+        if renderer is not None:
+            renderer_events.close()
+            renderer.close()
+        if controller.trace_writer is not None:
+            controller.trace_writer.close()
+        if snapshot is not None:
+            snapshot.close()
 
 if __name__ == "__main__":
     # Parse command line arguments
@@ -148,11 +208,93 @@ if __name__ == "__main__":
         help="Path to classifier onnx model",
     )
 
+    parser.add_argument("--camera", default=0, type=camera_device, help="Camera index or video device/url")
+    parser.add_argument("--camera-size", default=(1280, 720), type=camera_size, help="Requested capture size, WxH")
+    parser.add_argument("--camera-fps", default=30, type=float, help="Requested capture frame rate")
+    parser.add_argument(
+        "--fourcc",
+        default="auto",
+        choices=["auto", "MJPG", "YUYV"],
+        help="Requested pixel format, MJPG frames are only decoded at the resolutions the models use",
+    )
+    parser.add_argument(
+        "--detect-reduction",
+        default=1,
+        type=int,
+        choices=[1, 2, 4, 8],
+        help="The detector runs on frames downscaled by this factor, the classifier on full resolution crops",
+    )
+    parser.add_argument(
+        "--precision",
+        default="fp32",
+        choices=PRECISIONS,
+        help="Model variant, fp16 and int8 ones are created with quantize.py",
+    )
+    parser.add_argument(
+        "--autotune",
+        action="store_true",
+        help="Use the session configuration tuned for this host, tuning it on the first run (see autotune.py)",
+    )
+    parser.add_argument("--letterbox", action="store_true", help="Keep the frame aspect ratio in the detector input")
+    parser.add_argument("--tiled", action="store_true", help="Search small tracks again at a higher resolution")
+    parser.add_argument(
+        "--motion-gate",
+        action="store_true",
+        help="Skip the detector on frames without change while no hand is tracked",
+    )
+    parser.add_argument("--motion-threshold", default=12.0, type=float, help="Gray level change counted as motion")
+    parser.add_argument("--motion-area", default=0.002, type=float, help="Share of changed pixels that is motion")
+    parser.add_argument(
+        "--motion-max-skip", default=15, type=int, help="Run the detector at least every this many static frames"
+    )
+    parser.add_argument(
+        "--label-alpha",
+        nargs="?",
+        const=LABEL_ALPHA,
+        default=None,
+        type=parse_label_alpha,
+        help=f"Drive the commands by a per-track gesture average, a new frame weighted by this value ({LABEL_ALPHA} "
+        "without one). Off by default, commands use the gesture of every frame",
+    )
+    parser.add_argument(
+        "--quality-budget",
+        default=None,
+        type=float,
+        help="Processing budget of a frame in ms, the pipeline degrades step by step to stay within it",
+    )
+    parser.add_argument(
+        "--mirror",
+        default="pixels",
+        choices=["pixels", "coordinates", "none"],
+        help="Mirror view: flip every frame (default), mirror only the model inputs and boxes, or no mirroring",
+    )
     parser.add_argument("--debug", required=False, action="store_true", help="Debug mode")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="No window or drawing, only commands, for deployments without a display",
+    )
+    parser.add_argument(
+        "--arbitration",
+        default="all",
+        choices=CommandPolicy.ARBITRATIONS,
+        help="Hands driving the commands when several are tracked",
+    )
+    parser.add_argument("--metrics", required=False, action="store_true", help="Collect metrics served on /metrics")
+    parser.add_argument("--record-trace", default=None, type=str, help="Record tracker input/output to this file")
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        type=str,
+        help="Save the tracker state to this file periodically and resume from it on start",
+    )
+    parser.add_argument("--snapshot-interval", default=15, type=int, help="Frames between two snapshots")
+    parser.add_argument(
+        "--snapshot-max-age", default=5.0, type=float, help="Older snapshots in seconds are not resumed from"
+    )
     args = parser.parse_args()
 
-    # Enable debug mode by default
-    args.debug = True
+    metrics.enabled = args.metrics
 
     # Start FastAPI server in a separate thread
     api_thread = threading.Thread(target=run_fastapi, daemon=True)
@@ -0,0 +1,313 @@
+"""
+Multi-process runtime for several camera streams.
+
+    capture process  one per stream, decodes the camera or video straight into a shared memory FrameRing
+    worker process   one per stream, runs a MainController and a CommandPolicy on the newest frame of its ring
+    this process     collects the commands, gesture events and metrics of all workers from one queue and serves them
+                     on the run_demo API
+
+Tracking, Deque logic and inference of the streams run on separate cores instead of sharing the GIL of one process.
+Frames never go through a pipe, the workers copy them straight out of the shared memory. Only commands, gesture
+events and periodic statistics are sent back. With --metrics, the statistics include the metrics of the worker, served
+with a stream label.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from main_controller import LABEL_ALPHA, MainController, parse_label_alpha
+from onnx_models import PRECISIONS
+from run_demo import camera_device, camera_size, event_bus, publish_command, run_fastapi
+from utils import CommandPolicy, Event, FrameRing, GestureEvent, metrics
+
+
+def capture_stream(source, size, slots, rings, ready, stop):
+    """
+    Capture process: write the frames of a camera or video into a new FrameRing, whose name is sent on `rings`
+    (None when the source cannot be read). Frames are written once the worker is `ready`, videos are paced at their
+    frame rate like a camera.
+    """
+    # Ctrl-C stops the runtime through `stop`, set by the main process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    cap = cv2.VideoCapture(source)
+    camera = isinstance(source, int)
+    if camera and size is not None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    ret, frame = cap.read()
+    if not ret:
+        rings.put(None)
+        cap.release()
+        return
+    height, width = frame.shape[:2]
+    frame_period = 0.0 if camera else 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    ring = FrameRing.create(frame.shape, slots=slots)
+    rings.put(ring.name)
+    try:
+        while not (ready.wait(0.5) or stop.is_set()):
+            pass
+        ring.write(frame, time.time())
+        start = time.monotonic()
+        while not stop.is_set():
+            if frame_period:
+                delay = start + ring.written * frame_period - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            view = ring.begin_write()
+            # Decoded in place when the shape of the frame is unchanged.
+            ret, frame = cap.read(view)
+            if not ret:
+                break
+            if frame is not view:
+                view[...] = cv2.resize(frame, (width, height))
+            ring.commit(time.time())
+    finally:
+        cap.release()
+        ring.close_stream()
+        # The workers may still read the last frames, the ring is freed when the runtime stops.
+        stop.wait()
+        ring.close()
+
+
+def track_stream(stream, ring_name, results, ready, stop, ended, options):
+    """
+    Worker process: track the hands of the newest frames of a ring and send the commands and gesture events. `ended`
+    is set by the main process when the capture process died without closing the ring.
+
+    Messages on `results`:
+        ("result", stream, frame index, timestamp, commands, [(track id, event name), ...])
+        ("stats", stream, fps, dropped frames, metrics snapshot or None) about every second
+        ("done", stream, frames, dropped frames, seconds, metrics snapshot or None)
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    metrics.enabled = options["metrics"]
+    if options["cpu"] is not None:
+        os.sched_setaffinity(0, {options["cpu"]})
+    ring = FrameRing.attach(ring_name)
+    # The frame being tracked, copied out of the ring which the capture process keeps overwriting.
+    frame = np.empty(ring.shape, dtype=np.uint8)
+    flipped = np.empty(ring.shape, dtype=np.uint8) if options["mirror"] == "pixels" else None
+    last, frames, dropped = -1, 0, 0
+    report_frames, report_dropped = 0, 0
+    start = report_time = time.monotonic()
+    try:
+        controller = MainController(
+            options["detector"],
+            options["classifier"],
+            precision=options["precision"],
+            session_config={"intra_op_num_threads": options["threads"], "inter_op_num_threads": 1},
+            mirror=options["mirror"] == "coordinates",
+            label_alpha=options["label_alpha"],
+        )
+        policy = CommandPolicy(arbitration=options["arbitration"])
+        ready.set()
+        while not stop.is_set():
+            item = ring.read_latest(last, timeout=0.5, out=frame)
+            if item is None:
+                if ring.closed or ended.is_set():
+                    break
+                continue
+            index, timestamp, frame = item
+            report_dropped += index - last - 1
+            last = index
+            if flipped is not None:
+                cv2.flip(frame, 1, dst=flipped)
+                bboxes, ids, labels = controller(flipped)
+            else:
+                bboxes, ids, labels = controller(frame)
+            commands = policy.update(timestamp, labels, ids, bboxes)
+            if commands or controller.events:
+                events = [(track_id, event.name) for track_id, event in controller.events]
+                results.put(("result", stream, index, timestamp, commands, events))
+            report_frames += 1
+            now = time.monotonic()
+            if now - report_time >= 1.0:
+                snapshot = metrics.snapshot() if metrics.enabled else None
+                results.put(("stats", stream, report_frames / (now - report_time), report_dropped, snapshot))
+                frames, dropped = frames + report_frames, dropped + report_dropped
+                report_frames, report_dropped, report_time = 0, 0, now
+    finally:
+        item = frame = flipped = None
+        ring.close()
+        frames, dropped = frames + report_frames, dropped + report_dropped
+        snapshot = metrics.snapshot() if metrics.enabled else None
+        results.put(("done", stream, frames, dropped, time.monotonic() - start, snapshot))
+
+
+def wait_ring(rings, capture, poll=0.5):
+    """
+    Name of the ring sent by a capture process, None when it cannot read its source or exited before sending it.
+    """
+    while True:
+        alive = capture.is_alive()
+        try:
+            return rings.get(timeout=poll)
+        except queue.Empty:
+            if not alive:
+                print(f"{capture.name} exited with code {capture.exitcode}")
+                return None
+
+
+def check_processes(streams_processes):
+    """
+    Handle the streams whose processes died without a message: a dead worker ends its stream, a dead capture process
+    ends the tracking of its worker, which then sends "done".
+    """
+    for stream, (capture, worker, ended) in list(streams_processes.items()):
+        if not worker.is_alive():
+            print(f"Stream {stream}: {worker.name} exited with code {worker.exitcode}")
+            del streams_processes[stream]
+        elif not capture.is_alive() and capture.exitcode != 0 and not ended.is_set():
+            print(f"Stream {stream}: {capture.name} exited with code {capture.exitcode}")
+            ended.set()
+
+
+def run(args):
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    results = ctx.Queue()
+    processes = []
+    # stream -> (capture process, worker process, ended event) of the running streams.
+    streams_processes = {}
+    # Queues and events of every stream, kept alive while the processes unpickle them.
+    channels = []
+    streams = 0
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else [None]
+    try:
+        for source in args.stream:
+            stream = str(streams)
+            rings, ready = ctx.Queue(), ctx.Event()
+            channels.append((rings, ready))
+            capture = ctx.Process(
+                target=capture_stream,
+                args=(source, args.camera_size, args.slots, rings, ready, stop),
+                name=f"capture-{stream}",
+                daemon=True,
+            )
+            capture.start()
+            processes.append(capture)
+            ring_name = wait_ring(rings, capture)
+            if ring_name is None:
+                print(f"Cannot read {source!r}, skipped")
+                continue
+            options = {
+                "detector": args.detector,
+                "classifier": args.classifier,
+                "precision": args.precision,
+                "threads": args.threads,
+                "mirror": args.mirror,
+                "arbitration": args.arbitration,
+                "label_alpha": args.label_alpha,
+                "metrics": args.metrics,
+                "cpu": cpus[streams % len(cpus)] if args.pin else None,
+            }
+            ended = ctx.Event()
+            channels.append(ended)
+            worker = ctx.Process(
+                target=track_stream,
+                args=(stream, ring_name, results, ready, stop, ended, options),
+                name=f"worker-{stream}",
+                daemon=True,
+            )
+            worker.start()
+            processes.append(worker)
+            streams_processes[stream] = (capture, worker, ended)
+            print(f"Stream {stream}: {source}")
+            streams += 1
+
+        while streams_processes:
+            try:
+                message = results.get(timeout=1.0)
+            except queue.Empty:
+                check_processes(streams_processes)
+                continue
+            kind, stream = message[:2]
+            if kind == "result":
+                _, _, index, timestamp, commands, events = message
+                for command in commands:
+                    publish_command(command, timestamp, stream=stream)
+                event_bus.publish(
+                    [GestureEvent(track_id, Event[event], timestamp, stream) for track_id, event in events]
+                )
+            elif kind == "stats":
+                _, _, fps, dropped, snapshot = message
+                metrics.set("stream_fps", fps, labels={"stream": stream})
+                metrics.inc("stream_dropped_frames_total", dropped, labels={"stream": stream})
+                if snapshot is not None:
+                    metrics.load(snapshot, labels={"stream": stream})
+            elif kind == "done":
+                _, _, frames, dropped, seconds, snapshot = message
+                if snapshot is not None:
+                    metrics.load(snapshot, labels={"stream": stream})
+                print(
+                    f"Stream {stream} done: {frames} frames in {seconds:.1f} s ({frames / seconds:.1f} fps), "
+                    f"{dropped} frames dropped"
+                )
+                streams_processes.pop(stream, None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one tracking process per camera stream")
+    parser.add_argument(
+        "--stream",
+        action="append",
+        type=camera_device,
+        required=True,
+        help="Camera index, video device/url or video file, repeat for every stream",
+    )
+    parser.add_argument("--detector", default="models/hand_detector.onnx", type=str, help="Path to detector model")
+    parser.add_argument("--classifier", default="models/crops_classifier.onnx", type=str, help="Path to classifier")
+    parser.add_argument(
+        "--precision",
+        default="fp32",
+        choices=PRECISIONS,
+        help="Model variant, fp16 and int8 ones are created with quantize.py",
+    )
+    parser.add_argument("--camera-size", default=(1280, 720), type=camera_size, help="Requested capture size, WxH")
+    parser.add_argument(
+        "--mirror",
+        default="pixels",
+        choices=["pixels", "coordinates", "none"],
+        help="Selfie view: flip every frame (default), mirror only the model inputs and boxes, or no mirroring",
+    )
+    parser.add_argument(
+        "--arbitration",
+        default="all",
+        choices=CommandPolicy.ARBITRATIONS,
+        help="Hands driving the commands of a stream when several are tracked",
+    )
+    parser.add_argument(
+        "--label-alpha",
+        nargs="?",
+        const=LABEL_ALPHA,
+        default=None,
+        type=parse_label_alpha,
+        help=f"Drive the commands by a per-track gesture average, a new frame weighted by this value ({LABEL_ALPHA} "
+        "without one). Off by default, commands use the gesture of every frame",
+    )
+    parser.add_argument("--slots", default=4, type=int, help="Frames in the shared memory ring of a stream")
+    parser.add_argument("--threads", default=1, type=int, help="onnxruntime threads of every worker")
+    parser.add_argument("--pin", action="store_true", help="Pin every worker to its own core")
+    parser.add_argument("--no-server", action="store_true", help="Do not serve the commands over HTTP")
+    parser.add_argument("--metrics", action="store_true", help="Collect metrics served on /metrics")
+    args = parser.parse_args()
+
+    metrics.enabled = args.metrics
+    if not args.no_server:
+        threading.Thread(target=run_fastapi, daemon=True).start()
+    run(args)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from main_controller import MainController
+from ocsort import IdAllocator, TrackTable, smooth_tracks
+from utils import TraceReader
+
+
+class RecordingTrackTable(TrackTable):
+    """
+    TrackTable remembering the detection every track was created from, which the tracker does not keep.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = {}
+
+    def create(self, bbox, payload=None):
+        tracker = super().create(bbox, payload)
+        self.created[tracker.id] = bbox.copy()
+        return tracker
+
+
+def retrack(reader, controller=None, smooth=True, min_observations=3):
+    """
+    Re-run OC-SORT over the detections of a recorded trace, then RTS-smooth the finished tracks all at once.
+
+    Parameters
+    ----------
+    reader : TraceReader
+        Recorded session.
+    controller : MainController or None
+        Tracker-only controller with the tracking parameters to use, a default one when None.
+    smooth : bool
+        Smooth the trajectories. Otherwise missed frames are None.
+    min_observations : int
+        Tracks with fewer observed frames are dropped.
+
+    Returns
+    -------
+    dict
+        Trajectories of the tracks, dynamic gesture events and timings.
+    """
+    if controller is None:
+        controller = MainController(None, None)
+    tracks = controller.tracks = RecordingTrackTable(
+        delta_t=controller.delta_t,
+        steady_state_hits=controller.tracks.steady_state_hits,
+        ids=IdAllocator(reader.id_base),
+    )
+
+    # track id -> lists of (trace position, box, label)
+    observations = {}
+    events = []
+    frame_indices = np.empty(len(reader), dtype=np.int64)
+    timestamps = np.empty(len(reader))
+    start = time.perf_counter()
+    for position, record in enumerate(reader):
+        frame_indices[position], timestamps[position] = record.frame_index, record.timestamp
+        if len(record.dets) == 0:
+            controller.update(np.empty((0, 5)), None)
+        else:
+            dets, labels = record.dets.copy(), record.labels.copy()
+            controller.update(dets=dets, labels=labels)
+            for row in np.flatnonzero(tracks.time_since_update == 0):
+                track_id = int(tracks.ids[row])
+                if tracks.hits[row] > 0:
+                    det = tracks.last_boxes[row]
+                else:
+                    det = tracks.created.pop(track_id)
+                # the matched detection row, for its label
+                label = labels[np.flatnonzero((dets == det).all(axis=1))[0]]
+                observations.setdefault(track_id + 1, []).append((position, det[:4].copy(), label))
+        for track_id, event in controller.events:
+            events.append(
+                {"frame": int(record.frame_index), "time": record.timestamp, "track": track_id, "event": event.name}
+            )
+    forward_time = time.perf_counter() - start
+
+    track_ids = [track_id for track_id, items in observations.items() if len(items) >= min_observations]
+    paths = []
+    for track_id in track_ids:
+        items = observations[track_id]
+        first = items[0][0]
+        boxes = np.full((items[-1][0] - first + 1, 4), np.nan)
+        for position, box, _ in items:
+            boxes[position - first] = box
+        paths.append(boxes)
+
+    start = time.perf_counter()
+    smoothed = smooth_tracks(paths) if smooth else paths
+    smooth_time = time.perf_counter() - start
+
+    trajectories = []
+    for track_id, raw, boxes in zip(track_ids, paths, smoothed):
+        items = observations[track_id]
+        first = items[0][0]
+        labels = [None] * len(raw)
+        for position, _, label in items:
+            labels[position - first] = None if label is None or label < 0 else int(label)
+        trajectories.append(
+            {
+                "id": track_id,
+                "frames": frame_indices[first : first + len(raw)].tolist(),
+                "timestamps": timestamps[first : first + len(raw)].tolist(),
+                "observed": (~np.isnan(raw).any(axis=1)).tolist(),
+                "boxes": [None if np.isnan(box).any() else box.tolist() for box in boxes],
+                "labels": labels,
+            }
+        )
+
+    return {
+        "frames": len(reader),
+        "forward_time": forward_time,
+        "smooth_time": smooth_time,
+        "fps": len(reader) / (forward_time + smooth_time) if forward_time + smooth_time > 0 else 0.0,
+        "tracks": trajectories,
+        "events": events,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline re-tracking and smoothing of recorded sessions")
+    parser.add_argument("traces", nargs="+", type=str, help="Paths to traces recorded with --record-trace")
+    parser.add_argument("--output-dir", default=None, type=str, help="Write <trace name>.tracks.json files here")
+    parser.add_argument("--no-smooth", action="store_true", help="Keep the raw observations")
+    parser.add_argument("--min-observations", default=3, type=int, help="Drop tracks with fewer observed frames")
+    args = parser.parse_args()
+
+    for trace in args.traces:
+        with TraceReader(trace) as reader:
+            report = retrack(reader, smooth=not args.no_smooth, min_observations=args.min_observations)
+        print(
+            f"{trace}: {report['frames']} frames, {len(report['tracks'])} tracks, {len(report['events'])} events, "
+            f"forward {report['forward_time']:.2f} s, smoothing {report['smooth_time']:.2f} s, "
+            f"{report['fps']:.0f} fps"
+        )
+        for event in report["events"]:
+            print(f"  frame {event['frame']:>6} {event['time']:>14.2f}  track {event['track']:>4}  {event['event']}")
+        if args.output_dir is not None:
+            os.makedirs(args.output_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(trace))[0]
+            with open(os.path.join(args.output_dir, f"{name}.tracks.json"), "w") as f:
+                json.dump(report, f)
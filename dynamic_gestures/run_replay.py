@@ -0,0 +1,339 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from main_controller import LABEL_ALPHA, MainController, parse_label_alpha
+from onnx_models import PRECISIONS
+from utils import CommandPolicy, MotionGate, QualityController, TraceWriter
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+STAGES = ("detector", "classifier", "tracker", "total")
+
+
+class FrameSource:
+    """
+    Frames from a video file, a directory of images or an image glob, decoded ahead on a prefetch thread.
+    Yields (frame_index, timestamp, frame) tuples, where timestamp is the position in the source in seconds.
+    """
+
+    def __init__(self, source, fps=None, prefetch=64):
+        """
+        Parameters
+        ----------
+        source : str
+            Path to a video file, a directory with images or a glob pattern for images.
+        fps : float
+            Frame rate of the source. Taken from the video container when not given, 30 for image sequences.
+        prefetch : int
+            Maximum number of decoded frames kept ahead of the consumer.
+        """
+        self.source = source
+        self.images = self._list_images(source)
+        self.fps = fps or self._probe_fps()
+        self.prefetch = prefetch
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _list_images(source):
+        if os.path.isdir(source):
+            paths = [os.path.join(source, name) for name in os.listdir(source)]
+        elif any(char in source for char in "*?["):
+            paths = glob.glob(source)
+        else:
+            return None
+        return sorted(path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS))
+
+    def _probe_fps(self):
+        if self.images is None:
+            cap = cv2.VideoCapture(self.source)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            cap.release()
+            if fps > 0:
+                return fps
+        return 30.0
+
+    def _decode(self):
+        if self.images is None:
+            cap = cv2.VideoCapture(self.source)
+            while True:
+                ret, frame = cap.read()
+                if not ret or self._stop.is_set():
+                    break
+                self._queue.put(frame)
+            cap.release()
+        else:
+            for path in self.images:
+                if self._stop.is_set():
+                    break
+                frame = cv2.imread(path)
+                if frame is not None:
+                    self._queue.put(frame)
+        self._queue.put(None)
+
+    def __iter__(self):
+        # A new queue per pass, a pass stopped early leaves frames or the end marker in its queue.
+        self._queue = queue.Queue(maxsize=self.prefetch)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._decode, daemon=True)
+        self._thread.start()
+        index = 0
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                yield index, index / self.fps, frame
+                index += 1
+        finally:
+            # A consumer stopping early must not leave the decoder blocked on a full queue.
+            self._stop.set()
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+class StageTimer:
+    """
+    Wraps a callable and records the duration of every call made during the current frame.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.elapsed = 0.0
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.calls += 1
+
+    def pop(self):
+        elapsed, self.elapsed, self.calls = self.elapsed, 0.0, 0
+        return elapsed
+
+
+def percentiles(samples):
+    """
+    Latency summary in milliseconds.
+    """
+    if len(samples) == 0:
+        return {"count": 0}
+    samples = np.asarray(samples) * 1000.0
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        "count": int(samples.size),
+        "mean": float(samples.mean()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(samples.max()),
+    }
+
+
+def replay(controller, source, realtime=False, policy=None):
+    """
+    Run the full detector -> classifier -> OC-SORT -> Deque pipeline over a recorded source.
+
+    Parameters
+    ----------
+    controller : MainController
+        Controller to benchmark. Its models and tracker are wrapped with timers for the duration of the replay.
+    source : FrameSource
+        Frames to replay.
+    realtime : bool
+        Pace frames at the source frame rate instead of processing them as fast as possible.
+    policy : CommandPolicy or None
+        Command rules, the defaults of run_demo.py when None.
+
+    Returns
+    -------
+    dict
+        Per-stage latency percentiles, throughput and the commands emitted during the replay.
+    """
+    detector = StageTimer(controller.detection_model)
+    classifier = StageTimer(controller.classification_model)
+    tracker = StageTimer(controller.update)
+    controller.detection_model, controller.classification_model, controller.update = detector, classifier, tracker
+
+    latencies = {stage: [] for stage in STAGES}
+    commands = []
+    policy = CommandPolicy() if policy is None else policy
+    frames = 0
+    # Frames the motion gate or the quality level kept from the detector, they only count in the total latency.
+    skipped = 0
+    # Frames processed at every quality level, when the controller adapts its quality.
+    levels = Counter()
+    start = time.perf_counter()
+    try:
+        for index, timestamp, frame in source:
+            if realtime:
+                delay = timestamp - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            frame_start = time.perf_counter()
+            if controller.quality is not None:
+                levels[controller.quality.level] += 1
+            bboxes, ids, labels = controller(frame)
+            latencies["total"].append(time.perf_counter() - frame_start)
+            if detector.calls == 0:
+                skipped += 1
+            else:
+                latencies["detector"].append(detector.pop())
+                latencies["tracker"].append(tracker.pop())
+            if classifier.calls > 0:
+                latencies["classifier"].append(classifier.pop())
+            # Driven by the source clock to stay deterministic.
+            for command in policy.update(timestamp, labels, ids, bboxes):
+                commands.append({"frame": index, "time": timestamp, "command": command})
+            frames += 1
+    finally:
+        controller.detection_model = detector.func
+        controller.classification_model = classifier.func
+        controller.update = tracker.func
+    wall_time = time.perf_counter() - start
+
+    return {
+        "source": source.source,
+        "frames": frames,
+        "skipped_frames": skipped,
+        "quality_levels": {str(level): count for level, count in sorted(levels.items())},
+        "realtime": realtime,
+        "wall_time": wall_time,
+        "fps": frames / wall_time if wall_time > 0 else 0.0,
+        "latency_ms": {stage: percentiles(latencies[stage]) for stage in STAGES},
+        "commands": commands,
+    }
+
+
+def print_report(report):
+    print(f"Source: {report['source']}")
+    print(f"Frames: {report['frames']}  wall time: {report['wall_time']:.2f} s  fps: {report['fps']:.2f}")
+    if report["skipped_frames"]:
+        share = report["skipped_frames"] / report["frames"]
+        print(f"Frames without detection (motion gate or quality level): {report['skipped_frames']} ({share:.1%})")
+    if report["quality_levels"]:
+        print("Frames per quality level: " + ", ".join(f"{k}: {v}" for k, v in report["quality_levels"].items()))
+    print(f"{'stage':<12}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for stage, stats in report["latency_ms"].items():
+        if stats["count"] == 0:
+            print(f"{stage:<12}{0:>8}")
+            continue
+        print(
+            f"{stage:<12}{stats['count']:>8}{stats['mean']:>10.2f}{stats['p50']:>10.2f}"
+            f"{stats['p90']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}"
+        )
+    print(f"Commands ({len(report['commands'])}):")
+    for item in report["commands"]:
+        print(f"  frame {item['frame']:>6} {item['time']:>8.2f} s  {item['command']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded video or image sequence through the pipeline")
+    parser.add_argument("source", type=str, help="Path to a video file, an image directory or an image glob")
+    parser.add_argument(
+        "--detector",
+        default='models/hand_detector.onnx',
+        type=str,
+        help="Path to detector onnx model"
+    )
+    parser.add_argument(
+        "--classifier",
+        default='models/crops_classifier.onnx',
+        type=str,
+        help="Path to classifier onnx model",
+    )
+    parser.add_argument(
+        "--precision",
+        default="fp32",
+        choices=PRECISIONS,
+        help="Model variant, fp16 and int8 ones are created with quantize.py",
+    )
+    parser.add_argument(
+        "--autotune",
+        action="store_true",
+        help="Use the session configuration tuned for this host, tuning it on the first run (see autotune.py)",
+    )
+    parser.add_argument("--letterbox", action="store_true", help="Keep the frame aspect ratio in the detector input")
+    parser.add_argument("--tiled", action="store_true", help="Search small tracks again at a higher resolution")
+    parser.add_argument(
+        "--motion-gate",
+        action="store_true",
+        help="Skip the detector on frames without change while no hand is tracked",
+    )
+    parser.add_argument("--motion-threshold", default=12.0, type=float, help="Gray level change counted as motion")
+    parser.add_argument("--motion-area", default=0.002, type=float, help="Share of changed pixels that is motion")
+    parser.add_argument(
+        "--motion-max-skip", default=15, type=int, help="Run the detector at least every this many static frames"
+    )
+    parser.add_argument(
+        "--label-alpha",
+        nargs="?",
+        const=LABEL_ALPHA,
+        default=None,
+        type=parse_label_alpha,
+        help=f"Drive the commands by a per-track gesture average, a new frame weighted by this value ({LABEL_ALPHA} "
+        "without one). Off by default, commands use the gesture of every frame",
+    )
+    parser.add_argument(
+        "--quality-budget",
+        default=None,
+        type=float,
+        help="Processing budget of a frame in ms, the pipeline degrades step by step to stay within it",
+    )
+    parser.add_argument("--fps", default=None, type=float, help="Source frame rate, overrides the container value")
+    parser.add_argument("--prefetch", default=64, type=int, help="Number of frames decoded ahead")
+    parser.add_argument("--realtime", action="store_true", help="Pace frames at the source frame rate")
+    parser.add_argument(
+        "--arbitration",
+        default="all",
+        choices=CommandPolicy.ARBITRATIONS,
+        help="Hands driving the commands when several are tracked",
+    )
+    parser.add_argument("--json", default=None, type=str, help="Write the report to this file")
+    parser.add_argument("--record-trace", default=None, type=str, help="Record tracker input/output to this file")
+    args = parser.parse_args()
+
+    controller = MainController(
+        args.detector,
+        args.classifier,
+        precision=args.precision,
+        session_config="auto" if args.autotune else None,
+        letterbox=args.letterbox,
+        tiled=args.tiled,
+        motion_gate=(
+            MotionGate(threshold=args.motion_threshold, min_area=args.motion_area, max_skip=args.motion_max_skip)
+            if args.motion_gate
+            else None
+        ),
+        quality=QualityController(budget=args.quality_budget / 1000) if args.quality_budget is not None else None,
+        label_alpha=args.label_alpha,
+    )
+    if args.record_trace is not None:
+        controller.trace_writer = TraceWriter(args.record_trace, id_base=controller.tracks.id_allocator.value)
+    report = replay(
+        controller,
+        FrameSource(args.source, fps=args.fps, prefetch=args.prefetch),
+        realtime=args.realtime,
+        policy=CommandPolicy(arbitration=args.arbitration),
+    )
+    if controller.trace_writer is not None:
+        controller.trace_writer.close()
+    print_report(report)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,32 @@
+import glob
+import os
+
+import cv2
+import pytest
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+MODELS = os.path.join(os.path.dirname(__file__), "..", "models")
+
+
+@pytest.fixture
+def golden_trace():
+    """
+    Path to tests/data/tracker.trace, see test_trace.py.
+    """
+    return os.path.join(DATA, "tracker.trace")
+
+
+@pytest.fixture(scope="session")
+def golden_frames():
+    """
+    Frames of the demo video with one or two hands, tests/data/frames.
+    """
+    return [cv2.imread(path) for path in sorted(glob.glob(os.path.join(DATA, "frames", "*.jpg")))]
+
+
+@pytest.fixture
+def model_paths():
+    """
+    Paths to the fp32 detector and classifier.
+    """
+    return os.path.join(MODELS, "hand_detector.onnx"), os.path.join(MODELS, "crops_classifier.onnx")
@@ -0,0 +1,248 @@
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+from ocsort import BoxCosts, associate, ciou_batch, diou_batch, get_assignment_backend, giou_batch, iou_batch
+from ocsort import linear_assignment, set_assignment_backend
+from ocsort.assignment import BACKENDS, OPTIMAL_SOLVERS, load_profile, save_profile, set_assignment_profile
+
+
+def _reference(bboxes1, bboxes2, metric):
+    """
+    Cost matrices as computed before BoxCosts, one broadcast expression per metric.
+    """
+    bboxes2 = np.expand_dims(bboxes2, 0)
+    bboxes1 = np.expand_dims(bboxes1, 1)
+    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
+    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
+    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
+    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
+    w = np.maximum(0.0, xx2 - xx1)
+    h = np.maximum(0.0, yy2 - yy1)
+    wh = w * h
+    union = (
+        (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
+        + (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
+        - wh
+    )
+    iou = wh / union
+    if metric == "iou":
+        return iou
+    xxc1 = np.minimum(bboxes1[..., 0], bboxes2[..., 0])
+    yyc1 = np.minimum(bboxes1[..., 1], bboxes2[..., 1])
+    xxc2 = np.maximum(bboxes1[..., 2], bboxes2[..., 2])
+    yyc2 = np.maximum(bboxes1[..., 3], bboxes2[..., 3])
+    wc = xxc2 - xxc1
+    hc = yyc2 - yyc1
+    if metric == "giou":
+        area_enclose = wc * hc
+        return (iou - (area_enclose - union) / area_enclose + 1.0) / 2.0
+    centerx1 = (bboxes1[..., 0] + bboxes1[..., 2]) / 2.0
+    centery1 = (bboxes1[..., 1] + bboxes1[..., 3]) / 2.0
+    centerx2 = (bboxes2[..., 0] + bboxes2[..., 2]) / 2.0
+    centery2 = (bboxes2[..., 1] + bboxes2[..., 3]) / 2.0
+    inner_diag = (centerx1 - centerx2) ** 2 + (centery1 - centery2) ** 2
+    outer_diag = wc**2 + hc**2
+    if metric == "diou":
+        return (iou - inner_diag / outer_diag + 1) / 2.0
+    w1 = bboxes1[..., 2] - bboxes1[..., 0]
+    h1 = bboxes1[..., 3] - bboxes1[..., 1] + 1.0
+    w2 = bboxes2[..., 2] - bboxes2[..., 0]
+    h2 = bboxes2[..., 3] - bboxes2[..., 1] + 1.0
+    v = (4 / (np.pi**2)) * ((np.arctan(w2 / h2) - np.arctan(w1 / h1)) ** 2)
+    alpha = v / (1 - iou + v)
+    return (iou - inner_diag / outer_diag - alpha * v + 1) / 2.0
+
+
+def _boxes(rng, count):
+    corners = rng.uniform(0, 1000, (count, 2))
+    return np.concatenate((corners, corners + rng.uniform(1, 200, (count, 2)), rng.random((count, 1))), axis=1)
+
+
+BATCHES = {"iou": iou_batch, "giou": giou_batch, "diou": diou_batch, "ciou": ciou_batch}
+
+
+def test_box_costs_match_reference():
+    rng = np.random.default_rng(0)
+    costs = BoxCosts()
+    for _ in range(200):
+        bboxes1, bboxes2 = _boxes(rng, rng.integers(0, 12)), _boxes(rng, rng.integers(0, 12))
+        costs.compute(bboxes1, bboxes2)
+        # Metrics in an order where every one reuses the shared buffers of the previous ones.
+        for metric in ("ciou", "giou", "diou", "iou"):
+            expected = _reference(bboxes1, bboxes2, metric)
+            assert np.array_equal(costs.metric(metric), expected, equal_nan=True), metric
+            assert np.array_equal(BATCHES[metric](bboxes1, bboxes2), expected, equal_nan=True), metric
+
+
+def test_box_costs_float32():
+    rng = np.random.default_rng(1)
+    bboxes1, bboxes2 = _boxes(rng, 6), _boxes(rng, 9)
+    costs = BoxCosts(dtype=np.float32).compute(bboxes1, bboxes2)
+    for metric in BATCHES:
+        result = costs.metric(metric)
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result, _reference(bboxes1, bboxes2, metric), rtol=1e-4, atol=1e-5)
+
+
+def test_batch_functions_return_their_own_arrays():
+    rng = np.random.default_rng(3)
+    bboxes1, bboxes2 = _boxes(rng, 1), _boxes(rng, 2)
+    for batch in BATCHES.values():
+        result = batch(bboxes1, bboxes2)
+        assert result.shape == (1, 2) and result.base is None
+
+
+@pytest.fixture
+def backend():
+    previous = get_assignment_backend()
+    yield set_assignment_backend
+    set_assignment_backend(previous)
+
+
+def _cost(cost_matrix, pairs):
+    return cost_matrix[pairs[:, 0], pairs[:, 1]].sum()
+
+
+@pytest.mark.parametrize("name", sorted(BACKENDS))
+def test_assignment_backends(backend, name):
+    backend(name)
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        cost_matrix = -rng.random(tuple(rng.integers(1, 9, 2)))
+        pairs = linear_assignment(cost_matrix)
+        rows, cols = linear_sum_assignment(cost_matrix)
+        assert pairs.shape == (min(cost_matrix.shape), 2)
+        assert np.array_equal(pairs[:, 0], np.sort(pairs[:, 0]))
+        assert len(set(pairs[:, 1].tolist())) == len(pairs)
+        if name == "greedy":
+            assert _cost(cost_matrix, pairs) >= cost_matrix[rows, cols].sum() - 1e-12
+        else:
+            assert np.isclose(_cost(cost_matrix, pairs), cost_matrix[rows, cols].sum())
+    assert linear_assignment(np.empty((0, 3))).shape == (0, 2)
+
+
+def test_unknown_backend(backend):
+    with pytest.raises(ValueError):
+        backend("hungarian")
+
+
+def test_measured_profile_drives_auto(tmp_path, backend):
+    path = str(tmp_path / "assignment_profile.json")
+    save_profile({(1, 3): "single", (3, 3): "scipy", (2, 2): "single", (4, 4): "missing"}, path)
+    profile = load_profile(path)
+    # single cannot solve a matrix with several rows and columns, unknown solvers are dropped.
+    assert profile == {(1, 3): OPTIMAL_SOLVERS["single"], (3, 3): OPTIMAL_SOLVERS["scipy"]}
+    assert load_profile(str(tmp_path / "missing.json")) == {}
+
+    calls = []
+
+    def counting(cost_matrix):
+        calls.append(cost_matrix.shape)
+        return OPTIMAL_SOLVERS["scipy"](cost_matrix)
+
+    backend("auto")
+    set_assignment_profile({(3, 3): counting})
+    try:
+        cost_matrix = -np.random.default_rng(4).random((3, 3))
+        assert np.array_equal(linear_assignment(cost_matrix), np.stack(linear_sum_assignment(cost_matrix), axis=1))
+        linear_assignment(-np.ones((2, 3)))
+        assert calls == [(3, 3)]
+    finally:
+        set_assignment_profile(load_profile())
+
+
+def _baseline_associate(detections, trackers, iou_threshold, velocities, previous_obs, vdc_weight):
+    """
+    associate as it was before the one-to-one and 1x1 shortcuts, solved with scipy.
+    """
+    previous = np.expand_dims(previous_obs, 2)
+    dx = (detections[:, 0] + detections[:, 2]) / 2.0 - (previous[:, 0] + previous[:, 2]) / 2.0
+    dy = (detections[:, 1] + detections[:, 3]) / 2.0 - (previous[:, 1] + previous[:, 3]) / 2.0
+    norm = np.sqrt(dx**2 + dy**2) + 1e-6
+    X, Y = dx / norm, dy / norm
+    inertia_Y = np.repeat(velocities[:, 0][:, np.newaxis], Y.shape[1], axis=1)
+    inertia_X = np.repeat(velocities[:, 1][:, np.newaxis], X.shape[1], axis=1)
+    diff_angle = np.arccos(np.clip(inertia_X * X + inertia_Y * Y, -1, 1))
+    diff_angle = (np.pi / 2.0 - np.abs(diff_angle)) / np.pi
+    valid_mask = np.ones(previous_obs.shape[0])
+    valid_mask[np.where(previous_obs[:, 4] < 0)] = 0
+    iou_matrix = _reference(detections, trackers, "iou")
+    scores = np.repeat(detections[:, -1][:, np.newaxis], trackers.shape[0], axis=1)
+    valid_mask = np.repeat(valid_mask[:, np.newaxis], X.shape[1], axis=1)
+    angle_diff_cost = ((valid_mask * diff_angle) * vdc_weight).T * scores
+
+    a = (iou_matrix > iou_threshold).astype(np.int32)
+    if a.sum(1).max() == 1 and a.sum(0).max() == 1:
+        matched_indices = np.stack(np.where(a), axis=1)
+    else:
+        matched_indices = np.stack(linear_sum_assignment(-(iou_matrix + angle_diff_cost)), axis=1)
+    unmatched_detections = [d for d in range(len(detections)) if d not in matched_indices[:, 0]]
+    unmatched_trackers = [t for t in range(len(trackers)) if t not in matched_indices[:, 1]]
+    matches = []
+    for m in matched_indices:
+        if iou_matrix[m[0], m[1]] < iou_threshold:
+            unmatched_detections.append(m[0])
+            unmatched_trackers.append(m[1])
+        else:
+            matches.append(m.tolist())
+    return matches, unmatched_detections, unmatched_trackers
+
+
+def _assert_associate_matches_baseline(detections, trackers, velocities, previous_obs, iou_threshold=0.3):
+    expected = _baseline_associate(detections, trackers, iou_threshold, velocities, previous_obs, 0.2)
+    for iou_matrix in (None, BoxCosts().compute(detections, trackers).iou()):
+        matches, unmatched_detections, unmatched_trackers = associate(
+            detections, trackers, iou_threshold, velocities, previous_obs, 0.2, iou_matrix=iou_matrix
+        )
+        assert matches.tolist() == expected[0]
+        assert unmatched_detections.tolist() == expected[1]
+        assert unmatched_trackers.tolist() == expected[2]
+
+
+def _track_inputs(trackers, rng):
+    velocities = rng.normal(size=(len(trackers), 2))
+    velocities /= np.linalg.norm(velocities, axis=1, keepdims=True)
+    previous_obs = trackers + rng.normal(0, 10, trackers.shape)
+    previous_obs[:, 4] = np.where(rng.random(len(trackers)) < 0.2, -1, 1)
+    return velocities, previous_obs
+
+
+def test_associate_single_pair_below_threshold():
+    detections = np.array([[0.0, 0.0, 100.0, 100.0, 0.9]])
+    trackers = np.array([[80.0, 80.0, 180.0, 180.0, 0.0]])
+    # the velocity points straight at the detection, which still must not match
+    velocities = np.array([[-np.sqrt(0.5), -np.sqrt(0.5)]])
+    previous_obs = np.array([[200.0, 200.0, 300.0, 300.0, 1.0]])
+    _assert_associate_matches_baseline(detections, trackers, velocities, previous_obs)
+    matches, unmatched_detections, unmatched_trackers = associate(
+        detections, trackers, 0.3, velocities, previous_obs, 0.2
+    )
+    assert len(matches) == 0 and unmatched_detections.tolist() == [0] and unmatched_trackers.tolist() == [0]
+
+
+def test_associate_one_to_one():
+    rng = np.random.default_rng(5)
+    trackers = np.array([[0.0, 0.0, 50.0, 50.0, 0.0], [200.0, 0.0, 260.0, 70.0, 0.0], [0.0, 300.0, 40.0, 330.0, 0.0]])
+    # shuffled and shifted copies of the tracks, plus a new hand
+    detections = np.concatenate((trackers[[2, 0, 1]] + 3.0, [[500.0, 500.0, 550.0, 550.0, 0.0]]))
+    detections[:, 4] = 0.9
+    _assert_associate_matches_baseline(detections, trackers, *_track_inputs(trackers, rng))
+    matches = associate(detections, trackers, 0.3, *_track_inputs(trackers, rng), 0.2)[0]
+    assert sorted(matches.tolist()) == [[0, 2], [1, 0], [2, 1]]
+
+
+def _hands(rng, count):
+    corners = rng.uniform(0, 60, (count, 2))
+    return np.concatenate((corners, corners + rng.uniform(40, 100, (count, 2)), rng.random((count, 1))), axis=1)
+
+
+def test_associate_ambiguous_overlaps():
+    rng = np.random.default_rng(6)
+    for _ in range(300):
+        # hands close to each other, so that detections overlap several tracks
+        trackers = _hands(rng, rng.integers(1, 6))
+        detections = np.concatenate((trackers[rng.permutation(len(trackers))], _hands(rng, rng.integers(0, 3))))
+        detections[:, :4] += rng.normal(0, 5, (len(detections), 4))
+        detections[:, 2:4] = np.maximum(detections[:, 2:4], detections[:, :2] + 1)
+        _assert_associate_matches_baseline(detections, trackers, *_track_inputs(trackers, rng))
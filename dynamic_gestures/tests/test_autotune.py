@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+import autotune
+from autotune import host_key, model_key, tuned_config
+from onnx_models import DEFAULT_SESSION_CONFIG, HandClassification
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    path = tmp_path / "ort_profile.json"
+    monkeypatch.setenv("DYNAMIC_GESTURES_ORT_CACHE", str(path))
+    return path
+
+
+def _no_tuning(*args, **kwargs):
+    raise AssertionError("tuned again instead of reading the cache")
+
+
+def test_tuned_config_is_cached(cache, model_paths, monkeypatch):
+    classifier = model_paths[1]
+    config = tuned_config(classifier, warmup=0, runs=1, log=None)
+    assert config.keys() == DEFAULT_SESSION_CONFIG.keys()
+    entry = json.loads(cache.read_text())["hosts"][host_key()][model_key(classifier)]
+    assert entry["config"] == config and entry["latency_ms"] > 0
+
+    monkeypatch.setattr(autotune, "tune", _no_tuning)
+    assert tuned_config(classifier, log=None) == config
+    # OnnxModel(session_config="auto") reads the same cache
+    assert HandClassification(classifier, session_config="auto").session_config == config
+    with pytest.raises(AssertionError, match="tuned again"):
+        tuned_config(classifier, retune=True, log=None)
+
+
+def test_corrupt_cache_is_tuned_again(cache, model_paths):
+    cache.write_text("{not json")
+    config = tuned_config(model_paths[1], warmup=0, runs=1, log=None)
+    assert json.loads(cache.read_text())["hosts"][host_key()][model_key(model_paths[1])]["config"] == config
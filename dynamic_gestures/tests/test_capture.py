@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+import pytest
+
+from utils.capture import CapturedFrame
+
+
+def _frame(height=120, width=160):
+    # Smooth gradients, so that the planes decoded from the JPEG stay close to the downscaled frame.
+    y, x = np.mgrid[:height, :width]
+    return np.dstack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)]).astype(np.uint8)
+
+
+def _captured(frame, encoded):
+    data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])[1] if encoded else frame
+    return CapturedFrame(0, 0.0, data, frame.shape, encoded=encoded)
+
+
+@pytest.mark.parametrize("encoded", [False, True])
+@pytest.mark.parametrize("reduction", [1, 2, 4, 8])
+def test_plane_shape_and_content(encoded, reduction):
+    frame = _frame()
+    captured = _captured(frame, encoded)
+    plane = captured.plane(reduction)
+    assert plane.shape == (120 // reduction, 160 // reduction, 3)
+    assert plane.dtype == np.uint8
+    expected = cv2.resize(frame, plane.shape[1::-1], interpolation=cv2.INTER_AREA)
+    if encoded:
+        assert np.abs(plane.astype(int) - expected).mean() < 2
+    else:
+        assert np.array_equal(plane, expected)
+    assert captured.plane(reduction) is plane
+
+
+@pytest.mark.parametrize("encoded", [False, True])
+def test_plane_size_is_rounded_up(encoded):
+    captured = _captured(_frame(121, 162), encoded)
+    assert captured.plane(8).shape == (16, 21, 3)
+    assert captured.low.shape == (61, 81, 3)
+
+
+def test_encoded_frame_is_decoded_only_when_needed():
+    captured = _captured(_frame(), encoded=True)
+    captured.plane(4)
+    assert captured._full is None
+    assert captured.full.shape == (120, 160, 3)
+    assert captured.plane(1) is captured.full
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from utils import CommandPolicy, targets
+
+FIST, PALM, LIKE, OK = (targets.index(name) for name in ("fist", "palm", "like", "ok"))
+
+
+def test_commands_are_emitted_on_change():
+    policy = CommandPolicy()
+    assert policy.update(0.0, [FIST]) == ["STOP"]
+    assert policy.update(0.1, [FIST]) == []
+    # Unmapped gestures and missing labels keep the last command.
+    assert policy.update(0.2, [OK]) == []
+    assert policy.update(0.3, [None]) == []
+    assert policy.update(0.4, None) == []
+    assert policy.update(0.5, [PALM]) == ["MOVE"]
+    assert policy.update(0.6, [FIST]) == ["STOP"]
+
+
+def test_turns_repeat_after_the_cooldown():
+    policy = CommandPolicy(cooldown=1.5)
+    emitted = [(t, policy.update(t, [LIKE])) for t in np.arange(0.0, 4.0, 0.5)]
+    assert [t for t, commands in emitted if commands] == [0.0, 1.5, 3.0]
+    assert all(commands in ([], ["RIGHT"]) for _, commands in emitted)
+    policy.reset()
+    assert policy.update(3.1, [LIKE]) == ["RIGHT"]
+
+
+def test_arbitration():
+    ids = np.array([7, 3])
+    bboxes = np.array([[0.0, 0.0, 200.0, 200.0], [0.0, 0.0, 50.0, 50.0]])
+    assert CommandPolicy().update(0.0, [FIST, PALM], ids, bboxes) == ["STOP", "MOVE"]
+    assert CommandPolicy(arbitration="oldest").update(0.0, [FIST, PALM], ids, bboxes) == ["MOVE"]
+    assert CommandPolicy(arbitration="largest").update(0.0, [FIST, PALM], ids, bboxes) == ["STOP"]
+    with pytest.raises(ValueError):
+        CommandPolicy(arbitration="newest")
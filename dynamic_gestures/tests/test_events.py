@@ -0,0 +1,50 @@
+import threading
+
+from utils import Event, EventBus, GestureEvent
+
+
+def _events(count, start=0):
+    return [GestureEvent(track_id, Event.SWIPE_LEFT, float(track_id)) for track_id in range(start, start + count)]
+
+
+def test_every_subscriber_gets_every_event():
+    bus = EventBus()
+    first, second = bus.subscribe(), bus.subscribe()
+    bus.publish(_events(3))
+    assert first.drain() == _events(3)
+    assert [second.poll() for _ in range(4)] == _events(3) + [None]
+
+
+def test_slow_subscriber_drops_the_oldest_events():
+    bus = EventBus()
+    slow, fast = bus.subscribe(maxlen=2), bus.subscribe()
+    bus.publish(_events(5))
+    assert slow.dropped == 3
+    assert slow.drain() == _events(2, start=3)
+    assert fast.dropped == 0 and len(fast) == 5
+
+
+def test_closed_subscription_gets_nothing():
+    bus = EventBus()
+    with bus.subscribe() as subscription:
+        bus.publish(_events(1))
+    bus.publish(_events(1, start=1))
+    assert subscription.drain() == _events(1)
+
+
+def test_publishing_while_subscribers_change():
+    bus = EventBus()
+    steady = bus.subscribe(maxlen=10000)
+    done = threading.Event()
+
+    def churn():
+        while not done.is_set():
+            bus.subscribe(maxlen=1).close()
+
+    thread = threading.Thread(target=churn)
+    thread.start()
+    for start in range(0, 5000, 10):
+        bus.publish(_events(10, start=start))
+    done.set()
+    thread.join()
+    assert [event.track_id for event in steady.drain()] == list(range(5000))
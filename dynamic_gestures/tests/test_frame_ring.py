@@ -0,0 +1,83 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils import FrameRing
+
+SHAPE = (48, 64, 3)
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create(SHAPE, slots=4)
+    yield ring
+    ring.close()
+
+
+def _frame(index):
+    return np.full(SHAPE, index % 256, dtype=np.uint8)
+
+
+def test_read_latest_after_wrap(ring):
+    for index in range(10):
+        ring.write(_frame(index), float(index))
+    assert ring.written == 10
+    index, timestamp, frame = ring.read_latest()
+    assert (index, timestamp) == (9, 9.0)
+    assert np.array_equal(frame, _frame(9))
+    # Frames older than `slots` have been overwritten.
+    assert ring.is_current(9) and ring.is_current(6)
+    assert not ring.is_current(5)
+
+
+def test_read_copy_survives_overwrite(ring):
+    ring.write(_frame(0), 0.0)
+    out = np.empty(SHAPE, dtype=np.uint8)
+    index, _, frame = ring.read_latest(out=out)
+    assert index == 0 and frame is out
+    for index in range(1, 1 + 2 * ring.slots):
+        ring.write(_frame(index), float(index))
+    assert not ring.is_current(0)
+    assert np.array_equal(frame, _frame(0))
+
+
+def test_read_latest_timeout_and_close(ring):
+    assert ring.read_latest(timeout=0.01) is None
+    ring.write(_frame(0), 0.0)
+    assert ring.read_latest(0, timeout=0.01) is None
+    ring.close_stream()
+    start = time.monotonic()
+    assert ring.read_latest(0, timeout=5.0) is None
+    assert time.monotonic() - start < 1.0
+
+
+def test_attached_reader_never_sees_torn_frames(ring):
+    reader = FrameRing.attach(ring.name)
+    frames = 2000
+    results = []
+
+    def read():
+        last = -1
+        out = np.empty(SHAPE, dtype=np.uint8)
+        while True:
+            item = reader.read_latest(last, timeout=2.0, out=out)
+            if item is None:
+                break
+            last, _, frame = item
+            results.append((last, frame.min(), frame.max()))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    for index in range(frames):
+        view = ring.begin_write()
+        view[: SHAPE[0] // 2] = index % 256
+        time.sleep(0)
+        view[SHAPE[0] // 2 :] = index % 256
+        ring.commit(float(index))
+    ring.close_stream()
+    thread.join()
+    reader.close()
+    assert results and results[-1][0] == frames - 1
+    assert all(low == high == index % 256 for index, low, high in results)
@@ -0,0 +1,46 @@
+import threading
+
+from main_controller import MainController
+from ocsort import IdAllocator
+from utils import TraceReader, replay_trace
+
+
+def test_id_allocator_sequence_and_reset():
+    ids = IdAllocator(5)
+    assert [ids(), ids(), ids()] == [5, 6, 7]
+    assert ids.value == 8
+    ids.reset(2)
+    assert ids() == 2
+
+
+def test_id_allocator_is_thread_safe():
+    ids = IdAllocator()
+    taken = []
+
+    def take():
+        taken.extend(ids() for _ in range(1000))
+
+    threads = [threading.Thread(target=take) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(taken) == list(range(4000))
+
+
+def test_controllers_number_tracks_independently(golden_trace):
+    with TraceReader(golden_trace) as reader:
+        first = MainController(None, None, ids=IdAllocator(reader.id_base))
+        second = MainController(None, None, ids=IdAllocator(reader.id_base))
+        assert replay_trace(first, reader, check=True) == []
+        assert replay_trace(second, reader, check=True) == []
+
+
+def test_reset_reuses_pooled_trackers(golden_trace):
+    with TraceReader(golden_trace) as reader:
+        controller = MainController(None, None, ids=IdAllocator(reader.id_base))
+        assert replay_trace(controller, reader, check=True) == []
+        assert controller.tracks.pool
+        controller.reset(id_base=reader.id_base)
+        assert len(controller.tracks) == 0
+        assert replay_trace(controller, reader, check=True) == []
@@ -0,0 +1,85 @@
+import numpy as np
+
+from ocsort import KalmanBoxTracker
+from ocsort.kalmanboxtracker import box_model, cached_steady_state, convert_x_to_bbox
+
+
+def _boxes(frames=300, seed=0):
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for i in range(frames):
+        if i % 40 in (12, 13, 14) or rng.random() < 0.05:
+            boxes.append(None)
+        else:
+            x, y = 100 + 2.0 * i + rng.normal(0, 1), 200 - 0.5 * i + rng.normal(0, 1)
+            boxes.append(np.array([x, y, x + 80 + rng.normal(0, 1), y + 120, 0.9]))
+    return boxes
+
+
+def _streak(frames=300, seed=1):
+    # a box moving at constant speed and detected in every frame
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for i in range(frames):
+        x, y = 100 + 2.0 * i + rng.normal(0, 1), 200 - 0.5 * i + rng.normal(0, 1)
+        boxes.append(np.array([x, y, x + 80 + rng.normal(0, 1), y + 120, 0.9]))
+    return boxes
+
+
+def _run(tracker, boxes):
+    states = []
+    for bbox in boxes:
+        tracker.predict()
+        tracker.update(bbox)
+        states.append(tracker.kf.x.copy())
+    return np.hstack(states)
+
+
+def test_lean_filter_matches_reference():
+    boxes = _boxes()
+    reference = _run(KalmanBoxTracker(boxes[0], lean=False, track_id=0), boxes[1:])
+    lean = _run(KalmanBoxTracker(boxes[0], track_id=0), boxes[1:])
+    assert np.array_equal(lean, reference)
+
+
+def test_observation_history_is_bounded():
+    boxes = _boxes(frames=2000)
+    for steady_state_hits in (None, 3):
+        tracker = KalmanBoxTracker(boxes[0], steady_state_hits=steady_state_hits, track_id=0)
+        longest = 0
+        for bbox in boxes[1:]:
+            tracker.predict()
+            tracker.update(bbox)
+            longest = max(longest, len(tracker.kf.history_obs))
+        # The last observation and the misses after it.
+        assert longest <= 5
+
+
+def test_steady_state_converges_to_full_updates():
+    boxes = _streak()
+    full = KalmanBoxTracker(boxes[0], track_id=0)
+    steady = KalmanBoxTracker(boxes[0], steady_state_hits=5, track_id=0)
+    full_states = _run(full, boxes[1:])
+    steady_states = _run(steady, boxes[1:])
+    assert steady.steady and not full.steady
+    errors = [np.abs(convert_x_to_bbox(a) - convert_x_to_bbox(b)).max() for a, b in zip(steady_states.T, full_states.T)]
+    # identical until the switch, which moves the boxes by up to pixels, then they converge
+    assert max(errors[:5]) == 0
+    assert max(errors[5:20]) > 0.1
+    assert errors[-1] < 0.01
+    # as the covariance of the full updates converges to the steady state one
+    _, _, P_post = steady.steady_state
+    assert np.abs(full.kf.P - P_post).max() < 0.01 * np.abs(P_post).max()
+
+
+def test_steady_state_is_cached_per_model():
+    boxes = _streak(frames=1)
+    first = KalmanBoxTracker(boxes[0], steady_state_hits=5, track_id=0)
+    second = KalmanBoxTracker(boxes[0], steady_state_hits=5, track_id=1)
+    assert first.steady_state is second.steady_state
+    assert KalmanBoxTracker(boxes[0], track_id=2).steady_state is None
+    F, H, Q, R, P = box_model()
+    assert cached_steady_state(F, H, Q, R, P) is first.steady_state
+    other = cached_steady_state(F, H, 2 * Q, R, P)
+    assert other is not first.steady_state
+    assert not np.allclose(other[0], first.steady_state[0])
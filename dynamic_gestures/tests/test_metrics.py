@@ -0,0 +1,123 @@
+import asyncio
+import re
+import time
+
+import pytest
+
+from utils.metrics import MetricsRegistry, metrics, timed
+
+# A sample line of the Prometheus text format: name, optional labels and a value.
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="[^"]*"'
+SAMPLE = re.compile(rf"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{{({LABEL}(,{LABEL})*)?\}})? (\S+)$")
+
+
+def _registry():
+    registry = MetricsRegistry()
+    registry.enabled = True
+    return registry
+
+
+def _parse(text):
+    """
+    Samples of a Prometheus text exposition, {(name, labels): value}, checking every line on the way.
+    """
+    assert text.endswith("\n")
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram") and name not in types
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.group(1), match.group(3) or "", match.group(5)
+        base = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert base in types, f"{name} has no TYPE line"
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+@pytest.fixture
+def global_metrics():
+    enabled = metrics.enabled
+    metrics.reset()
+    metrics.enabled = True
+    yield metrics
+    metrics.reset()
+    metrics.enabled = enabled
+
+
+def test_enabled_registry_records():
+    registry = _registry()
+    with registry.timer("step_seconds"):
+        time.sleep(0.002)
+    registry.observe("step_seconds", 0.2)
+    registry.inc("frames_total")
+    registry.inc("frames_total", 2)
+    registry.set("tracks", 3)
+    registry.set("tracks", 1)
+    samples = _parse(registry.render())
+    assert samples[("step_seconds_count", "")] == 2
+    assert samples[("step_seconds_sum", "")] > 0.202
+    assert samples[("step_seconds_bucket", 'le="0.001"')] == 0
+    assert samples[("step_seconds_bucket", 'le="0.25"')] == 2
+    assert samples[("step_seconds_bucket", 'le="+Inf"')] == 2
+    assert samples[("frames_total", "")] == 3
+    assert samples[("tracks", "")] == 1
+
+
+def test_disabled_registry_is_a_no_op():
+    registry = MetricsRegistry()
+    with registry.timer("step_seconds"):
+        pass
+    registry.observe("step_seconds", 0.1)
+    registry.inc("frames_total")
+    registry.set("tracks", 3)
+    assert registry.render() == "\n"
+
+
+def test_timed_follows_the_global_switch(global_metrics):
+    @timed("work_seconds")
+    def work(value):
+        return value * 2
+
+    global_metrics.enabled = False
+    assert work(2) == 4
+    assert "work_seconds" not in global_metrics.render()
+    global_metrics.enabled = True
+    assert work(3) == 6
+    assert _parse(global_metrics.render())[("work_seconds_count", "")] == 1
+
+
+def test_snapshot_is_loaded_with_extra_labels():
+    worker = _registry()
+    worker.observe("frame_seconds", 0.003)
+    worker.inc("frames_total", 2, labels={"kind": "detector"})
+    worker.set("tracks", 3)
+    parent = _registry()
+    # Snapshots hold cumulative values, loading a newer one replaces the older one.
+    parent.load(worker.snapshot(), labels={"stream": "0"})
+    worker.observe("frame_seconds", 0.2)
+    parent.load(worker.snapshot(), labels={"stream": "0"})
+    samples = _parse(parent.render())
+    assert samples[("frames_total", 'kind="detector",stream="0"')] == 2
+    assert samples[("tracks", 'stream="0"')] == 3
+    assert samples[("frame_seconds_bucket", 'stream="0",le="0.005"')] == 1
+    assert samples[("frame_seconds_count", 'stream="0"')] == 2
+
+
+def test_metrics_route_serves_prometheus_text(global_metrics, monkeypatch):
+    import run_demo
+    from run_demo import get_metrics, publish_command
+
+    monkeypatch.setattr(run_demo, "latest_command", run_demo.latest_command)
+    publish_command("STOP", 1.0)
+    publish_command("STOP", 2.0, stream="1")
+    global_metrics.observe("frame_seconds", 0.03)
+    response = asyncio.run(get_metrics())
+    assert response.media_type == "text/plain; version=0.0.4"
+    samples = _parse(response.body.decode())
+    assert samples[("commands_published_total", 'command="STOP"')] == 1
+    assert samples[("commands_published_total", 'command="STOP",stream="1"')] == 1
+    assert samples[("frame_seconds_count", "")] == 1
@@ -0,0 +1,24 @@
+import cv2
+import numpy as np
+import pytest
+
+from main_controller import MainController
+
+
+def _track(model_paths, frames, **kwargs):
+    controller = MainController(*model_paths, min_hits=1, **kwargs)
+    return [controller(frame) for frame in frames]
+
+
+@pytest.mark.parametrize("options", [{}, {"letterbox": True}, {"tiled": True}])
+def test_mirrored_coordinates_match_flipped_frames(model_paths, golden_frames, options):
+    flipped = _track(model_paths, [cv2.flip(frame, 1) for frame in golden_frames], **options)
+    mirrored = _track(model_paths, golden_frames, mirror=True, **options)
+    assert sum(ids is not None for _, ids, _ in flipped) >= len(golden_frames) // 2
+    for (expected_boxes, expected_ids, expected_labels), (boxes, ids, labels) in zip(flipped, mirrored):
+        if expected_ids is None:
+            assert ids is None
+            continue
+        assert np.array_equal(ids, expected_ids)
+        assert np.array_equal(labels, expected_labels)
+        assert np.array_equal(boxes, expected_boxes)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from utils import MotionGate
+
+
+def _scene(offset=0):
+    frame = np.full((240, 320, 3), 80, dtype=np.uint8)
+    frame[60:180, 100 + offset : 160 + offset] = 220
+    return frame
+
+
+def test_static_scene_is_skipped_while_idle():
+    gate = MotionGate(max_skip=None)
+    assert gate(_scene(), idle=True)
+    assert not any(gate(_scene(), idle=True) for _ in range(10))
+    assert gate.skipped == 10 and gate.frames == 11
+
+
+def test_motion_and_tracks_run_the_detector():
+    gate = MotionGate(max_skip=None)
+    gate(_scene(), idle=True)
+    assert gate(_scene(offset=80), idle=True)
+    assert gate(_scene(offset=80), idle=False)
+
+
+def test_static_scene_is_checked_every_max_skip_frames():
+    gate = MotionGate(max_skip=3)
+    decisions = [gate(_scene(), idle=True) for _ in range(9)]
+    assert decisions == [True, False, False, False, True, False, False, False, True]
+
+
+def test_background_follows_the_frame_size():
+    gate = MotionGate(max_skip=None)
+    gate(_scene(), idle=True)
+    # Another aspect ratio restarts the background, e.g. after a change of the detector input size.
+    assert gate(_scene()[:120], idle=True)
+    assert not gate(_scene()[:120], idle=True)
+    gate.reset()
+    assert gate(_scene(), idle=True)
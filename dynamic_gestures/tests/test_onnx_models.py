@@ -0,0 +1,167 @@
+import cv2
+import numpy as np
+import pytest
+
+from onnx_models import HandClassification, HandDetection, model_variant
+from utils.box_utils_numpy import iou_of
+
+
+def _unbound(model):
+    """
+    Same model running every batch with sess.run on a copy of its input buffer instead of the IOBinding.
+    """
+    unbound = type(model)(model.model_path, model.image_size)
+
+    def run_bound(batch):
+        return unbound.sess.run(None, {unbound.input_name: unbound.input_buffer(batch).copy()})
+
+    unbound.run_bound = run_bound
+    return unbound
+
+
+@pytest.fixture
+def detector(model_paths):
+    return HandDetection(model_paths[0])
+
+
+@pytest.fixture
+def classifier(model_paths):
+    return HandClassification(model_paths[1])
+
+
+def test_bound_detection_matches_sess_run(detector, golden_frames):
+    unbound = _unbound(detector)
+    # Results of every call are kept while the next calls run on the same bound buffers.
+    results = [detector(frame) for frame in golden_frames]
+    assert sum(len(boxes) for boxes, _ in results) > 0
+    for frame, (boxes, probs) in zip(golden_frames, results):
+        expected_boxes, expected_probs = unbound(frame)
+        assert np.array_equal(boxes, expected_boxes)
+        assert np.array_equal(probs, expected_probs)
+
+
+def test_bound_classification_matches_sess_run(detector, classifier, golden_frames):
+    unbound = _unbound(classifier)
+    frame = golden_frames[0]
+    boxes = detector(frame)[0]
+    # batches of one and two crops, each run twice
+    batches = [boxes, boxes, np.concatenate((boxes, boxes + 8)), np.concatenate((boxes + 8, boxes))]
+    results = [classifier(frame, bboxes, return_probs=True) for bboxes in batches]
+    for bboxes, (labels, probs) in zip(batches, results):
+        expected_labels, expected_probs = unbound(frame, bboxes, return_probs=True)
+        assert np.array_equal(labels, expected_labels)
+        assert np.array_equal(probs, expected_probs)
+
+
+def _input_points(matrix, points):
+    # cv2.resize samples at pixel centers and the maps are shifted the same way, undo it for exact corners
+    scale = matrix[0, 0]
+    return points @ matrix[:, :2].T + matrix[:, 2] - (0.5 * scale - 0.5)
+
+
+def test_letterbox_maps_the_frame_into_the_padded_input(model_paths):
+    detector = HandDetection(model_paths[0], letterbox=True)
+    matrix, box_scale, box_offset, _ = detector._frame_map((360, 640), None)
+    # 640x360 scaled by 1/2 is 320x180, centered in the 320x240 input
+    corners = _input_points(matrix, np.array([[0.0, 0.0], [640.0, 360.0]]))
+    assert np.allclose(corners, [[0, 30], [320, 210]])
+    # normalized model boxes come back to the frame boxes they were mapped from
+    normalized = np.array([[0.1, 0.2, 0.6, 0.9], [0.0, 0.125, 1.0, 0.875]], dtype=np.float32)
+    boxes = normalized * box_scale + box_offset
+    assert np.allclose(boxes[1], [0, 0, 640, 360], atol=1e-3)
+    mapped = _input_points(matrix, boxes.reshape(-1, 2)).reshape(-1, 4)
+    assert np.allclose(mapped, normalized * np.tile(detector.image_size, 2), atol=1e-3)
+    # on a plane downscaled by 2 the boxes come back in full resolution coordinates
+    _, plane_scale, plane_offset, _ = detector._frame_map((180, 320), (360, 640))
+    assert np.allclose(normalized * plane_scale + plane_offset, boxes, atol=1e-3)
+
+
+def test_letterbox_boxes_match_stretched_boxes(model_paths, golden_frames):
+    stretched = HandDetection(model_paths[0])
+    letterboxed = HandDetection(model_paths[0], letterbox=True)
+    frame = golden_frames[-1]
+    expected = stretched(frame)[0]
+    assert len(expected) == 1
+    for plane, full_shape in ((frame, None), (cv2.resize(frame, (320, 180), interpolation=cv2.INTER_AREA), (360, 640))):
+        boxes = letterboxed(plane, full_shape=full_shape)[0]
+        assert len(boxes) == 1
+        assert iou_of(boxes[0].astype(np.float32), expected[0].astype(np.float32)) > 0.8
+
+
+# [x1, y1, x2, y2, score]
+FULL = np.array([[100, 100, 140, 140, 0.9]], dtype=np.float32)
+# a duplicate of the full frame detection with a lower score, and a hand only the tiled pass finds
+REGION = np.array([[102, 101, 141, 142, 0.8], [400, 200, 420, 220, 0.7]], dtype=np.float32)
+
+
+@pytest.fixture
+def stub_detector(model_paths):
+    """
+    HandDetection whose full frame pass finds FULL and tiled passes REGION, recording the regions searched.
+    """
+    detector = HandDetection(model_paths[0])
+    detector.regions_searched = []
+
+    def detect(frame, matrix, box_scale, box_offset):
+        if matrix is None:
+            return FULL[:, :4].copy(), FULL[:, 4].copy()
+        detector.regions_searched.append(matrix)
+        return REGION[:, :4].copy(), REGION[:, 4].copy()
+
+    detector._detect = detect
+    return detector
+
+
+def test_tiled_pass_merges_duplicates(stub_detector):
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    boxes, probs = stub_detector(frame, rois=np.array([[395, 195, 425, 225]], dtype=np.float32))
+    assert len(stub_detector.regions_searched) == 1
+    order = np.argsort(-probs)
+    assert np.array_equal(boxes[order], [[100, 100, 140, 140], [400, 200, 420, 220]])
+    assert np.allclose(probs[order], [0.9, 0.7])
+
+
+def test_tiled_pass_skips_detected_and_large_tracks(stub_detector):
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    # a track the full frame pass found again, and one the model already sees large enough
+    rois = np.array([[101, 99, 141, 139], [300, 50, 500, 300]], dtype=np.float32)
+    boxes, probs = stub_detector(frame, rois=rois)
+    assert len(stub_detector.regions_searched) == 0
+    assert np.array_equal(boxes, FULL[:, :4])
+
+
+def test_regions_stay_inside_the_frame(model_paths):
+    detector = HandDetection(model_paths[0], max_rois=2)
+    rois = np.array([[0, 0, 20, 20], [600, 330, 640, 360], [300, 150, 310, 160]], dtype=np.float32)
+    regions = detector.regions(rois, (360, 640), zoom=0.5)
+    # the two smallest tracks only
+    assert len(regions) == 2
+    x0, y0, scales = regions.T
+    widths, heights = detector.image_size[0] / scales, detector.image_size[1] / scales
+    assert np.all(x0 >= 0) and np.all(y0 >= 0)
+    assert np.all(x0 + widths <= 640 + 1e-3) and np.all(y0 + heights <= 360 + 1e-3)
+
+
+@pytest.mark.parametrize(
+    "precision, expected",
+    [
+        ("fp32", "models/hand_detector.onnx"),
+        ("fp16", "models/hand_detector.fp16.onnx"),
+        ("int8", "models/hand_detector.int8.onnx"),
+    ],
+)
+def test_model_variant(precision, expected):
+    assert model_variant("models/hand_detector.onnx", precision) == expected
+
+
+def test_unknown_precision():
+    with pytest.raises(ValueError, match="int4"):
+        model_variant("models/hand_detector.onnx", "int4")
+
+
+def test_missing_variant_is_reported(tmp_path):
+    model_path = str(tmp_path / "hand_detector.onnx")
+    with pytest.raises(FileNotFoundError, match="hand_detector.int8.onnx not found, create"):
+        HandDetection(model_path, precision="int8")
+    with pytest.raises(FileNotFoundError, match="hand_detector.onnx not found$"):
+        HandDetection(model_path)
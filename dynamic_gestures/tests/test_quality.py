@@ -0,0 +1,50 @@
+import numpy as np
+
+from main_controller import MainController
+from utils import QUALITY_LEVELS, QualityController
+
+
+def test_quality_degrades_over_budget_and_restores():
+    quality = QualityController(budget=0.01, alpha=1.0, hold=3, restore_frames=5)
+    levels = [quality.update(0.02) for _ in range(3)]
+    assert levels == [0, 0, 1]
+    # Held for `hold` frames after a change.
+    assert [quality.update(0.02) for _ in range(3)] == [1, 1, 2]
+    levels = [quality.update(0.001) for _ in range(5)]
+    assert levels[-1] == 1 and levels[:-1] == [2] * 4
+    quality.reset()
+    assert quality.level == 0 and quality.latency is None
+
+
+def test_quality_stops_at_the_cheapest_level():
+    quality = QualityController(budget=0.01, alpha=1.0, hold=1)
+    for _ in range(20):
+        quality.update(1.0)
+    assert quality.level == len(QUALITY_LEVELS) - 1
+
+
+class _Detector:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, frame, rois=None, full_shape=None):
+        self.calls += 1
+        return np.empty((0, 4)), np.empty(0)
+
+
+def _detector_calls(level, frames=60):
+    controller = MainController(None, None, quality=QualityController(levels=(level,)))
+    controller.detection_model = _Detector()
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    for _ in range(frames):
+        controller(frame)
+    return controller.detection_model.calls
+
+
+def test_every_level_runs_the_detector_at_most_as_often_as_the_previous():
+    calls = [_detector_calls(level) for level in QUALITY_LEVELS]
+    assert calls[0] == 60
+    assert all(later <= earlier for earlier, later in zip(calls, calls[1:]))
+    # The levels with a reduced detection plane also save detector runs on frames that are not decoded reduced.
+    reduced = [calls for level, calls in zip(QUALITY_LEVELS, calls) if level.reduction > 1]
+    assert reduced and max(reduced) < calls[0]
@@ -0,0 +1,111 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from run_replay import FrameSource, StageTimer, percentiles, replay
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    """
+    20 frames whose pixels hold their index, written out of order next to a file that is not an image.
+    """
+    for index in reversed(range(20)):
+        cv2.imwrite(str(tmp_path / f"frame_{index:03d}.png"), np.full((8, 12, 3), index, dtype=np.uint8))
+    (tmp_path / "notes.txt").write_text("not a frame")
+    return tmp_path
+
+
+def test_frame_source_yields_every_frame_in_order(image_dir):
+    source = FrameSource(str(image_dir), prefetch=4)
+    assert source.fps == 30.0
+    frames = list(source)
+    assert [index for index, _, _ in frames] == list(range(20))
+    assert [frame[0, 0, 0] for _, _, frame in frames] == list(range(20))
+    assert [timestamp for _, timestamp, _ in frames] == [index / 30.0 for index in range(20)]
+    assert len(list(FrameSource(str(image_dir / "frame_00*.png"), fps=10))) == 10
+
+
+def test_stopping_early_ends_the_prefetch_thread(image_dir):
+    source = FrameSource(str(image_dir), prefetch=2)
+    frames = iter(source)
+    assert [next(frames)[0] for _ in range(3)] == [0, 1, 2]
+    # the decoder is blocked on the full queue until the consumer stops
+    frames.close()
+    source._thread.join(timeout=2)
+    assert not source._thread.is_alive()
+    # and the source can be read again
+    assert len(list(source)) == 20
+
+
+def test_stage_timer():
+    def work(seconds):
+        time.sleep(seconds)
+        if seconds > 0.01:
+            raise RuntimeError("slow")
+        return seconds
+
+    timer = StageTimer(work)
+    assert timer(0.005) == 0.005
+    with pytest.raises(RuntimeError):
+        timer(0.02)
+    assert timer.calls == 2
+    assert timer.pop() >= 0.025
+    assert timer.calls == 0 and timer.pop() == 0.0
+
+
+def test_percentiles():
+    assert percentiles([]) == {"count": 0}
+    stats = percentiles(np.arange(1, 101) / 1000.0)
+    assert stats["count"] == 100
+    assert stats["mean"] == pytest.approx(50.5)
+    assert stats["p50"] == pytest.approx(50.5)
+    assert stats["p99"] == pytest.approx(99.01)
+    assert stats["max"] == pytest.approx(100.0)
+
+
+class _Controller:
+    """
+    Stands in for MainController: runs the detector on every other frame and records when frames arrive.
+    """
+
+    def __init__(self):
+        self.detection_model = lambda frame: np.empty((0, 4))
+        self.classification_model = lambda frame, boxes: np.empty(0)
+        self.update = lambda dets: (np.empty((0, 4)), [])
+        self.quality = None
+        self.arrivals = []
+
+    def __call__(self, frame):
+        self.arrivals.append(time.perf_counter())
+        if len(self.arrivals) % 2:
+            self.update(self.detection_model(frame))
+        return None, None, None
+
+
+def test_replay_report(image_dir):
+    controller = _Controller()
+    detector = controller.detection_model
+    report = replay(controller, FrameSource(str(image_dir)))
+    assert report["frames"] == 20
+    assert report["skipped_frames"] == 10
+    assert report["latency_ms"]["total"]["count"] == 20
+    assert report["latency_ms"]["detector"]["count"] == 10
+    assert report["latency_ms"]["classifier"] == {"count": 0}
+    assert report["commands"] == []
+    # the timers are removed again
+    assert controller.detection_model is detector
+
+
+def test_realtime_replay_holds_the_source_timestamps(image_dir):
+    controller = _Controller()
+    source = FrameSource(str(image_dir), fps=100)
+    start = time.perf_counter()
+    report = replay(controller, source, realtime=True)
+    offsets = np.array(controller.arrivals) - start
+    timestamps = np.arange(20) / 100.0
+    assert np.all(offsets >= timestamps - 1e-3)
+    assert np.all(offsets - timestamps < 0.05)
+    assert report["wall_time"] >= timestamps[-1]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from ocsort import smooth_tracks
+from ocsort.kalmanboxtracker import box_model
+from ocsort.smoothing import boxes_to_z, z_to_boxes
+
+
+def _reference(boxes):
+    """
+    Kalman filter and RTS smoother of one track, one frame at a time.
+    """
+    F, H, Q, R, P = (m.astype(float) for m in box_model())
+    z = boxes_to_z(np.nan_to_num(boxes))
+    x = np.zeros((7, 1))
+    x[:4, 0] = z[0]
+    xs, Ps, xp, Pp = [x], [P], [None], [None]
+    for k in range(1, len(boxes)):
+        if x[6, 0] + x[2, 0] <= 0:
+            x = x.copy()
+            x[6, 0] = 0.0
+        x = F @ x
+        P = F @ P @ F.T + Q
+        xp.append(x)
+        Pp.append(P)
+        if not np.isnan(boxes[k]).any():
+            K = P @ H.T @ np.linalg.inv(H @ P @ H.T + R)
+            I_KH = np.eye(7) - K @ H
+            x = x + K @ (z[k][:, None] - H @ x)
+            P = I_KH @ P @ I_KH.T + K @ R @ K.T
+        xs.append(x)
+        Ps.append(P)
+    for k in range(len(boxes) - 2, -1, -1):
+        C = Ps[k] @ F.T @ np.linalg.inv(Pp[k + 1])
+        xs[k] = xs[k] + C @ (xs[k + 1] - xp[k + 1])
+        Ps[k] = Ps[k] + C @ (Ps[k + 1] - Pp[k + 1]) @ C.T
+    return z_to_boxes(np.array([x[:4, 0] for x in xs]))
+
+
+def _tracks(seed=0, count=12):
+    rng = np.random.default_rng(seed)
+    tracks = []
+    for _ in range(count):
+        length = int(rng.integers(1, 60))
+        steps = np.arange(length)[:, None]
+        start = rng.uniform(100, 800, 2)
+        size = rng.uniform(60, 160)
+        corners = start + steps * rng.normal(0, 5, 2) + rng.normal(0, 2, (length, 2))
+        boxes = np.concatenate((corners, corners + size), axis=1)
+        boxes[1:][rng.random(length - 1) < 0.2] = np.nan
+        tracks.append(boxes)
+    return tracks
+
+
+def test_smooth_tracks_matches_reference():
+    tracks = _tracks()
+    for boxes, smoothed in zip(tracks, smooth_tracks(tracks)):
+        assert smoothed.shape == boxes.shape
+        assert not np.isnan(smoothed).any()
+        np.testing.assert_allclose(smoothed, _reference(boxes), rtol=1e-7, atol=1e-6)
+
+
+def test_smooth_tracks_does_not_depend_on_batching():
+    tracks = _tracks(seed=1)
+    batched = smooth_tracks(tracks)
+    single = smooth_tracks(tracks, batch_cells=1)
+    for a, b in zip(batched, single):
+        np.testing.assert_allclose(a, b, rtol=1e-9, atol=1e-9)
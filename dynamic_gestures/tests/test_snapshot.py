@@ -0,0 +1,100 @@
+import numpy as np
+
+from main_controller import MainController
+from ocsort import IdAllocator
+from utils import SnapshotFile, TraceReader, replay_trace
+from utils.snapshot import SLOT
+
+
+def _arrays(size, value=0):
+    return {"values": np.full(size, value, dtype=np.float64), "index": np.arange(size, dtype=np.int32).reshape(-1, 2)}
+
+
+def _assert_arrays_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        assert actual[name].dtype == expected[name].dtype
+        assert np.array_equal(actual[name], expected[name])
+
+
+def test_round_trip_and_reopen(tmp_path):
+    path = str(tmp_path / "tracker.snapshot")
+    with SnapshotFile(path) as snapshot:
+        assert snapshot.read() is None
+        snapshot.write(_arrays(8, 1), 1.0)
+        snapshot.write(_arrays(8, 2), 2.0)
+        timestamp, arrays = snapshot.read()
+        assert timestamp == 2.0
+        _assert_arrays_equal(arrays, _arrays(8, 2))
+    with SnapshotFile(path) as snapshot:
+        timestamp, arrays = snapshot.read()
+        assert timestamp == 2.0
+        _assert_arrays_equal(arrays, _arrays(8, 2))
+
+
+def test_growth_keeps_the_newest_snapshot(tmp_path):
+    path = str(tmp_path / "tracker.snapshot")
+    with SnapshotFile(path, slot_size=256) as snapshot:
+        snapshot.write(_arrays(4, 1), 1.0)
+        snapshot.write(_arrays(1000, 2), 2.0)
+        assert snapshot.slot_size > 256
+        timestamp, arrays = snapshot.read()
+        assert timestamp == 2.0
+        _assert_arrays_equal(arrays, _arrays(1000, 2))
+        snapshot.write(_arrays(4, 3), 3.0)
+    assert not (tmp_path / "tracker.snapshot.tmp").exists()
+    with SnapshotFile(path) as snapshot:
+        timestamp, arrays = snapshot.read()
+        assert timestamp == 3.0
+        _assert_arrays_equal(arrays, _arrays(4, 3))
+
+
+def test_corrupt_slot_falls_back_to_the_older_snapshot(tmp_path):
+    path = str(tmp_path / "tracker.snapshot")
+    with SnapshotFile(path, slot_size=1024) as snapshot:
+        snapshot.write(_arrays(8, 1), 1.0)
+        snapshot.write(_arrays(8, 2), 2.0)
+        newest = max(snapshot._slots())[2]
+    with open(path, "r+b") as file:
+        file.seek(newest + 16)
+        byte = file.read(1)
+        file.seek(newest + 16)
+        file.write(bytes([byte[0] ^ 0xFF]))
+    with SnapshotFile(path) as snapshot:
+        timestamp, arrays = snapshot.read()
+        assert timestamp == 1.0
+        _assert_arrays_equal(arrays, _arrays(8, 1))
+        # The next snapshot replaces the corrupt slot.
+        snapshot.write(_arrays(8, 3), 3.0)
+        assert snapshot.read()[0] == 3.0
+        assert min(snapshot._slots())[1] == 1.0
+
+
+def test_interrupted_write_keeps_the_previous_snapshot(tmp_path):
+    path = str(tmp_path / "tracker.snapshot")
+    with SnapshotFile(path, slot_size=1024) as snapshot:
+        snapshot.write(_arrays(8, 1), 1.0)
+        # A write stopped before the sequence number was published leaves its slot invalid.
+        offset = snapshot._offset(1)
+        snapshot._mmap[offset : offset + SLOT.size] = bytes(SLOT.size)
+        snapshot._mmap[offset + SLOT.size : offset + SLOT.size + 64] = bytes(range(64))
+    with SnapshotFile(path) as snapshot:
+        assert snapshot.read()[0] == 1.0
+
+
+def test_controller_resumes_from_a_snapshot(tmp_path, golden_trace):
+    path = str(tmp_path / "tracker.snapshot")
+    with TraceReader(golden_trace) as reader:
+        split = 180
+        controller = MainController(None, None, ids=IdAllocator(reader.id_base))
+        records = [reader[i] for i in range(split)]
+        assert replay_trace(controller, records, check=True) == []
+        with SnapshotFile(path) as snapshot:
+            snapshot.write(controller.get_state(), 0.0)
+        with SnapshotFile(path) as snapshot:
+            _, state = snapshot.read()
+        resumed = MainController(None, None)
+        resumed.set_state(state)
+        records = [reader[i] for i in range(split, len(reader))]
+        assert replay_trace(resumed, records, check=True) == []
+        records = None
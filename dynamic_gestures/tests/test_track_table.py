@@ -0,0 +1,75 @@
+import argparse
+
+import numpy as np
+import pytest
+
+from main_controller import MainController, parse_label_alpha
+from ocsort import IdAllocator, TrackTable
+
+
+def _probs(label, classes=4, score=0.9):
+    probs = np.full(classes, (1.0 - score) / (classes - 1))
+    probs[label] = score
+    return probs
+
+
+def _table(tracks=2, classes=4):
+    table = TrackTable(label_classes=classes)
+    for i in range(tracks):
+        table.create(np.array([100.0 * i, 0.0, 100.0 * i + 50.0, 50.0, 0.9]))
+    return table
+
+
+def test_smooth_labels_ignores_single_frame_flips():
+    table = _table(tracks=1)
+    rows = np.array([0])
+    table.smooth_labels(rows, _probs(1)[None], 0.3, 0.6, 0.4)
+    assert table.labels.tolist() == [1]
+    table.smooth_labels(rows, _probs(2)[None], 0.3, 0.6, 0.4)
+    assert table.labels.tolist() == [1]
+    for _ in range(5):
+        table.smooth_labels(rows, _probs(2)[None], 0.3, 0.6, 0.4)
+    assert table.labels.tolist() == [2]
+
+
+def test_smooth_labels_skips_unknown_probabilities():
+    table = _table(tracks=2)
+    probs = np.vstack([_probs(3), np.full(4, np.nan)])
+    table.smooth_labels(np.array([0, 1]), probs, 0.3, 0.6, 0.4)
+    assert table.labels.tolist() == [3, -1]
+    # A first detection below the enter threshold does not set a label.
+    table.smooth_labels(np.array([1]), _probs(0, score=0.5)[None], 0.3, 0.6, 0.4)
+    assert table.labels.tolist() == [3, -1]
+
+
+def test_smooth_labels_follow_compaction():
+    table = _table(tracks=3)
+    table.smooth_labels(np.arange(3), np.vstack([_probs(0), _probs(1), _probs(2)]), 0.3, 0.6, 0.4)
+    table.alive[:] = [True, False, True]
+    table.compact()
+    assert table.labels.tolist() == [0, 2]
+    table.create(np.array([500.0, 0.0, 550.0, 50.0, 0.9]))
+    assert table.labels.tolist() == [0, 2, -1]
+
+
+def test_label_smoothing_is_off_by_default():
+    with_probs = MainController(None, None, ids=IdAllocator())
+    without_probs = MainController(None, None, ids=IdAllocator())
+    assert with_probs.label_alpha is None
+    dets = np.array([[10.0, 10.0, 60.0, 60.0, 0.9]])
+    for label in (1, 1, 2, 1, 2, 2):
+        labels = np.array([label])
+        boxes, output = with_probs.update(dets.copy(), labels, _probs(label, classes=45)[None])
+        expected_boxes, expected = without_probs.update(dets.copy(), labels)
+        assert np.array_equal(boxes, expected_boxes) and output == expected
+        assert with_probs.stable_labels is None
+
+
+def test_label_alpha_range():
+    assert parse_label_alpha("0.3") == 0.3
+    assert parse_label_alpha("1") == 1.0
+    for value in ("0", "-0.5", "1.5", "nan", "abc"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_label_alpha(value)
+    with pytest.raises(ValueError, match="label_alpha"):
+        MainController(None, None, label_alpha=0.0)
@@ -1,16 +1,48 @@
 from .action_controller import Deque
 from .box_utils_numpy import hard_nms
-from .drawer import Drawer
+from .capture import CapturedFrame, LatestFrameCapture
+from .commands import GESTURE_COMMANDS, TURN_COMMANDS, TURN_COOLDOWN, CommandPolicy
+from .drawer import DebugRenderer, Drawer
 from .enums import Event, HandPosition, targets
+from .events import EventBus, GestureEvent, Subscription
+from .frame_ring import FrameRing
 from .hand import Hand
+from .metrics import metrics, timed
+from .motion import MotionGate
+from .quality import QUALITY_LEVELS, QualityController, QualityLevel
+from .snapshot import SnapshotFile, pack_deques, unpack_deques
+from .trace import TraceReader, TraceWriter, replay_trace
 
 
 __all__ = [
     "Deque",
     "hard_nms",
+    "CapturedFrame",
+    "LatestFrameCapture",
+    "GESTURE_COMMANDS",
+    "TURN_COMMANDS",
+    "TURN_COOLDOWN",
+    "CommandPolicy",
+    "DebugRenderer",
     "Drawer",
     "Event",
     "HandPosition",
     "targets",
-    "Hand"
+    "EventBus",
+    "GestureEvent",
+    "Subscription",
+    "FrameRing",
+    "Hand",
+    "metrics",
+    "timed",
+    "MotionGate",
+    "QUALITY_LEVELS",
+    "QualityController",
+    "QualityLevel",
+    "SnapshotFile",
+    "pack_deques",
+    "unpack_deques",
+    "TraceReader",
+    "TraceWriter",
+    "replay_trace",
 ]
\ No newline at end of file
@@ -3,6 +3,7 @@ from collections import deque
 
 from .enums import Event, HandPosition, targets
 from .hand import Hand
+from .metrics import timed
 
 
 class Deque:
@@ -42,12 +43,21 @@ class Deque:
     def __reversed__(self):
         return reversed(self._deque)
 
+    @timed("deque_append_seconds")
     def append(self, x):
+        """
+        Append a hand and check for a dynamic gesture.
+
+        Returns
+        -------
+        bool
+            True if a dynamic gesture fired, it is then stored in `action`.
+        """
         if self.maxlen is not None and len(self) >= self.maxlen:
             self._deque.pop(0)
         self.set_hand_position(x)
         self._deque.append(x)
-        self.check_is_action(x)
+        return self.check_is_action(x)
 
     def check_duration(self, start_index, min_frames=None):
         """
@@ -0,0 +1,213 @@
+"""
+Camera capture that negotiates the format with the device and only decodes what the pipeline uses.
+
+A grab thread keeps the latest frame of the camera and drops older ones, so that a slow consumer always processes the
+newest frame instead of the backlog of the driver queue. MJPEG frames are kept encoded until they are used: the
+detector reads a reduced plane decoded at 1/2, 1/4 or 1/8 of the resolution directly from the JPEG, and the full
+resolution frame is only decoded when the classifier needs crops of it or the frame is drawn.
+"""
+import threading
+import time
+
+import cv2
+
+from .metrics import metrics
+
+# Flags decoding a JPEG at a fraction of its resolution, without decoding the full image first.
+REDUCED_DECODE = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def _fourcc_string(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\0")
+
+
+class CapturedFrame:
+    """
+    One camera frame, with a reduced resolution plane for detection and the full resolution frame decoded on demand.
+    Every resolution is decoded at most once.
+    """
+
+    def __init__(self, index, timestamp, data, shape, encoded=False, reduction=2):
+        """
+        Parameters
+        ----------
+        index : int
+            Number of the frame since the capture started, frames dropped before reaching the consumer included.
+        timestamp : float
+            time.time() when the frame was grabbed.
+        data : np.ndarray
+            JPEG bytes (1-d uint8) when encoded, a BGR image with shape (H, W, 3) otherwise.
+        shape : tuple
+            Full resolution shape (H, W, 3).
+        encoded : bool
+            Whether data is a JPEG.
+        reduction : int
+            Downscale factor of the detection plane, one of 1, 2, 4, 8.
+        """
+        if reduction not in REDUCED_DECODE:
+            raise ValueError(f"reduction must be one of {sorted(REDUCED_DECODE)}, got {reduction}")
+        self.index = index
+        self.timestamp = timestamp
+        self.data = data
+        self.shape = tuple(shape)
+        self.encoded = encoded
+        self.reduction = reduction
+        self._full = None if encoded else data
+        self._planes = {}
+
+    @property
+    def full(self):
+        """
+        Full resolution BGR frame.
+        """
+        if self._full is None:
+            self._full = cv2.imdecode(self.data, cv2.IMREAD_COLOR)
+        return self._full
+
+    @property
+    def low(self):
+        """
+        BGR frame reduced by `reduction` in both dimensions, for the detector.
+        """
+        return self.plane(self.reduction)
+
+    def plane(self, reduction):
+        """
+        BGR frame reduced by `reduction` (1, 2, 4 or 8) in both dimensions.
+        """
+        plane = self._planes.get(reduction)
+        if plane is None:
+            if reduction == 1:
+                plane = self.full
+            elif self.encoded and self._full is None:
+                plane = cv2.imdecode(self.data, REDUCED_DECODE[reduction])
+            else:
+                height, width = self.shape[:2]
+                size = (-(-width // reduction), -(-height // reduction))
+                plane = cv2.resize(self.full, size, interpolation=cv2.INTER_AREA)
+            self._planes[reduction] = plane
+        return plane
+
+
+class LatestFrameCapture:
+    """
+    cv2.VideoCapture read on a grab thread that only keeps the newest frame.
+    """
+
+    def __init__(self, device=0, size=(1280, 720), fps=30, fourcc=None, reduction=1, buffer_size=1):
+        """
+        Parameters
+        ----------
+        device : int or str
+            Camera index or a path/url accepted by cv2.VideoCapture.
+        size : tuple or None
+            Requested (width, height), None keeps the device default.
+        fps : float or None
+            Requested frame rate, None keeps the device default.
+        fourcc : str or None
+            Requested pixel format, "MJPG" or "YUYV". None keeps the device default.
+        reduction : int
+            Downscale factor of the detection plane of the frames, one of 1, 2, 4, 8.
+        buffer_size : int or None
+            Frames queued by the driver, 1 keeps the latency of a frame at most one frame period.
+        """
+        if reduction not in REDUCED_DECODE:
+            raise ValueError(f"reduction must be one of {sorted(REDUCED_DECODE)}, got {reduction}")
+        self.reduction = reduction
+        self.cap = cv2.VideoCapture(device)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open capture device {device!r}")
+        # The format is set first, some backends only accept sizes and rates available in the current format.
+        if fourcc is not None:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if size is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        if fps is not None:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        if buffer_size is not None:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+        self.fourcc = _fourcc_string(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        # Raw MJPEG buffers are decoded by CapturedFrame, only at the resolution that is used.
+        self.encoded = self.fourcc == "MJPG" and self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+        self.dropped = 0
+        self._latest = None
+        self._index = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._grab, daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        width, height = self.size
+        return (
+            f"LatestFrameCapture({width}x{height} {self.fourcc or '?'} {self.fps:.0f} fps, "
+            f"{'encoded' if self.encoded else 'decoded'}, detection plane 1/{self.reduction})"
+        )
+
+    def _frame(self, data, timestamp):
+        shape = (self.size[1], self.size[0], 3)
+        if self.encoded and (data.ndim != 2 or data.shape[0] != 1):
+            # The backend ignored CONVERT_RGB and decoded the frame anyway.
+            self.encoded = False
+        if self.encoded:
+            return CapturedFrame(self._index, timestamp, data.reshape(-1), shape, True, self.reduction)
+        return CapturedFrame(self._index, timestamp, data, data.shape, False, self.reduction)
+
+    def _grab(self):
+        while not self._closed:
+            ret, data = self.cap.read()
+            timestamp = time.time()
+            with self._condition:
+                if not ret:
+                    self._closed = True
+                    self._condition.notify_all()
+                    break
+                if self._latest is not None:
+                    self.dropped += 1
+                    metrics.inc("capture_dropped_frames_total")
+                self._latest = self._frame(data, timestamp)
+                self._index += 1
+                self._condition.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Wait for a frame newer than the last one read.
+
+        Returns
+        -------
+        CapturedFrame or None
+            None when the capture ended or no frame arrived within the timeout.
+        """
+        with self._condition:
+            if self._latest is None and not self._closed:
+                self._condition.wait(timeout)
+            frame, self._latest = self._latest, None
+        return frame
+
+    def is_opened(self):
+        with self._condition:
+            return not self._closed or self._latest is not None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+        self._thread.join()
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,99 @@
+import numpy as np
+
+from .enums import targets
+
+# Static gesture -> vehicle command mapping.
+GESTURE_COMMANDS = {
+    "fist": "STOP",
+    "three_gun": "SHOOT",
+    "palm": "MOVE",
+    "dislike": "LEFT",
+    "like": "RIGHT",
+}
+
+# Turn commands are repeated while the gesture is held, but not faster than the cooldown.
+TURN_COMMANDS = ("LEFT", "RIGHT")
+TURN_COOLDOWN = 1.5
+
+
+class CommandPolicy:
+    """
+    Turns the static gesture labels of the tracked hands into vehicle commands, frame by frame.
+
+    The last mapped command sticks while unmapped gestures are shown. A command is emitted when it changes, except the
+    repeat commands (turns), which are emitted again while held, at most once per cooldown.
+    """
+
+    ARBITRATIONS = ("all", "oldest", "largest")
+
+    def __init__(self, mapping=None, repeat_commands=TURN_COMMANDS, cooldown=TURN_COOLDOWN, arbitration="all"):
+        """
+        Parameters
+        ----------
+        mapping : dict or None
+            Gesture name -> command, GESTURE_COMMANDS when None.
+        repeat_commands : tuple
+            Commands repeated while held.
+        cooldown : float
+            Minimum time in seconds between two repeat commands.
+        arbitration : str
+            Hands driving the commands when several are tracked. "all" runs every hand through the rules in output
+            order, "oldest" only the hand tracked the longest (lowest id), "largest" only the largest box, usually the
+            closest hand.
+        """
+        if arbitration not in self.ARBITRATIONS:
+            raise ValueError(f"Unknown arbitration {arbitration!r}, expected one of {self.ARBITRATIONS}")
+        self.mapping = GESTURE_COMMANDS if mapping is None else mapping
+        self.repeat_commands = repeat_commands
+        self.cooldown = cooldown
+        self.arbitration = arbitration
+        self.reset()
+
+    def reset(self):
+        self.command = ""
+        self.prev_command = None
+        self.last_repeat_time = float("-inf")
+
+    def _rows(self, ids, bboxes, count):
+        if self.arbitration == "all" or count == 1:
+            return range(count)
+        if self.arbitration == "oldest":
+            return [int(np.argmin(ids))]
+        areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        return [int(np.argmax(areas))]
+
+    def update(self, timestamp, labels, ids=None, bboxes=None):
+        """
+        Parameters
+        ----------
+        timestamp : float
+            Time of the frame in seconds, the cooldown is measured on this clock.
+        labels : list or None
+            Static gesture label of every tracked hand, items may be None.
+        ids : np.ndarray or None
+            Track ids, needed by the "oldest" arbitration.
+        bboxes : np.ndarray or None
+            Boxes [x1,y1,x2,y2], needed by the "largest" arbitration.
+
+        Returns
+        -------
+        list of str
+            Commands to publish for this frame, usually none.
+        """
+        if labels is None or len(labels) == 0:
+            return []
+        emitted = []
+        for i in self._rows(ids, bboxes, len(labels)):
+            gesture = targets[labels[i]] if labels[i] is not None else "None"
+            self.command = self.mapping.get(gesture, self.command)
+            if not self.command:
+                continue
+            if self.command in self.repeat_commands:
+                if timestamp - self.last_repeat_time >= self.cooldown:
+                    emitted.append(self.command)
+                    self.last_repeat_time = timestamp
+                    self.prev_command = self.command
+            elif self.command != self.prev_command:
+                emitted.append(self.command)
+                self.prev_command = self.command
+        return emitted
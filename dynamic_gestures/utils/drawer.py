@@ -1,6 +1,7 @@
 import cv2
+import numpy as np
 
-from .enums import Event
+from .enums import Event, targets
 
 
 class Drawer:
@@ -151,12 +152,6 @@ class Drawer:
                    1, (255, 0, 0) , 5, cv2.LINE_AA) 
             elif self.action in [Event.DROP, Event.DROP2, Event.DROP3]:
                 frame = cv2.circle(frame, (self.width // 2, self.height // 2), 50, (0, 0, 255), -1)
-            elif self.action == Event.COUNTERCLOCK:
-                frame = cv2.putText(frame, 'COUNTERCLOCK', (self.width // 2, self.height // 2), cv2.FONT_HERSHEY_SIMPLEX ,  
-                   1, (0, 255, 0) , 5, cv2.LINE_AA) 
-            elif self.action == Event.CLOCKWISE:
-                frame = cv2.putText(frame, 'CLOCKWISE', (self.width // 2, self.height // 2), cv2.FONT_HERSHEY_SIMPLEX ,  
-                   1, (0, 255, 0) , 5, cv2.LINE_AA) 
             # elif self.action == Event.DRAG2:
             #     frame = cv2.circle(frame, (self.width // 2, self.height // 2), 50, (255, 0, 0), 9)
             # elif self.action == Event.DROP2:
@@ -168,3 +163,68 @@ class Drawer:
                 self.x = self.y = None
 
         return frame
+
+
+class DebugRenderer:
+    """
+    Optional render sink of the demo: draws the tracked hands, the dynamic gestures and the frame rate and shows the
+    frame in a window. Commands do not depend on it, a headless deployment does not create one.
+    """
+
+    def __init__(self, window="frame", draw_hands=True, mirror=False):
+        """
+        Parameters
+        ----------
+        window : str
+            Name of the window.
+        draw_hands : bool
+            Draw the boxes, ids and gestures of the tracked hands, otherwise only the frame rate.
+        mirror : bool
+            Frames are captured unflipped and boxes are in mirrored coordinates (MainController(mirror=True)), flip
+            the frame for display.
+        """
+        self.window = window
+        self.draw_hands = draw_hands
+        self.mirror = mirror
+        self.drawer = Drawer()
+
+    def __call__(self, frame, bboxes, ids, labels, frame_time=None, events=()):
+        """
+        Draw on the frame and show it.
+
+        Parameters
+        ----------
+        events : sequence of GestureEvent
+            Dynamic gestures recognized since the previous frame, the last one is drawn for a few frames.
+
+        Returns
+        -------
+        bool
+            False when the user asked to quit with 'q'.
+        """
+        if self.mirror:
+            frame = cv2.flip(frame, 1)
+        if self.draw_hands and bboxes is not None:
+            bboxes = bboxes.astype(np.int32)
+            for box, track_id, label in zip(bboxes, ids, labels):
+                gesture = targets[label] if label is not None else "None"
+                cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (255, 255, 0), 4)
+                cv2.putText(
+                    frame,
+                    f"ID {track_id} : {gesture}",
+                    (box[0], box[1] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    1,
+                    (0, 0, 255),
+                    2,
+                )
+        for event in events:
+            self.drawer.set_action(event.event)
+        frame = self.drawer.draw(frame)
+        if frame_time is not None:
+            cv2.putText(frame, f"fps {1.0 / frame_time:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        cv2.imshow(self.window, frame)
+        return cv2.waitKey(1) & 0xFF != ord("q")
+
+    def close(self):
+        cv2.destroyWindow(self.window)
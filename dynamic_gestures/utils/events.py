@@ -0,0 +1,99 @@
+import threading
+from collections import deque, namedtuple
+
+from .metrics import metrics
+
+# A dynamic gesture recognized on a track: the output track id, the utils.Event, the capture time of the frame and the
+# camera stream, None with a single camera.
+GestureEvent = namedtuple("GestureEvent", ["track_id", "event", "timestamp", "stream"], defaults=(None,))
+
+
+class Subscription:
+    """
+    Queue of the events published after subscribing, see EventBus.subscribe.
+    """
+
+    def __init__(self, bus, maxlen):
+        self.bus = bus
+        self.dropped = 0
+        self._queue = deque(maxlen=maxlen)
+
+    def _put(self, event):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+            metrics.inc("gesture_events_dropped_total")
+        self._queue.append(event)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def poll(self):
+        """
+        Oldest pending event, None when there is none.
+        """
+        try:
+            return self._queue.popleft()
+        except IndexError:
+            return None
+
+    def drain(self):
+        """
+        All pending events, oldest first.
+        """
+        events = []
+        while self._queue:
+            events.append(self._queue.popleft())
+        return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """
+    Fan-out of gesture events from the tracking thread to any number of consumers, e.g. the API and the renderer.
+
+    Every subscriber gets its own bounded deque. Publishing and consuming do not take a lock: deque appends and pops
+    are atomic, and the subscriber list is replaced instead of modified. A consumer that falls behind by more than
+    `maxlen` events loses the oldest ones, the publisher never waits.
+    """
+
+    def __init__(self):
+        self._subscribers = ()
+        # Only taken to change the subscriber list.
+        self._lock = threading.Lock()
+
+    def subscribe(self, maxlen=256):
+        """
+        Returns
+        -------
+        Subscription
+            Queue of the events published from now on, holding at most `maxlen` pending ones.
+        """
+        subscription = Subscription(self, maxlen)
+        with self._lock:
+            self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
+
+    def publish(self, events):
+        """
+        Deliver GestureEvents to every subscriber.
+        """
+        subscribers = self._subscribers
+        for event in events:
+            labels = {"event": event.event.name}
+            if event.stream is not None:
+                labels["stream"] = event.stream
+            metrics.inc("gesture_events_total", labels=labels)
+            for subscription in subscribers:
+                subscription._put(event)
@@ -0,0 +1,174 @@
+"""
+Ring of fixed-shape frames in shared memory, written by one process and read by others without pickling.
+
+Memory layout: a header of int64 values followed by the frames.
+    header : frames written, closed flag, height, width, channels, slots,
+             then per slot: sequence number, frame index, timestamp (float64)
+    frames : slots x height x width x channels uint8
+
+Every slot is protected by a sequence number, odd while the writer fills the slot. A reader copies the newest complete
+frame out of its slot and checks the sequence number again afterwards, retrying when the writer came back to the slot
+during the copy. The copy stays valid however long the reader works on it, a view of the slot would be overwritten
+`slots` frames later.
+"""
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER_FIELDS = 6
+SLOT_FIELDS = 3
+
+
+class FrameRing:
+    """
+    Single-producer ring buffer of frames in multiprocessing.shared_memory.
+    """
+
+    def __init__(self, shm, owner):
+        """
+        Use FrameRing.create in the writer and FrameRing.attach in the readers.
+        """
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        height, width, channels, slots = (int(value) for value in header[2:6])
+        self.shape = (height, width, channels)
+        self.slots = slots
+        slot_header = np.ndarray((slots, SLOT_FIELDS), dtype=np.int64, buffer=shm.buf, offset=HEADER_FIELDS * 8)
+        self._header = header
+        self._sequence = slot_header[:, 0]
+        self._index = slot_header[:, 1]
+        self._timestamp = slot_header[:, 2].view(np.float64)
+        offset = (HEADER_FIELDS + slots * SLOT_FIELDS) * 8
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        self._writing = None
+
+    @classmethod
+    def create(cls, shape, slots=4, name=None):
+        """
+        Allocate a ring for frames of the given (H, W, C) shape.
+        """
+        height, width, channels = shape
+        size = (HEADER_FIELDS + slots * SLOT_FIELDS) * 8 + slots * height * width * channels
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS + slots * SLOT_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[2:6] = height, width, channels, slots
+        header[HEADER_FIELDS + 1 :: SLOT_FIELDS] = -1
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Open a ring created by another process.
+
+        Before Python 3.13 attaching registers the segment with the resource tracker, which frees it when the tracker
+        exits. Processes started by the same multiprocessing parent share one tracker, so the ring lives until its
+        creator closes it, readers in unrelated processes need Python 3.13.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def written(self):
+        """
+        Number of frames written so far.
+        """
+        return int(self._header[0])
+
+    @property
+    def closed(self):
+        return bool(self._header[1])
+
+    def begin_write(self):
+        """
+        View of the slot of the next frame, to decode or copy it in place. Publish it with commit.
+        """
+        index = int(self._header[0])
+        slot = index % self.slots
+        self._sequence[slot] += 1
+        self._writing = index
+        return self.frames[slot]
+
+    def commit(self, timestamp):
+        index = self._writing
+        slot = index % self.slots
+        self._index[slot] = index
+        self._timestamp[slot] = timestamp
+        self._sequence[slot] += 1
+        self._header[0] = index + 1
+        self._writing = None
+
+    def write(self, frame, timestamp):
+        self.begin_write()[...] = frame
+        self.commit(timestamp)
+
+    def close_stream(self):
+        """
+        Tell the readers that no frame follows the last one.
+        """
+        self._header[1] = 1
+
+    def is_current(self, index):
+        """
+        Whether the frame `index` is still in its slot, i.e. a view of it has not been overwritten.
+        """
+        slot = index % self.slots
+        return self._sequence[slot] % 2 == 0 and self._index[slot] == index
+
+    def read_latest(self, after=-1, timeout=1.0, poll=0.001, out=None):
+        """
+        Wait for the newest frame with an index greater than `after` and copy it.
+
+        Parameters
+        ----------
+        out : np.ndarray or None
+            uint8 array of the frame shape the frame is copied into, a new one when None. Reuse it to avoid an
+            allocation per frame.
+
+        Returns
+        -------
+        tuple or None
+            (index, timestamp, frame), None when the stream is closed and read or on timeout.
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        deadline = time.monotonic() + timeout
+        while True:
+            index = int(self._header[0]) - 1
+            if index > after:
+                slot = index % self.slots
+                sequence = int(self._sequence[slot])
+                if sequence % 2 == 0 and self._index[slot] == index:
+                    timestamp = float(self._timestamp[slot])
+                    np.copyto(out, self.frames[slot])
+                    # Unchanged sequence: the writer did not touch the slot while it was copied.
+                    if self._sequence[slot] == sequence:
+                        return index, timestamp, out
+                    continue
+            elif self._header[1]:
+                return None
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        """
+        Detach from the ring, the creator also frees it. Views from begin_write must not be used afterwards.
+        """
+        self.frames = self._header = self._sequence = self._index = self._timestamp = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A caller still holds a frame view, the mapping goes away with it.
+            pass
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,243 @@
+import functools
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond tracker steps up to a stalled frame.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, value=1.0):
+        with self._lock:
+            self.value += value
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels)} {self.value}"]
+
+    def state(self):
+        return self.value
+
+    def restore(self, state):
+        self.value = state
+
+
+class Gauge:
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels)} {self.value}"]
+
+    def state(self):
+        return self.value
+
+    def restore(self, state):
+        self.value = state
+
+
+class Histogram:
+    def __init__(self, name, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            self.sum += value
+            self.count += 1
+
+    def render(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels + (("le", bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {count}")
+        return lines
+
+    def state(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def restore(self, state):
+        counts, total, count = state
+        with self._lock:
+            self.counts, self.sum, self.count = list(counts), total, count
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    Process-wide timers, counters and gauges rendered in the Prometheus text format.
+    Disabled by default: timers, counters and gauges are no-ops until `enabled` is set.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics = {}
+        self._kinds = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, labels, **kwargs):
+        labels = tuple(sorted(labels.items())) if labels else ()
+        key = (name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = kind(name, labels, **kwargs)
+                    self._metrics[key] = metric
+                    self._kinds.setdefault(name, kind)
+        return metric
+
+    def histogram(self, name, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, labels, buckets=buckets)
+
+    def counter(self, name, labels=None):
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name, labels=None):
+        return self._get(Gauge, name, labels)
+
+    def timer(self, name, labels=None):
+        """
+        Context manager observing the duration of its block into the `name` histogram.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self.histogram(name, labels))
+
+    def observe(self, name, value, labels=None):
+        if self.enabled:
+            self.histogram(name, labels).observe(value)
+
+    def inc(self, name, value=1.0, labels=None):
+        if self.enabled:
+            self.counter(name, labels).inc(value)
+
+    def set(self, name, value, labels=None):
+        if self.enabled:
+            self.gauge(name, labels).set(value)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+            self._kinds.clear()
+
+    def snapshot(self):
+        """
+        Current values of all metrics, to send them to another process, see load.
+        """
+        with self._lock:
+            items = list(self._metrics.items())
+        snapshot = []
+        for (name, labels), metric in items:
+            buckets = metric.buckets if isinstance(metric, Histogram) else None
+            snapshot.append((type(metric).__name__, name, labels, buckets, metric.state()))
+        return snapshot
+
+    def load(self, snapshot, labels=None):
+        """
+        Replace the values of the metrics of a snapshot, e.g. the cumulative metrics of a worker process, with
+        `labels` added to theirs.
+        """
+        kinds = {"Counter": Counter, "Gauge": Gauge, "Histogram": Histogram}
+        extra = dict(labels or {})
+        for kind, name, metric_labels, buckets, state in snapshot:
+            kwargs = {} if buckets is None else {"buckets": buckets}
+            self._get(kinds[kind], name, {**dict(metric_labels), **extra}, **kwargs).restore(state)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda item: item[0])
+            kinds = dict(self._kinds)
+        lines = []
+        seen = set()
+        for (name, _), metric in items:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {kinds[name].__name__.lower()}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def timed(name):
+    """
+    Decorator timing every call of the wrapped function into the `name` histogram while metrics are enabled.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with _Timer(metrics.histogram(name)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+from .metrics import metrics
+
+
+class MotionGate:
+    """
+    Cheap change detector deciding whether the hand detector needs to run on a frame.
+
+    Frames are downscaled to a small grayscale image and compared with a running average of the previous ones. While
+    the controller has no tracks, frames without change are skipped, except every `max_skip`-th one. The first frame
+    with change runs the detector again.
+    """
+
+    def __init__(self, width=80, threshold=12.0, min_area=0.002, alpha=0.05, max_skip=15):
+        """
+        Parameters
+        ----------
+        width : int
+            Width of the downscaled grayscale image, the height keeps the frame aspect ratio.
+        threshold : float
+            Difference of a pixel to the background, on the 0-255 gray scale, counted as change.
+        min_area : float
+            Share of changed pixels that counts as motion. Lower values make the gate more sensitive.
+        alpha : float
+            Weight of a new frame in the running background.
+        max_skip : int or None
+            At most this many frames in a row are skipped, so a static scene is still checked at a reduced rate.
+            None skips every static frame.
+        """
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.alpha = alpha
+        self.max_skip = max_skip
+        self.background = None
+        self.skipped_in_row = 0
+        self.frames = 0
+        self.skipped = 0
+
+    @property
+    def skipped_fraction(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def reset(self):
+        self.background = None
+        self.skipped_in_row = 0
+
+    def motion(self, frame):
+        """
+        Update the background with a frame.
+
+        Returns
+        -------
+        bool
+            True if the frame differs from the background, always True for the first frame.
+        """
+        height, width = frame.shape[:2]
+        size = (self.width, max(round(self.width * height / width), 1))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            return True
+        changed = np.count_nonzero(cv2.absdiff(gray, self.background) > self.threshold)
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        return changed > self.min_area * gray.size
+
+    def __call__(self, frame, idle):
+        """
+        Parameters
+        ----------
+        frame : np.ndarray
+            BGR frame, any resolution.
+        idle : bool
+            Whether the controller has no tracks, only then frames are skipped.
+
+        Returns
+        -------
+        bool
+            True if the detector should run on the frame.
+        """
+        self.frames += 1
+        metrics.inc("motion_gate_frames_total")
+        motion = self.motion(frame)
+        if motion or not idle or (self.max_skip is not None and self.skipped_in_row >= self.max_skip):
+            self.skipped_in_row = 0
+            return True
+        self.skipped_in_row += 1
+        self.skipped += 1
+        metrics.inc("motion_gate_skipped_frames_total")
+        return False
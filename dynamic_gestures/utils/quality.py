@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+from .metrics import metrics
+
+# Pipeline settings of one quality level:
+#   reuse_labels     keep the gesture of tracks whose recent gestures agree instead of classifying their hands again
+#   max_hands        at most this many detections, the most confident ones, are classified and tracked, None for all
+#   tiled            whether the tiled pass of small tracks may run, it still needs MainController(tiled=True)
+#   reduction        extra downscale factor of the detection plane of a CapturedFrame, which is decoded smaller. Plain
+#                    frames are not resized, the detector scales any input to its fixed size at the same cost
+#   detect_interval  the detector runs on every detect_interval-th frame, the others repeat the last output
+QualityLevel = namedtuple("QualityLevel", ["reuse_labels", "max_hands", "tiled", "reduction", "detect_interval"])
+
+# From full quality to the cheapest pipeline, each level adds a degradation to the previous one that saves time on any
+# frame, the reduced decode of a CapturedFrame comes on top.
+QUALITY_LEVELS = (
+    QualityLevel(reuse_labels=False, max_hands=None, tiled=True, reduction=1, detect_interval=1),
+    QualityLevel(reuse_labels=True, max_hands=None, tiled=True, reduction=1, detect_interval=1),
+    QualityLevel(reuse_labels=True, max_hands=2, tiled=False, reduction=1, detect_interval=1),
+    QualityLevel(reuse_labels=True, max_hands=1, tiled=False, reduction=2, detect_interval=2),
+    QualityLevel(reuse_labels=True, max_hands=1, tiled=False, reduction=2, detect_interval=3),
+)
+
+
+class QualityController:
+    """
+    Feedback controller keeping the processing time of a frame within a budget.
+
+    The latency of every frame is smoothed with an exponential moving average. Above the budget, the controller moves
+    to the next, cheaper level of `levels`. Once the average has stayed below `headroom` times the budget for
+    `restore_frames` frames, it goes back one level. Every change is followed by `hold` frames without a change, so
+    that the average reflects the new level first.
+    """
+
+    def __init__(self, budget=1 / 30, levels=QUALITY_LEVELS, alpha=0.1, headroom=0.6, hold=15, restore_frames=60):
+        """
+        Parameters
+        ----------
+        budget : float
+            Target processing time of a frame in seconds.
+        levels : sequence of QualityLevel
+            Levels from full quality to the cheapest.
+        alpha : float
+            Weight of a new frame in the latency average.
+        headroom : float
+            Share of the budget the average has to stay under before quality is restored, leaving room for the
+            cost of the better level.
+        hold : int
+            Frames after a change before the next one.
+        restore_frames : int
+            Frames the average has to stay under the headroom before quality is restored.
+        """
+        self.budget = budget
+        self.levels = tuple(levels)
+        self.alpha = alpha
+        self.headroom = headroom
+        self.hold = hold
+        self.restore_frames = restore_frames
+        self.latency = None
+        self.level = 0
+        self._since_change = 0
+        self._under = 0
+        metrics.set("quality_level", self.level)
+
+    @property
+    def settings(self):
+        """
+        QualityLevel of the current level.
+        """
+        return self.levels[self.level]
+
+    def reset(self):
+        self.latency = None
+        self._set_level(0)
+
+    def _set_level(self, level):
+        if level != self.level:
+            metrics.inc("quality_level_changes_total", labels={"direction": "down" if level > self.level else "up"})
+        self.level = level
+        self._since_change = 0
+        self._under = 0
+        metrics.set("quality_level", level)
+
+    def update(self, seconds):
+        """
+        Account the processing time of a frame and change the level when needed.
+
+        Returns
+        -------
+        int
+            The level for the next frame.
+        """
+        self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        metrics.set("quality_latency_seconds", self.latency)
+        self._since_change += 1
+        if self.latency < self.budget * self.headroom:
+            self._under += 1
+        else:
+            self._under = 0
+        if self._since_change < self.hold:
+            return self.level
+        if self.latency > self.budget and self.level < len(self.levels) - 1:
+            self._set_level(self.level + 1)
+        elif self._under >= self.restore_frames and self.level > 0:
+            self._set_level(self.level - 1)
+        return self.level
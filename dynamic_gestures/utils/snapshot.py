@@ -0,0 +1,248 @@
+"""
+Memory-mapped snapshot of the tracker state, to resume tracking after a restart of the process.
+
+File layout (little endian):
+    header : magic (8 bytes), version (u32), slot size (u32)
+    2 slots: sequence (u64), timestamp (f64), payload size (u32), crc32 of the payload (u32), payload
+
+A snapshot is written into the slot not holding the newest one, sequence number last, so a write interrupted by a
+crash leaves the previous snapshot intact. The reader takes the slot with the highest sequence whose checksum matches.
+A snapshot larger than a slot is written into a new file with larger slots, which then replaces the old one.
+
+Payload: named arrays, each one
+    name (24 bytes), dtype (4 bytes), ndim (u32), shape (ndim x u32, padded to 8 bytes), data (padded to 8 bytes)
+"""
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .action_controller import Deque
+from .enums import Event, HandPosition
+from .hand import Hand
+
+MAGIC = b"EPSNAP\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+SLOT = struct.Struct("<QdII")
+ARRAY = struct.Struct("<24s4sI")
+
+# Missing enum values and labels in the packed deques, HandPosition.UNKNOWN is -1.
+_NONE = -(2**31)
+
+
+def _padded(size):
+    return (size + 7) // 8 * 8
+
+
+def encode_arrays(arrays):
+    """
+    Serialize a dict of arrays into the payload format.
+    """
+    chunks = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        chunks.append(ARRAY.pack(name.encode(), array.dtype.str.encode(), array.ndim))
+        shape = struct.pack(f"<{array.ndim}I", *array.shape)
+        chunks.append(shape + b"\0" * (_padded(len(shape)) - len(shape)))
+        data = array.tobytes()
+        chunks.append(data + b"\0" * (_padded(len(data)) - len(data)))
+    return b"".join(chunks)
+
+
+def decode_arrays(payload):
+    """
+    Arrays of a payload, as writable copies.
+    """
+    arrays = {}
+    offset = 0
+    while offset < len(payload):
+        name, dtype, ndim = ARRAY.unpack_from(payload, offset)
+        offset += ARRAY.size
+        shape = struct.unpack_from(f"<{ndim}I", payload, offset)
+        offset += _padded(4 * ndim)
+        dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name.rstrip(b"\0").decode()] = (
+            np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape).copy()
+        )
+        offset += _padded(count * dtype.itemsize)
+    return arrays
+
+
+def _enum_value(member):
+    return _NONE if member is None else member.value
+
+
+def pack_deques(deques):
+    """
+    Hands and action state of Deques as flat arrays.
+    """
+    hands = [hand for hands in deques for hand in hands]
+    boxes = np.full((len(hands), 4), np.nan)
+    for i, hand in enumerate(hands):
+        if hand.bbox is not None:
+            boxes[i] = hand.bbox[:4]
+    actions = np.full((len(deques), 5), _NONE, dtype=np.int32)
+    for i, hands_deque in enumerate(deques):
+        actions[i, : len(hands_deque.action_deque)] = [event.value for event in hands_deque.action_deque]
+    return {
+        "hand_counts": np.array([len(hands) for hands in deques], dtype=np.int32),
+        "hand_boxes": boxes,
+        "hand_gestures": np.array([_NONE if hand.gesture is None else hand.gesture for hand in hands], dtype=np.int64),
+        "hand_positions": np.array([_enum_value(hand.position) for hand in hands], dtype=np.int32),
+        "action": np.array([_enum_value(hands.action) for hands in deques], dtype=np.int32),
+        "action_deque": actions,
+    }
+
+
+def unpack_deques(arrays, maxlen=30, min_frames=20):
+    """
+    Deques packed by pack_deques.
+    """
+    deques = []
+    start = 0
+    for i, count in enumerate(arrays["hand_counts"].tolist()):
+        hands = Deque(maxlen, min_frames)
+        for j in range(start, start + count):
+            box = arrays["hand_boxes"][j]
+            gesture = arrays["hand_gestures"][j]
+            hand = Hand(bbox=None if np.isnan(box).any() else box, gesture=None if gesture == _NONE else gesture)
+            position = int(arrays["hand_positions"][j])
+            hand.position = None if position == _NONE else HandPosition(position)
+            hands._deque.append(hand)
+        start += count
+        action = int(arrays["action"][i])
+        hands.action = None if action == _NONE else Event(action)
+        hands.action_deque.extend(Event(value) for value in arrays["action_deque"][i].tolist() if value != _NONE)
+        deques.append(hands)
+    return deques
+
+
+class SnapshotFile:
+    """
+    Double-buffered snapshot file, written in place through a memory mapping.
+
+    The mapping is shared with the page cache, so a snapshot survives a crash or kill of the process as soon as write
+    returns. Call flush to also survive a crash of the machine.
+    """
+
+    def __init__(self, path, slot_size=1 << 18):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the snapshot file, created when missing. The slot size of an existing file is kept.
+        slot_size : int
+            Initial capacity of a slot in bytes, grown when a snapshot does not fit.
+        """
+        self.path = path
+        self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size >= HEADER.size:
+            magic, version, self.slot_size = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a tracker snapshot")
+            if version != VERSION or size < self._size(self.slot_size):
+                # An unusable snapshot is only a cold start.
+                self._create(slot_size)
+        else:
+            self._create(slot_size)
+        self._mmap = mmap.mmap(self._file.fileno(), self._size(self.slot_size))
+
+    @staticmethod
+    def _size(slot_size):
+        return HEADER.size + 2 * (SLOT.size + slot_size)
+
+    def _offset(self, slot):
+        return HEADER.size + slot * (SLOT.size + self.slot_size)
+
+    def _create(self, slot_size):
+        self.slot_size = _padded(slot_size)
+        self._file.seek(0)
+        self._file.truncate(0)
+        self._file.truncate(self._size(self.slot_size))
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.slot_size))
+        self._file.flush()
+
+    def _slots(self):
+        """
+        (sequence, timestamp, payload offset, payload size) of the valid slots.
+        """
+        valid = []
+        for slot in range(2):
+            offset = self._offset(slot)
+            sequence, timestamp, size, crc = SLOT.unpack_from(self._mmap, offset)
+            start = offset + SLOT.size
+            if sequence > 0 and size <= self.slot_size and zlib.crc32(self._mmap[start : start + size]) == crc:
+                valid.append((sequence, timestamp, start, size))
+        return valid
+
+    def read(self):
+        """
+        Newest valid snapshot.
+
+        Returns
+        -------
+        tuple or None
+            (timestamp, dict of arrays), None when there is none.
+        """
+        valid = self._slots()
+        if not valid:
+            return None
+        _, timestamp, start, size = max(valid)
+        return timestamp, decode_arrays(self._mmap[start : start + size])
+
+    def write(self, arrays, timestamp):
+        """
+        Store a snapshot, replacing the older of the two.
+        """
+        payload = encode_arrays(arrays)
+        valid = self._slots()
+        sequence = max(valid)[0] + 1 if valid else 1
+        if len(payload) > self.slot_size:
+            self._grow(2 * len(payload), payload, sequence, timestamp)
+            return
+        slot = 0 if not valid or max(valid)[2] > self._offset(1) else 1
+        offset = self._offset(slot)
+        # Invalidate the slot first, then fill it and publish the new sequence number last.
+        struct.pack_into("<Q", self._mmap, offset, 0)
+        self._mmap[offset + SLOT.size : offset + SLOT.size + len(payload)] = payload
+        struct.pack_into("<dII", self._mmap, offset + 8, timestamp, len(payload), zlib.crc32(payload))
+        struct.pack_into("<Q", self._mmap, offset, sequence)
+
+    def _grow(self, slot_size, payload, sequence, timestamp):
+        """
+        Replace the file by one with larger slots holding the snapshot `payload`. Until the new file is complete on
+        disk, the old one with its snapshots stays in place.
+        """
+        slot_size = _padded(slot_size)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w+b") as file:
+            file.truncate(self._size(slot_size))
+            file.write(HEADER.pack(MAGIC, VERSION, slot_size))
+            file.write(SLOT.pack(sequence, timestamp, len(payload), zlib.crc32(payload)))
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        self._mmap.close()
+        self._file.close()
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self.slot_size = slot_size
+        self._mmap = mmap.mmap(self._file.fileno(), self._size(self.slot_size))
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,196 @@
+"""
+Binary trace of what MainController.update saw and produced on every frame.
+
+File layout (little endian):
+    header : magic (8 bytes), version (u32), id_base (u32)
+    records: frame_index (u64), timestamp (f64), n_dets (u32), n_out (u32),
+             dets (n_dets x 5 f64), labels (n_dets i64),
+             boxes (n_out x 4 f64), ids (n_out i64), out_labels (n_out i64)
+
+Every block is a multiple of 8 bytes, so the arrays of a memory-mapped trace are aligned views.
+Missing labels (None) are stored as -1.
+"""
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"EPTRACE\0"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<QdII")
+
+TraceRecord = namedtuple("TraceRecord", ["frame_index", "timestamp", "dets", "labels", "boxes", "ids", "out_labels"])
+
+
+def _labels_to_array(labels, size):
+    if labels is None:
+        return np.full(size, -1, dtype=np.int64)
+    return np.array([-1 if label is None else label for label in labels], dtype=np.int64)
+
+
+class TraceWriter:
+    """
+    Append-only trace writer. Appending to an existing trace keeps its header.
+    """
+
+    def __init__(self, path, id_base=0):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the trace file.
+        id_base : int
+            Value of the track id counter when recording started, needed to reproduce ids on replay.
+        """
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, "ab")
+        if not exists:
+            self._file.write(HEADER.pack(MAGIC, VERSION, id_base))
+
+    def write(self, frame_index, timestamp, dets, labels, boxes=None, ids=None, out_labels=None):
+        """
+        Append one frame.
+
+        Parameters
+        ----------
+        frame_index : int
+            Index of the frame in the session.
+        timestamp : float
+            Capture time of the frame in seconds.
+        dets : np.ndarray
+            Detections passed to MainController.update, shape (N, 5).
+        labels : np.ndarray or None
+            Classifier labels of the detections, shape (N,).
+        boxes : np.ndarray or None
+            Boxes returned by MainController.update, shape (M, 4).
+        ids : np.ndarray or None
+            Track ids returned by MainController.update, shape (M,).
+        out_labels : list or None
+            Labels returned by MainController.update, items may be None.
+        """
+        dets = np.ascontiguousarray(dets, dtype=np.float64).reshape(-1, 5)
+        boxes = np.empty((0, 4)) if boxes is None else boxes
+        boxes = np.ascontiguousarray(boxes, dtype=np.float64).reshape(-1, 4)
+        ids = np.empty(0) if ids is None else ids
+        self._file.write(RECORD.pack(frame_index, timestamp, dets.shape[0], boxes.shape[0]))
+        self._file.write(dets.tobytes())
+        self._file.write(_labels_to_array(labels, dets.shape[0]).tobytes())
+        self._file.write(boxes.tobytes())
+        self._file.write(np.asarray(ids, dtype=np.int64).reshape(-1).tobytes())
+        self._file.write(_labels_to_array(out_labels, boxes.shape[0]).tobytes())
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    """
+    Memory-mapped trace reader. Records are returned as zero-copy array views into the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.id_base = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tracker trace")
+        if version != VERSION:
+            raise ValueError(f"Unsupported trace version {version}")
+        self._offsets = self._index()
+
+    def _index(self):
+        offsets = []
+        offset = HEADER.size
+        size = len(self._mmap)
+        while offset + RECORD.size <= size:
+            _, _, n_dets, n_out = RECORD.unpack_from(self._mmap, offset)
+            end = offset + RECORD.size + n_dets * 48 + n_out * 48
+            if end > size:
+                # Partially written last record of a live recording.
+                break
+            offsets.append(offset)
+            offset = end
+        return offsets
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        offset = self._offsets[index]
+        frame_index, timestamp, n_dets, n_out = RECORD.unpack_from(self._mmap, offset)
+        offset += RECORD.size
+        dets = np.frombuffer(self._mmap, dtype=np.float64, count=n_dets * 5, offset=offset).reshape(n_dets, 5)
+        offset += n_dets * 40
+        labels = np.frombuffer(self._mmap, dtype=np.int64, count=n_dets, offset=offset)
+        offset += n_dets * 8
+        boxes = np.frombuffer(self._mmap, dtype=np.float64, count=n_out * 4, offset=offset).reshape(n_out, 4)
+        offset += n_out * 32
+        ids = np.frombuffer(self._mmap, dtype=np.int64, count=n_out, offset=offset)
+        offset += n_out * 8
+        out_labels = np.frombuffer(self._mmap, dtype=np.int64, count=n_out, offset=offset)
+        return TraceRecord(frame_index, timestamp, dets, labels, boxes, ids, out_labels)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay_trace(controller, reader, check=False):
+    """
+    Feed recorded detections into the tracker of a controller, without running the ONNX models.
+
+    Parameters
+    ----------
+    controller : MainController
+        Controller in its initial state, typically created without models.
+    reader : TraceReader
+        Recorded trace.
+    check : bool
+        Compare the tracker output with the recorded output on every frame.
+
+    Returns
+    -------
+    list
+        Frame indices whose output differs from the recording (empty when check is False).
+    """
+    mismatches = []
+    for record in reader:
+        if len(record.dets) == 0:
+            controller.update(np.empty((0, 5)), None)
+            boxes, ids, labels = np.empty((0, 4)), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        else:
+            # Copy out of the read-only mapping, the tracker keeps references to the detections it is given.
+            new_bboxes, out_labels = controller.update(dets=record.dets.copy(), labels=record.labels.copy())
+            boxes, ids = new_bboxes[:, :-1], new_bboxes[:, -1].astype(np.int64)
+            labels = _labels_to_array(out_labels, len(ids))
+        if check and not (
+            np.array_equal(boxes, record.boxes)
+            and np.array_equal(ids, record.ids)
+            and np.array_equal(labels, record.out_labels)
+        ):
+            mismatches.append(record.frame_index)
+    return mismatches